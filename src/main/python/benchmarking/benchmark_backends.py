@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Сравнение CPU-бэкендов инференса (PyTorch, ONNX Runtime, OpenVINO) на изображениях бенчмарка.
+
+Usage:
+    python -m src.main.python.benchmarking.benchmark_backends --limit 5
+"""
+
+import time
+import argparse
+import numpy as np
+from src.main.resources.config import MODEL_NAME, BATCH_SIZE, DATASET_FOLDER
+from src.main.python.image_slicer.image_slicer import iter_image_slices
+from src.main.python.model.backends import load_model, EXPORT_FORMATS
+from src.main.python.model.yolo import predict_tiles
+from src.main.python.benchmarking.benchmarking import load_benchmark, find_benchmark_images
+from src.main.python.manifest.manifest import scan_manifest
+
+
+def benchmark_backend(model, image_paths, batch_size, device):
+    tiles_count = 0
+    elapsed = 0.0
+    latencies = []
+    for image_path in image_paths:
+        tiles = list(iter_image_slices(image_path))
+        start_time = time.perf_counter()
+        predict_tiles(model, tiles, batch_size=batch_size, device=device)
+        elapsed += time.perf_counter() - start_time
+        tiles_count += len(tiles)
+
+        # Задержка одного фрагмента - батч из одного элемента
+        start_time = time.perf_counter()
+        predict_tiles(model, tiles[:1], batch_size=1, device=device)
+        latencies.append((time.perf_counter() - start_time) * 1000)
+    return tiles_count, elapsed, latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare CPU throughput and latency of inference backends")
+    parser.add_argument("--model", default=MODEL_NAME, help=f"Model name without extension (default: {MODEL_NAME})")
+    parser.add_argument("--formats", nargs="+", default=[".pt", *EXPORT_FORMATS],
+                        help="Model formats to compare (default: .pt .onnx _openvino_model)")
+    parser.add_argument("--dataset-folder", default=DATASET_FOLDER, help=f"Folder with benchmark images (default: {DATASET_FOLDER})")
+    parser.add_argument("--manifest", action="store_true",
+                        help="Scan the dataset folder into the manifest once and list images from it")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help=f"Batch size (default: {BATCH_SIZE})")
+    parser.add_argument("--limit", type=int, default=None, help="Number of benchmark images to use")
+    parser.add_argument("--device", default="cpu", help="Device for inference (default: cpu)")
+    args = parser.parse_args()
+
+    manifest = scan_manifest(args.dataset_folder) if args.manifest else None
+    image_paths = list(find_benchmark_images(load_benchmark(), args.dataset_folder, manifest).values())[:args.limit]
+    if manifest is not None:
+        manifest.close()
+    print(f"Изображений: {len(image_paths)}")
+
+    rows = []
+    for model_format in args.formats:
+        model = load_model(args.model, model_format, args.device)
+        # Прогрев на одном изображении
+        benchmark_backend(model, image_paths[:1], args.batch_size, args.device)
+        tiles_count, elapsed, latencies = benchmark_backend(model, image_paths, args.batch_size, args.device)
+        rows.append((model_format, tiles_count, tiles_count / elapsed, np.median(latencies), np.percentile(latencies, 95)))
+
+    print(f"{'backend':<20}{'tiles':>8}{'tiles/s':>12}{'p50 ms':>10}{'p95 ms':>10}")
+    for model_format, tiles_count, throughput, p50, p95 in rows:
+        print(f"{model_format:<20}{tiles_count:>8}{throughput:>12.1f}{p50:>10.1f}{p95:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
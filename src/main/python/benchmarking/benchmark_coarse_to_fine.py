@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Оценка режима coarse_to_fine на кадрах бенчмарка: грубый проход по уменьшенному кадру
+выбирает области, и фрагменты полного разрешения режутся только вокруг них.
+
+Сравнение с полной сеткой (evaluate_tile_selection): доля пропущенных фрагментов,
+полнота сырых детекций и MAE подсчета. Время отбора включает инференс грубого прохода.
+
+Usage:
+    python -m src.main.python.benchmarking.benchmark_coarse_to_fine --limit 20
+    python -m src.main.python.benchmarking.benchmark_coarse_to_fine --scale 8 --margin 640 --coarse-conf 0.05
+"""
+
+import argparse
+from src.main.resources.config import (
+    MODEL_NAME, DATASET_FOLDER, COARSE_SCALE, COARSE_CONFIDENCE_THRESHOLD, ROI_MARGIN
+)
+from src.main.python.model.backends import load_model
+from src.main.python.model.detection_cache import DetectionCache
+from src.main.python.coarse_to_fine.coarse_to_fine import iter_roi_slices
+from src.main.python.benchmarking.benchmarking import load_benchmark, find_benchmark_images
+from src.main.python.manifest.manifest import scan_manifest
+from src.main.python.benchmarking.benchmark_prescreen import evaluate_tile_selection, print_tile_selection
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure tile savings and recall of coarse-to-fine ROI tiling against the exhaustive grid")
+    parser.add_argument("--model", default=MODEL_NAME, help=f"Model name without extension (default: {MODEL_NAME})")
+    parser.add_argument("--model-format", default=".pt", help="Model format: .pt, .onnx or _openvino_model (default: .pt)")
+    parser.add_argument("--device", default=None, help="Device for inference")
+    parser.add_argument("--dataset-folder", default=DATASET_FOLDER, help=f"Folder with benchmark images (default: {DATASET_FOLDER})")
+    parser.add_argument("--manifest", action="store_true",
+                        help="Scan the dataset folder into the manifest once and list images from it")
+    parser.add_argument("--limit", type=int, default=None, help="Number of benchmark images to use")
+    parser.add_argument("--scale", type=int, default=COARSE_SCALE,
+                        help=f"Downscale factor of the coarse pass (default: {COARSE_SCALE})")
+    parser.add_argument("--coarse-conf", type=float, default=COARSE_CONFIDENCE_THRESHOLD,
+                        help=f"Confidence threshold of the coarse pass (default: {COARSE_CONFIDENCE_THRESHOLD})")
+    parser.add_argument("--margin", type=int, default=ROI_MARGIN,
+                        help=f"ROI margin around coarse detections in full-resolution pixels (default: {ROI_MARGIN})")
+    parser.add_argument("--no-cache", action="store_true", help="Do not use the detection cache")
+    args = parser.parse_args()
+
+    benchmark = load_benchmark()
+    manifest = scan_manifest(args.dataset_folder) if args.manifest else None
+    image_paths = dict(list(find_benchmark_images(benchmark, args.dataset_folder, manifest).items())[:args.limit])
+    if manifest is not None:
+        manifest.close()
+    print(f"Кадров: {len(image_paths)}")
+
+    model = load_model(args.model, args.model_format, args.device)
+    cache = None if args.no_cache else DetectionCache()
+
+    def select_tiles(image_array, tiles, stats):
+        return iter_roi_slices(image_array, model, device=args.device, scale=args.scale, conf=args.coarse_conf,
+                               margin=args.margin, stats=stats, cache=cache)
+
+    full_counts, coarse_to_fine_counts, stats = evaluate_tile_selection(model, image_paths, select_tiles, args.device,
+                                                                        cache=cache)
+    print_tile_selection(benchmark, full_counts, coarse_to_fine_counts, stats)
+    if cache is not None:
+        print(cache)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк инференса: батчевый predict_tiles против текущего пути через папку с PNG.
+
+Usage:
+    python -m src.main.python.benchmarking.benchmark_inference --image image.jpg --model best_4_pytorch.pt
+"""
+
+import os
+import time
+import argparse
+import tempfile
+from ultralytics import YOLO
+from src.main.resources.config import SLICE_SIZE, OVERLAPPING_PERCENTAGE
+from src.main.python.image_slicer.image_slicer import iter_image_slices, create_image_slices
+from src.main.python.model.yolo import predict_tiles, process_folder
+
+
+def benchmark_folder_path(model, image_path, device):
+    with tempfile.TemporaryDirectory() as temp_folder:
+        slices_folder = os.path.join(temp_folder, "slices")
+        output_folder = os.path.join(temp_folder, "predicted")
+        start_time = time.perf_counter()
+        tiles_count = create_image_slices(image_path, OVERLAPPING_PERCENTAGE, slices_folder, SLICE_SIZE)
+        folder_path = os.path.join(slices_folder, os.path.splitext(os.path.basename(image_path))[0])
+        process_folder(folder_path, model, device, output_folder)
+        elapsed = time.perf_counter() - start_time
+    return tiles_count, elapsed
+
+
+def benchmark_batched_path(model, image_path, device, batch_size):
+    start_time = time.perf_counter()
+    tiles = list(iter_image_slices(image_path))
+    predict_tiles(model, tiles, batch_size=batch_size, device=device)
+    elapsed = time.perf_counter() - start_time
+    return len(tiles), elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare tiles/s of batched and folder-based inference")
+    parser.add_argument("--image", required=True, help="Path to the input image")
+    parser.add_argument("--model", required=True, help="Path to the model weights")
+    parser.add_argument("--device", default="cpu", help="Device for inference (default: cpu)")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32, 64],
+                        help="Batch sizes to benchmark (default: 1 2 4 8 16 32 64)")
+    parser.add_argument("--repeats", type=int, default=3, help="Runs per configuration, best time is reported")
+    args = parser.parse_args()
+
+    model = YOLO(args.model)
+    model.to(args.device)
+    # Прогрев: первый вызов включает инициализацию модели
+    benchmark_batched_path(model, args.image, args.device, 1)
+
+    print(f"{'path':<20}{'tiles':>8}{'seconds':>12}{'tiles/s':>12}")
+    tiles_count, elapsed = min((benchmark_folder_path(model, args.image, args.device) for _ in range(args.repeats)),
+                               key=lambda result: result[1])
+    print(f"{'folder':<20}{tiles_count:>8}{elapsed:>12.2f}{tiles_count / elapsed:>12.1f}")
+    for batch_size in args.batch_sizes:
+        tiles_count, elapsed = min((benchmark_batched_path(model, args.image, args.device, batch_size) for _ in range(args.repeats)),
+                                   key=lambda result: result[1])
+        print(f"{f'batch={batch_size}':<20}{tiles_count:>8}{elapsed:>12.2f}{tiles_count / elapsed:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""
+Сквозной бенчмарк пайплайна (нарезка -> YOLO -> IoU -> выбросы) на кадрах benchmarking.csv.
+
+Замеряет время каждой стадии, фрагменты/с, изображения/с, пиковый RSS и MAE подсчета,
+дописывает запуск в историю (JSON Lines, с git SHA и конфигурацией) и завершается с кодом 1,
+если пропускная способность упала больше допустимого относительно лучшего из последних
+запусков с той же конфигурацией. Запуск с регрессией в историю не попадает, поэтому
+повторный запуск не делает его новым базовым.
+
+Usage:
+    python -m src.main.python.benchmarking.benchmark_pipeline --limit 20 --device cpu
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+from datetime import datetime, timezone
+from src.main.resources.config import (
+    MODEL_NAME, BATCH_SIZE, CONFIDENCE_THRESHOLD, IOU_THRESHOLD, OUTLIER_THRESHOLD_K,
+    SLICE_SIZE, OVERLAPPING_PERCENTAGE, DATASET_FOLDER, BENCHMARK_MAX_REGRESSION, BENCHMARK_BASELINE_RUNS
+)
+from src.main.python.utils.utils import get_rss_mb, get_peak_rss_mb
+from src.main.python.image_slicer.image_slicer import load_image_array, get_slice_grid, iter_array_slices
+from src.main.python.model.yolo import predict_tiles
+from src.main.python.model.backends import load_model
+from src.main.python.image_slicer.raster_cache import RasterCache
+from src.main.python.iou_filter.iou_filter import filter_iou
+from src.main.python.outlier_filter.outlier_filter import filter_outliers
+from src.main.python.benchmarking.benchmarking import load_benchmark, find_benchmark_images, evaluate_counts
+from src.main.python.manifest.manifest import scan_manifest
+
+HISTORY_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark_history.jsonl")
+STAGES = ("slicing", "inference", "iou_filter", "outlier_filter")
+
+
+def get_git_sha():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmark(model, image_paths, device=None, batch_size=BATCH_SIZE, conf=CONFIDENCE_THRESHOLD,
+                  iou_threshold=IOU_THRESHOLD, threshold_k=OUTLIER_THRESHOLD_K, raster_cache=None):
+    """
+    Прогоняет пайплайн по стадиям на каждом кадре.
+    С raster_cache стадия нарезки открывает декодированные кадры из кэша (RasterCache).
+
+    Returns:
+        (dict image_name -> количество, dict стадия -> секунд, число фрагментов, пиковый RSS в МБ)
+        Пиковый RSS - максимум процесса по getrusage (включая пики внутри кадра);
+        где он недоступен - максимум замеров между кадрами.
+    """
+    stage_times = dict.fromkeys(STAGES, 0.0)
+    predicted_counts = {}
+    tiles_count = 0
+    peak_rss = get_rss_mb() or 0.0
+    for image_name, image_path in image_paths.items():
+        start_time = time.perf_counter()
+        image_array = load_image_array(image_path, raster_cache=raster_cache)
+        grid = get_slice_grid(image_array.shape[1], image_array.shape[0])
+        tiles = list(iter_array_slices(image_array, grid))
+        stage_times["slicing"] += time.perf_counter() - start_time
+
+        start_time = time.perf_counter()
+        detections = predict_tiles(model, tiles, batch_size, device, conf, image_path)
+        stage_times["inference"] += time.perf_counter() - start_time
+
+        start_time = time.perf_counter()
+        detections = filter_iou(detections, iou_threshold)
+        stage_times["iou_filter"] += time.perf_counter() - start_time
+
+        start_time = time.perf_counter()
+        detections = filter_outliers(detections, threshold_k)
+        stage_times["outlier_filter"] += time.perf_counter() - start_time
+
+        predicted_counts[image_name] = len(detections)
+        tiles_count += len(tiles)
+        peak_rss = max(peak_rss, get_rss_mb() or 0.0)
+    peak_rss = max(peak_rss, get_peak_rss_mb() or 0.0)
+    return predicted_counts, stage_times, tiles_count, peak_rss
+
+
+def load_history(history_file=HISTORY_FILE):
+    if not os.path.exists(history_file):
+        return []
+    with open(history_file) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def append_history(record, history_file=HISTORY_FILE):
+    with open(history_file, "a") as f:
+        f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+
+def check_regression(record, history, max_regression=BENCHMARK_MAX_REGRESSION, baseline_runs=BENCHMARK_BASELINE_RUNS):
+    """
+    Сравнивает tiles/s с лучшим из последних baseline_runs запусков той же конфигурации,
+    чтобы медленное падение на несколько процентов за запуск тоже накапливалось.
+
+    Returns:
+        (базовый запуск или None, падение в процентах или None, True если падение больше max_regression)
+    """
+    previous = [run for run in history if run.get("config") == record["config"]][-baseline_runs:]
+    if not previous:
+        return None, None, False
+    baseline = max(previous, key=lambda run: run["tiles_per_second"])
+    drop = (1 - record["tiles_per_second"] / baseline["tiles_per_second"]) * 100
+    return baseline, drop, drop > max_regression
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end pipeline throughput and accuracy benchmark")
+    parser.add_argument("--model", default=MODEL_NAME, help=f"Model name without extension (default: {MODEL_NAME})")
+    parser.add_argument("--model-format", default=".pt", help="Model format: .pt, .onnx or _openvino_model (default: .pt)")
+    parser.add_argument("--device", default=None, help="Device for inference")
+    parser.add_argument("--dataset-folder", default=DATASET_FOLDER, help=f"Folder with benchmark images (default: {DATASET_FOLDER})")
+    parser.add_argument("--manifest", action="store_true",
+                        help="Scan the dataset folder into the manifest once and list images from it")
+    parser.add_argument("--limit", type=int, default=None, help="Number of benchmark images to use")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help=f"Batch size (default: {BATCH_SIZE})")
+    parser.add_argument("--history", default=HISTORY_FILE, help=f"History file (default: {HISTORY_FILE})")
+    parser.add_argument("--max-regression", type=float, default=BENCHMARK_MAX_REGRESSION,
+                        help=f"Allowed tiles/s drop in percent vs the best recent run (default: {BENCHMARK_MAX_REGRESSION})")
+    parser.add_argument("--baseline-runs", type=int, default=BENCHMARK_BASELINE_RUNS,
+                        help=f"Number of recent runs to pick the baseline from (default: {BENCHMARK_BASELINE_RUNS})")
+    parser.add_argument("--no-history", action="store_true", help="Do not append this run to the history file")
+    parser.add_argument("--raster-cache", action="store_true", help="Open decoded frames from the raster cache")
+    args = parser.parse_args()
+
+    benchmark = load_benchmark()
+    manifest = scan_manifest(args.dataset_folder) if args.manifest else None
+    image_paths = dict(list(find_benchmark_images(benchmark, args.dataset_folder, manifest).items())[:args.limit])
+    if manifest is not None:
+        manifest.close()
+    model = load_model(args.model, args.model_format, args.device)
+    raster_cache = RasterCache() if args.raster_cache else None
+    if raster_cache is not None:
+        # С --raster-cache замеряется теплый кэш: иначе первый запуск декодировал бы кадры
+        # и попадал в историю под той же конфигурацией, что и последующие
+        for image_path in image_paths.values():
+            raster_cache.load(image_path)
+    # Прогрев: первый батч включает инициализацию модели
+    if image_paths:
+        run_benchmark(model, dict(list(image_paths.items())[:1]), args.device, args.batch_size,
+                      raster_cache=raster_cache)
+
+    start_time = time.perf_counter()
+    predicted_counts, stage_times, tiles_count, peak_rss = run_benchmark(model, image_paths, args.device, args.batch_size,
+                                                                         raster_cache=raster_cache)
+    elapsed = time.perf_counter() - start_time
+    _, mae = evaluate_counts(benchmark, predicted_counts)
+
+    record = {
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "git_sha": get_git_sha(),
+        "config": {
+            "model": args.model,
+            "model_format": args.model_format,
+            "device": args.device,
+            "batch_size": args.batch_size,
+            "confidence_threshold": CONFIDENCE_THRESHOLD,
+            "iou_threshold": IOU_THRESHOLD,
+            "outlier_threshold_k": OUTLIER_THRESHOLD_K,
+            "slice_size": SLICE_SIZE,
+            "overlapping_percentage": OVERLAPPING_PERCENTAGE,
+            "images": len(image_paths),
+            "raster_cache": args.raster_cache,
+        },
+        "stage_seconds": {stage: round(seconds, 4) for stage, seconds in stage_times.items()},
+        "seconds": round(elapsed, 4),
+        "tiles": tiles_count,
+        "tiles_per_second": tiles_count / elapsed if elapsed else 0.0,
+        "images_per_second": len(image_paths) / elapsed if elapsed else 0.0,
+        "peak_rss_mb": round(peak_rss, 1),
+        "mae": mae,
+    }
+
+    print(f"{'stage':<16}{'seconds':>10}{'share':>8}")
+    for stage, seconds in stage_times.items():
+        print(f"{stage:<16}{seconds:>10.2f}{seconds / elapsed * 100 if elapsed else 0:>7.1f}%")
+    print(f"Кадров: {len(image_paths)}, фрагментов: {tiles_count}, {record['tiles_per_second']:.1f} фрагментов/с, "
+          f"{record['images_per_second']:.2f} изображений/с")
+    print(f"Пиковая память: {peak_rss:.0f} МБ, MAE: {mae:.3f}")
+
+    baseline, drop, regressed = check_regression(record, load_history(args.history), args.max_regression,
+                                                 args.baseline_runs)
+    if baseline is not None:
+        print(f"Относительно {baseline['git_sha'] or 'лучшего из последних запусков'} ({baseline['timestamp']}): "
+              f"{baseline['tiles_per_second']:.1f} -> {record['tiles_per_second']:.1f} фрагментов/с ({-drop:+.1f}%)")
+    if regressed:
+        print(f"Пропускная способность упала больше чем на {args.max_regression}%, запуск не записан в историю")
+        sys.exit(1)
+    if not args.no_history:
+        append_history(record, args.history)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Оценка предварительного отсева пустых фрагментов (prescreen) на кадрах бенчмарка.
+
+Для каждого кадра считаются: доля отсеянных фрагментов, полнота сырых детекций
+(доля детекций полного прогона, попавших на оставленные фрагменты) и итоговый подсчет
+с отсевом и без. Инференс полного прогона идет через DetectionCache, поэтому прогон
+с отсевом и повторные запуски с другими порогами не пересчитывают модель.
+
+Usage:
+    python -m src.main.python.benchmarking.benchmark_prescreen --limit 20
+    python -m src.main.python.benchmarking.benchmark_prescreen --min-std 6 --min-edge-density 0.001
+"""
+
+import os
+import time
+import argparse
+import numpy as np
+from src.main.resources.config import (
+    MODEL_NAME, BATCH_SIZE, CONFIDENCE_THRESHOLD, IOU_THRESHOLD, OUTLIER_THRESHOLD_K, DATASET_FOLDER,
+    PRESCREEN_DOWNSAMPLE, PRESCREEN_EDGE_THRESHOLD, PRESCREEN_MIN_EDGE_DENSITY, PRESCREEN_MIN_STD
+)
+from src.main.python.utils.utils import get_slice_coordinates
+from src.main.python.image_slicer.image_slicer import load_image_array, get_slice_grid, iter_array_slices
+from src.main.python.model.yolo import predict_tiles
+from src.main.python.model.backends import load_model
+from src.main.python.model.detection_cache import DetectionCache
+from src.main.python.iou_filter.iou_filter import filter_iou
+from src.main.python.outlier_filter.outlier_filter import filter_outliers
+from src.main.python.prescreen.prescreen import prescreen_tiles
+from src.main.python.benchmarking.benchmarking import load_benchmark, find_benchmark_images, evaluate_counts
+from src.main.python.manifest.manifest import scan_manifest
+
+
+def evaluate_tile_selection(model, image_paths, select_tiles, device=None, batch_size=BATCH_SIZE,
+                            conf=CONFIDENCE_THRESHOLD, iou_threshold=IOU_THRESHOLD, threshold_k=OUTLIER_THRESHOLD_K,
+                            cache=None):
+    """
+    Сравнивает прогон по полной сетке фрагментов с прогоном по отобранным фрагментам.
+
+    Args:
+        select_tiles: функция (image_array, tiles, stats) -> отобранные фрагменты;
+            сама добавляет в stats счетчики 'tiles' и 'skipped'
+
+    Returns:
+        (dict image_name -> количество по полной сетке, dict image_name -> количество по отобранным,
+         stats: tiles, skipped, raw_detections, raw_kept, select_seconds)
+    """
+    full_counts = {}
+    selected_counts = {}
+    stats = {"tiles": 0, "skipped": 0, "raw_detections": 0, "raw_kept": 0, "select_seconds": 0.0}
+    for image_name, image_path in image_paths.items():
+        image_array = load_image_array(image_path)
+        tiles = list(iter_array_slices(image_array, get_slice_grid(image_array.shape[1], image_array.shape[0])))
+
+        start_time = time.perf_counter()
+        kept_tiles = list(select_tiles(image_array, tiles, stats))
+        stats["select_seconds"] += time.perf_counter() - start_time
+
+        full = predict_tiles(model, tiles, batch_size, device, conf, image_path, cache=cache)
+        kept = predict_tiles(model, kept_tiles, batch_size, device, conf, image_path, cache=cache)
+
+        # Полнота сырых детекций: доля детекций полного прогона на отобранных фрагментах
+        kept_offsets = {(left, top) for _, _, left, top, _ in kept_tiles}
+        tile_kept = np.array([get_slice_coordinates(os.path.basename(source)) in kept_offsets
+                              for source in full.sources], dtype=bool)
+        stats["raw_detections"] += len(full)
+        stats["raw_kept"] += int(tile_kept[full.tile_id].sum()) if len(full) else 0
+
+        full_counts[image_name] = len(filter_outliers(filter_iou(full, iou_threshold), threshold_k))
+        selected_counts[image_name] = len(filter_outliers(filter_iou(kept, iou_threshold), threshold_k))
+    return full_counts, selected_counts, stats
+
+
+def print_tile_selection(benchmark, full_counts, selected_counts, stats):
+    """
+    Отчет evaluate_tile_selection: доля пропущенных фрагментов, полнота сырых детекций и MAE подсчета.
+    """
+    _, full_mae = evaluate_counts(benchmark, full_counts)
+    _, selected_mae = evaluate_counts(benchmark, selected_counts)
+    skipped_fraction = stats["skipped"] / stats["tiles"] if stats["tiles"] else 0.0
+    recall = stats["raw_kept"] / stats["raw_detections"] if stats["raw_detections"] else 1.0
+    print(f"Пропущено фрагментов: {stats['skipped']} из {stats['tiles']} ({skipped_fraction:.1%}), "
+          f"отбор {1000 * stats['select_seconds'] / max(stats['tiles'], 1):.2f} мс на фрагмент полной сетки")
+    print(f"Полнота сырых детекций: {stats['raw_kept']} из {stats['raw_detections']} ({recall:.2%})")
+    print(f"MAE по полной сетке: {full_mae:.3f}, по отобранным фрагментам: {selected_mae:.3f}")
+    changed = sorted(image_name for image_name in full_counts if full_counts[image_name] != selected_counts[image_name])
+    if changed:
+        print(f"Подсчет изменился на {len(changed)} кадрах: "
+              + ", ".join(f"{image_name} ({full_counts[image_name]} -> {selected_counts[image_name]})"
+                          for image_name in changed[:10]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure skipped tiles and recall impact of the empty-tile prescreen")
+    parser.add_argument("--model", default=MODEL_NAME, help=f"Model name without extension (default: {MODEL_NAME})")
+    parser.add_argument("--model-format", default=".pt", help="Model format: .pt, .onnx or _openvino_model (default: .pt)")
+    parser.add_argument("--device", default=None, help="Device for inference")
+    parser.add_argument("--dataset-folder", default=DATASET_FOLDER, help=f"Folder with benchmark images (default: {DATASET_FOLDER})")
+    parser.add_argument("--manifest", action="store_true",
+                        help="Scan the dataset folder into the manifest once and list images from it")
+    parser.add_argument("--limit", type=int, default=None, help="Number of benchmark images to use")
+    parser.add_argument("--min-std", type=float, default=PRESCREEN_MIN_STD,
+                        help=f"Minimum brightness std of a candidate tile (default: {PRESCREEN_MIN_STD})")
+    parser.add_argument("--min-edge-density", type=float, default=PRESCREEN_MIN_EDGE_DENSITY,
+                        help=f"Minimum edge pixel fraction of a candidate tile (default: {PRESCREEN_MIN_EDGE_DENSITY})")
+    parser.add_argument("--edge-threshold", type=float, default=PRESCREEN_EDGE_THRESHOLD,
+                        help=f"Brightness gradient counted as an edge (default: {PRESCREEN_EDGE_THRESHOLD})")
+    parser.add_argument("--downsample", type=int, default=PRESCREEN_DOWNSAMPLE,
+                        help=f"Downsampling factor for tile features (default: {PRESCREEN_DOWNSAMPLE})")
+    parser.add_argument("--no-cache", action="store_true", help="Do not use the detection cache")
+    args = parser.parse_args()
+
+    benchmark = load_benchmark()
+    manifest = scan_manifest(args.dataset_folder) if args.manifest else None
+    image_paths = dict(list(find_benchmark_images(benchmark, args.dataset_folder, manifest).items())[:args.limit])
+    if manifest is not None:
+        manifest.close()
+    print(f"Кадров: {len(image_paths)}")
+
+    model = load_model(args.model, args.model_format, args.device)
+    cache = None if args.no_cache else DetectionCache()
+    thresholds = dict(min_std=args.min_std, min_edge_density=args.min_edge_density,
+                      downsample=args.downsample, edge_threshold=args.edge_threshold)
+    full_counts, prescreen_counts, stats = evaluate_tile_selection(
+        model, image_paths, lambda image_array, tiles, stats: prescreen_tiles(tiles, stats, **thresholds),
+        args.device, cache=cache
+    )
+    print_tile_selection(benchmark, full_counts, prescreen_counts, stats)
+    if cache is not None:
+        print(cache)
+
+
+if __name__ == "__main__":
+    main()
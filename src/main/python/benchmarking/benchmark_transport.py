@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Накладные расходы передачи фрагментов между процессами: pickle через multiprocessing.Queue
+(как в Pool.imap) против кольцевого буфера в shared_memory.
+
+Usage:
+    python -m src.main.python.benchmarking.benchmark_transport --tiles 2000
+"""
+
+import time
+import argparse
+import multiprocessing as mp
+import numpy as np
+from src.main.resources.config import SLICE_SIZE, SHARED_TILE_SLOTS
+from src.main.python.pipeline.shared_tiles import TileRingBuffer
+
+
+def _pickle_producer(queue, tiles_count, slice_size, seed):
+    tile = np.random.default_rng(seed).integers(0, 256, (slice_size, slice_size, 3), dtype=np.uint8)
+    for _ in range(tiles_count):
+        queue.put(tile)
+    queue.put(None)
+
+
+def _shared_producer(ring, tiles_count, slice_size, seed):
+    tile = np.random.default_rng(seed).integers(0, 256, (slice_size, slice_size, 3), dtype=np.uint8)
+    for _ in range(tiles_count):
+        ring.write(tile, None)
+    ring.send("done")
+    ring.close()
+
+
+def measure_transport(tiles_count, slice_size=SLICE_SIZE, slots=SHARED_TILE_SLOTS, seed=0):
+    """
+    Время передачи одного фрагмента из процесса-декодера в текущий процесс:
+    через multiprocessing.Queue (pickle и копирование) и через TileRingBuffer.
+    Потребитель в обоих случаях читает фрагмент (сумма одного пикселя), чтобы данные были затронуты.
+
+    Returns:
+        dict способ -> микросекунд на фрагмент
+    """
+    context = mp.get_context("spawn")
+    results = {}
+
+    queue = context.Queue(maxsize=slots)
+    producer = context.Process(target=_pickle_producer, args=(queue, tiles_count, slice_size, seed))
+    producer.start()
+    # Первый фрагмент не учитываем: в нем время запуска процесса
+    queue.get()
+    start_time = time.perf_counter()
+    checksum = 0
+    for _ in range(tiles_count - 1):
+        checksum += int(queue.get()[0, 0, 0])
+    results["pickle"] = (time.perf_counter() - start_time) / (tiles_count - 1) * 1e6
+    queue.get()
+    producer.join()
+
+    ring = TileRingBuffer(slots, slice_size, context)
+    producer = context.Process(target=_shared_producer, args=(ring, tiles_count, slice_size, seed))
+    producer.start()
+    slot, view, _ = ring.read()
+    ring.release(slot)
+    start_time = time.perf_counter()
+    for _ in range(tiles_count - 1):
+        slot, view, _ = ring.read()
+        checksum += int(view[0, 0, 0])
+        ring.release(slot)
+    results["shared_memory"] = (time.perf_counter() - start_time) / (tiles_count - 1) * 1e6
+    ring.read()
+    producer.join()
+    ring.close(unlink=True)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare per-tile transport overhead: pickling vs shared memory")
+    parser.add_argument("--tiles", type=int, default=2000, help="Number of tiles to transfer (default: 2000)")
+    parser.add_argument("--slice-size", type=int, default=SLICE_SIZE, help=f"Tile size (default: {SLICE_SIZE})")
+    parser.add_argument("--slots", type=int, default=SHARED_TILE_SLOTS, help=f"Ring buffer slots (default: {SHARED_TILE_SLOTS})")
+    args = parser.parse_args()
+
+    tile_mb = args.slice_size * args.slice_size * 3 / 2 ** 20
+    results = measure_transport(args.tiles, args.slice_size, args.slots)
+    print(f"Фрагментов: {args.tiles}, {tile_mb:.2f} МБ на фрагмент")
+    print(f"{'transport':<16}{'us/tile':>10}{'MB/s':>10}")
+    for transport, microseconds in results.items():
+        print(f"{transport:<16}{microseconds:>10.1f}{tile_mb / microseconds * 1e6:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+import os
+import pandas as pd
+from src.main.resources.config import DATASET_FOLDER
+from src.main.python.manifest.manifest import list_images
+
+BENCHMARK_CSV = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmarking.csv")
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+
+
+def load_benchmark(csv_path=BENCHMARK_CSV):
+    """
+    Таблица бенчмарка: image_name, number_of_saigas
+    """
+    return pd.read_csv(csv_path)
+
+
+def find_benchmark_images(benchmark, dataset_folder=DATASET_FOLDER, manifest=None):
+    """
+    Сопоставляет кадры бенчмарка с файлами в dataset_folder по имени без расширения.
+    С manifest список файлов берется из манифеста датасета (см. list_images).
+
+    Returns:
+        dict image_name -> путь к изображению, только для найденных кадров
+    """
+    image_names = set(benchmark['image_name'])
+    image_paths = {}
+    for image_path in list_images(dataset_folder, IMAGE_EXTENSIONS, manifest):
+        image_name = os.path.splitext(os.path.basename(image_path))[0]
+        if image_name in image_names:
+            image_paths[image_name] = image_path
+    missing = len(image_names) - len(image_paths)
+    if missing:
+        print(f"Не найдено {missing} изображений бенчмарка в {dataset_folder}")
+    return image_paths
+
+
+def evaluate_counts(benchmark, predicted_counts):
+    """
+    Ошибки подсчета по кадрам, в формате benchmarking_with_predictions_iou_mae.csv.
+
+    mae_accuracy = 100 - absolute_error / MAE, где MAE - средняя ошибка по всем оцененным кадрам.
+
+    Args:
+        predicted_counts: dict image_name -> предсказанное количество; кадры без предсказания не учитываются
+
+    Returns:
+        (таблица с колонками predicted_count, absolute_error, mae_accuracy; MAE)
+    """
+    results = benchmark[benchmark['image_name'].isin(list(predicted_counts))].copy()
+    results['predicted_count'] = results['image_name'].map(predicted_counts).astype(float)
+    results['absolute_error'] = (results['number_of_saigas'] - results['predicted_count']).abs()
+    mae = results['absolute_error'].mean() if len(results) else 0.0
+    results['mae_accuracy'] = 100 - results['absolute_error'] / mae if mae > 0 else 100.0
+    return results, mae
@@ -0,0 +1,311 @@
+#!/usr/bin/env python3
+"""
+Микробенчмарки примитивов пайплайна на синтетических данных с фиксированным seed.
+
+Каждый бенчмарк задает эталонную реализацию (первую в списке) и альтернативные;
+для альтернатив проверяется, что результат совпадает с эталоном. Если бенчмарк знает
+ожидаемый результат (запись и чтение аннотаций), с ним сверяются все реализации.
+Новый быстрый движок добавляется в словарь реализаций нужного бенчмарка и сразу проверяется:
+те же проверки на малых размерах запускает pytest (src/test/python/benchmarking).
+Эталоны исходных фильтров лежат в модуле reference.
+
+Usage:
+    python -m src.main.python.benchmarking.micro_benchmarks --sizes 100 1000 10000 100000
+    python -m src.main.python.benchmarking.micro_benchmarks --only filter_iou filter_outliers --sizes 10000
+"""
+
+import os
+import sys
+import copy
+import time
+import argparse
+import tempfile
+import numpy as np
+from PIL import Image
+from src.main.resources.config import SLICE_SIZE, OVERLAPPING_PERCENTAGE, IOU_THRESHOLD
+from src.main.python.image_slicer.image_slicer import create_image_slices, iter_image_slices, get_slice_filename
+from src.main.python.iou_filter.iou_filter import calculate_iou, pairwise_iou, filter_iou, update_coordinates
+from src.main.python.outlier_filter.outlier_filter import filter_outliers
+from src.main.python.detections.detections import Detections
+from src.main.python.model.yolo import create_annotation_file, read_annotation_folder
+from src.main.python.utils.visualization import draw_bounding_boxes_on_image
+from src.main.python.decoder.decoder import decode_image, get_jpeg_decoder, JPEG_BACKENDS
+from src.main.python.benchmarking.synthetic import generate_aerial_image, generate_seam_boxes
+from src.main.python.benchmarking.reference import reference_filter_iou, reference_outliers
+
+# Квадратичные эталоны (полный перебор пар) запускаются только до этого числа боксов
+REFERENCE_MAX_BOXES = 10000
+
+
+def _measure(implementation, repeat):
+    """
+    Лучшее время из repeat запусков и результат последнего.
+
+    Args:
+        implementation: функция без аргументов или пара (setup, function) -
+            тогда замеряется только function(setup())
+    """
+    setup, function = implementation if isinstance(implementation, tuple) else (lambda: None, None)
+    best = float("inf")
+    output = None
+    for _ in range(repeat):
+        if function is None:
+            start_time = time.perf_counter()
+            output = implementation()
+        else:
+            argument = setup()
+            start_time = time.perf_counter()
+            output = function(argument)
+        best = min(best, time.perf_counter() - start_time)
+    return best, output
+
+
+def _boxes_equal(first, second, atol=1e-4):
+    """
+    Списки словарей {'source_image_path', 'coordinates'} совпадают с точностью до atol.
+    """
+    first = sorted(first, key=lambda boxes: boxes['source_image_path'])
+    second = sorted(second, key=lambda boxes: boxes['source_image_path'])
+    if [boxes['source_image_path'] for boxes in first] != [boxes['source_image_path'] for boxes in second]:
+        return False
+    for first_boxes, second_boxes in zip(first, second):
+        first_coordinates = np.array(first_boxes['coordinates'], dtype=np.float64).reshape(-1, 4)
+        second_coordinates = np.array(second_boxes['coordinates'], dtype=np.float64).reshape(-1, 4)
+        if first_coordinates.shape != second_coordinates.shape or not np.allclose(first_coordinates, second_coordinates, atol=atol):
+            return False
+    return True
+
+
+def _with_global_coordinates(boxes_list):
+    # update_coordinates меняет координаты на месте - работаем с копией
+    return update_coordinates(copy.deepcopy(boxes_list))
+
+
+def _quiet(function):
+    # Фильтры печатают статистику на каждый вызов - в бенчмарке она не нужна
+    def wrapper(*args):
+        with open(os.devnull, "w") as devnull:
+            stdout, sys.stdout = sys.stdout, devnull
+            try:
+                return function(*args)
+            finally:
+                sys.stdout = stdout
+    return wrapper
+
+
+def bench_create_image_slices(size, seed, temp_folder):
+    # size - число фрагментов: кадр подбирается так, чтобы сетка содержала около size фрагментов
+    step = SLICE_SIZE - SLICE_SIZE * OVERLAPPING_PERCENTAGE // 100
+    side = max(1, int(round(np.sqrt(size))))
+    image_path = os.path.join(temp_folder, f"aerial_{size}.jpg")
+    Image.fromarray(generate_aerial_image(side * step + SLICE_SIZE - step, side * step + SLICE_SIZE - step, seed)).save(image_path)
+    slices_folder = os.path.join(temp_folder, f"slices_{size}")
+    base_name = os.path.splitext(os.path.basename(image_path))[0]
+
+    def read_slices(slices):
+        # Фрагменты на диске читаются при сравнении, вне замера
+        if not isinstance(slices, str):
+            return slices
+        folder = os.path.join(slices, base_name)
+        return {filename: np.asarray(Image.open(os.path.join(folder, filename)).convert("RGB"))
+                for filename in sorted(os.listdir(folder))}
+
+    def in_memory():
+        return {get_slice_filename(base_name, row, col, left, top): slice
+                for row, col, left, top, slice in iter_image_slices(image_path)}
+
+    implementations = {
+        "create_image_slices": lambda: (create_image_slices(image_path, destination_folder=slices_folder), slices_folder)[1],
+        "iter_image_slices": in_memory,
+    }
+
+    def compare(reference, output):
+        reference, output = read_slices(reference), read_slices(output)
+        return reference.keys() == output.keys() and all(np.array_equal(reference[key], output[key]) for key in reference)
+    return implementations, compare, None
+
+
+def bench_calculate_iou(size, seed, temp_folder):
+    # size - число пар: IoU всех пар двух наборов по sqrt(size) боксов
+    rng = np.random.default_rng(seed)
+    count = max(1, int(round(np.sqrt(size))))
+    xy = rng.random((count, 2, 2)) * 100
+    boxes1 = np.hstack([xy[:, 0], xy[:, 0] + rng.random((count, 2)) * 30 + 1])
+    boxes2 = np.hstack([xy[:, 1], xy[:, 1] + rng.random((count, 2)) * 30 + 1])
+    boxes1_list, boxes2_list = boxes1.tolist(), boxes2.tolist()
+    implementations = {
+        "calculate_iou": lambda: np.array([[calculate_iou(a, b) for b in boxes2_list] for a in boxes1_list]),
+        "pairwise_iou": lambda: pairwise_iou(boxes1, boxes2),
+    }
+    return implementations, lambda reference, output: np.allclose(reference, output), None
+
+
+def bench_filter_iou(size, seed, temp_folder):
+    boxes_list = generate_seam_boxes(size, seed)
+    implementations = {}
+    # filter_iou для списка словарей меняет вход - копия готовится вне замера
+    if size <= REFERENCE_MAX_BOXES:
+        implementations["reference"] = (lambda: copy.deepcopy(boxes_list), reference_filter_iou)
+        implementations["python"] = (lambda: copy.deepcopy(boxes_list),
+                                     _quiet(lambda boxes: filter_iou(boxes, IOU_THRESHOLD, backend="python")))
+    implementations["numpy"] = (lambda: copy.deepcopy(boxes_list), _quiet(lambda boxes: filter_iou(boxes, IOU_THRESHOLD)))
+    detections = Detections.from_boxes_list(boxes_list)
+    implementations["detections"] = _quiet(lambda: filter_iou(detections, IOU_THRESHOLD).to_boxes_list())
+    return implementations, _boxes_equal, None
+
+
+def bench_update_coordinates(size, seed, temp_folder):
+    boxes_list = generate_seam_boxes(size, seed)
+    implementations = {
+        # update_coordinates меняет вход - копия готовится вне замера
+        "update_coordinates": (lambda: copy.deepcopy(boxes_list), update_coordinates),
+        "Detections": lambda: Detections.from_boxes_list(boxes_list).to_boxes_list(),
+    }
+    return implementations, _boxes_equal, None
+
+
+def bench_filter_outliers(size, seed, temp_folder):
+    boxes_list = _with_global_coordinates(generate_seam_boxes(size, seed))
+    detections = Detections.from_boxes_list(boxes_list, local=False)
+    implementations = {
+        "reference": lambda: reference_outliers(boxes_list),
+        "numpy": lambda: filter_outliers(boxes_list),
+        "detections": lambda: filter_outliers(detections).to_boxes_list(),
+    }
+    return implementations, _boxes_equal, None
+
+
+def _write_annotations(boxes_list, output_folder):
+    for boxes in boxes_list:
+        folder = os.path.join(output_folder, os.path.basename(os.path.dirname(boxes['source_image_path'])))
+        os.makedirs(folder, exist_ok=True)
+        create_annotation_file(boxes['source_image_path'], boxes['coordinates'], folder)
+
+
+def _same_tiles(first, second):
+    # Сравниваем по имени фрагмента: папки аннотаций и исходных фрагментов различаются
+    def strip(boxes_list):
+        return [{'source_image_path': os.path.basename(boxes['source_image_path']), 'coordinates': boxes['coordinates']}
+                for boxes in boxes_list]
+    return _boxes_equal(strip(first), strip(second))
+
+
+def bench_create_annotation_file(size, seed, temp_folder):
+    boxes_list = generate_seam_boxes(size, seed)
+    output_folder = os.path.join(temp_folder, f"annotations_{size}")
+
+    def write():
+        _write_annotations(boxes_list, output_folder)
+        return output_folder
+
+    return {"create_annotation_file": write}, lambda expected, output: _same_tiles(expected, read_annotation_folder(output)), boxes_list
+
+
+def bench_read_annotation_folder(size, seed, temp_folder):
+    boxes_list = generate_seam_boxes(size, seed)
+    output_folder = os.path.join(temp_folder, f"read_annotations_{size}")
+    _write_annotations(boxes_list, output_folder)
+    return {"read_annotation_folder": lambda: read_annotation_folder(output_folder)}, _same_tiles, boxes_list
+
+
+def bench_draw_bounding_boxes(size, seed, temp_folder):
+    image_path = os.path.join(temp_folder, "draw_source.png")
+    if not os.path.exists(image_path):
+        Image.fromarray(generate_aerial_image(4000, 3000, seed)).save(image_path)
+    boxes = [box for boxes in _with_global_coordinates(generate_seam_boxes(size, seed)) for box in boxes['coordinates']]
+    output_path = os.path.join(temp_folder, f"draw_{size}.png")
+
+    def draw():
+        _quiet(lambda: draw_bounding_boxes_on_image(image_path, boxes, output_path))()
+        return np.asarray(Image.open(output_path))
+
+    return {"draw_bounding_boxes_on_image": draw}, lambda reference, output: np.array_equal(reference, output), None
+
+
+def bench_decode_image(size, seed, temp_folder):
+    # size - мегапиксели JPEG-кадра 4:3
+    width = int(round(np.sqrt(size * 1e6 * 4 / 3)))
+    image_path = os.path.join(temp_folder, f"decode_{size}.jpg")
+    Image.fromarray(generate_aerial_image(width, width * 3 // 4, seed)).save(image_path, quality=95)
+    implementations = {"pil": lambda: decode_image(image_path, backend="pil")}
+    for backend in JPEG_BACKENDS:
+        try:
+            get_jpeg_decoder(backend)
+        except ValueError:
+            continue
+        implementations[backend] = lambda backend=backend: decode_image(image_path, backend=backend)
+    # Уменьшенные в DCT-области кадры сверяются с полным декодированием, уменьшенным усреднением блоков
+    for scale in (2, 4, 8):
+        implementations[f"pil 1/{scale}"] = lambda scale=scale: decode_image(image_path, scale, backend="pil")
+
+    def compare(reference, output):
+        if output.shape != reference.shape:
+            scale = int(round(reference.shape[1] / output.shape[1]))
+            reference = np.asarray(Image.fromarray(reference).reduce(scale))
+        # Реализации IDCT и масштабирования различаются в младших битах
+        return output.shape == reference.shape and np.abs(output.astype(np.int16) - reference).mean() < 2
+    return implementations, compare, None
+
+
+BENCHMARKS = {
+    "create_image_slices": bench_create_image_slices,
+    "calculate_iou": bench_calculate_iou,
+    "filter_iou": bench_filter_iou,
+    "update_coordinates": bench_update_coordinates,
+    "filter_outliers": bench_filter_outliers,
+    "create_annotation_file": bench_create_annotation_file,
+    "read_annotation_folder": bench_read_annotation_folder,
+    "draw_bounding_boxes_on_image": bench_draw_bounding_boxes,
+    "decode_image": bench_decode_image,
+}
+
+# Размеры для бенчмарков, где size - не число боксов
+SIZES = {
+    "create_image_slices": lambda size: min(size, 100),
+    "draw_bounding_boxes_on_image": lambda size: min(size, 10000),
+    "decode_image": lambda size: 24,
+}
+
+
+def run_benchmarks(names, sizes, seed=0, repeat=3):
+    """
+    Returns:
+        список (бенчмарк, размер, реализация, секунд, результат проверки: "reference", "ok" или "MISMATCH")
+    """
+    rows = []
+    with tempfile.TemporaryDirectory() as temp_folder:
+        for name in names:
+            for size in sorted({SIZES.get(name, lambda size: size)(size) for size in sizes}):
+                implementations, compare, expected = BENCHMARKS[name](size, seed, temp_folder)
+                reference = expected
+                for label, implementation in implementations.items():
+                    seconds, output = _measure(implementation, repeat)
+                    if reference is None:
+                        reference = output
+                        check = "reference"
+                    else:
+                        check = "ok" if compare(reference, output) else "MISMATCH"
+                    rows.append((name, size, label, seconds, check))
+                    print(f"{name:<30}{size:>8}  {label:<28}{seconds * 1000:>12.2f}{check:>12}", flush=True)
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-benchmarks of pipeline primitives on seeded synthetic data")
+    parser.add_argument("--only", nargs="+", choices=list(BENCHMARKS), default=list(BENCHMARKS), help="Benchmarks to run")
+    parser.add_argument("--sizes", nargs="+", type=int, default=[100, 1000, 10000, 100000],
+                        help="Problem sizes: boxes, box pairs or tiles (default: 100 1000 10000 100000)")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the synthetic generators (default: 0)")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per measurement, best time is reported (default: 3)")
+    args = parser.parse_args()
+
+    print(f"{'benchmark':<30}{'size':>8}  {'implementation':<28}{'ms':>12}{'check':>12}")
+    rows = run_benchmarks(args.only, args.sizes, args.seed, args.repeat)
+    mismatches = [row for row in rows if row[4] == "MISMATCH"]
+    if mismatches:
+        print(f"Расхождение с эталоном: {', '.join(f'{name}/{label} ({size})' for name, size, label, _, _ in mismatches)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+import numpy as np
+from src.main.resources.config import IOU_THRESHOLD, OUTLIER_THRESHOLD_K
+from src.main.python.iou_filter.iou_filter import calculate_iou, update_coordinates
+from src.main.python.utils.utils import get_source_image_name
+
+
+def reference_filter_iou(boxes_list, iou_threshold=IOU_THRESHOLD):
+    """
+    Исходная реализация filter_iou: полный перебор пар с calculate_iou и списком дубликатов
+    по значению координат. Как и сейчас, боксы сравниваются только в пределах своего
+    исходного изображения. Эталон для micro_benchmarks и тестов.
+    """
+    new_boxes_list = update_coordinates(boxes_list)
+    images = {}
+    for box_group in new_boxes_list:
+        images.setdefault(get_source_image_name(box_group['source_image_path']), []).extend(box_group['coordinates'])
+    duplicates_lists = {}
+    for image_name, all_boxes in images.items():
+        duplicates_list = duplicates_lists[image_name] = []
+        for i in range(len(all_boxes)):
+            for j in range(i + 1, len(all_boxes)):
+                if calculate_iou(all_boxes[i], all_boxes[j]) > iou_threshold:
+                    if all_boxes[i] not in duplicates_list:
+                        duplicates_list.append(all_boxes[i])
+                    elif all_boxes[j] not in duplicates_list:
+                        duplicates_list.append(all_boxes[j])
+    filtered_boxes_list = []
+    for boxes in new_boxes_list:
+        duplicates_list = duplicates_lists[get_source_image_name(boxes['source_image_path'])]
+        coordinates = [box for box in boxes['coordinates'] if box not in duplicates_list]
+        if coordinates:
+            filtered_boxes_list.append({'source_image_path': boxes['source_image_path'], 'coordinates': coordinates})
+    return filtered_boxes_list
+
+
+def reference_outliers(boxes_list, threshold_k=OUTLIER_THRESHOLD_K):
+    """
+    Исходная реализация filter_outliers: np.percentile отдельно для каждого фрагмента.
+    """
+    filtered_boxes_list = []
+    for boxes in boxes_list:
+        areas = [(box[2] - box[0]) * (box[3] - box[1]) for box in boxes['coordinates']]
+        if not areas:
+            continue
+        q1, q3 = np.percentile(areas, 25), np.percentile(areas, 75)
+        lower_bound, upper_bound = q1 - threshold_k * (q3 - q1), q3 + threshold_k * (q3 - q1)
+        coordinates = [box for box, area in zip(boxes['coordinates'], areas) if lower_bound < area < upper_bound]
+        if coordinates:
+            filtered_boxes_list.append({'source_image_path': boxes['source_image_path'], 'coordinates': coordinates})
+    return filtered_boxes_list
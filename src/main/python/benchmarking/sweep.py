@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+Перебор параметров постобработки (порог уверенности x IOU_THRESHOLD x OUTLIER_THRESHOLD_K)
+на кадрах бенчмарка без повторного инференса.
+
+Сырые детекции считаются один раз с минимальным порогом уверенности и max_det = SWEEP_MAX_DET
+(или берутся из DetectionCache), после чего каждая точка сетки - только фильтрация в памяти.
+Ограничение PREDICT_MAX_DET боксов на фрагмент применяется после фильтра по conf, как это
+делает модель, поэтому результат совпадает с инференсом при каждом conf сетки. Расходиться
+он может, только если у фрагмента больше SWEEP_MAX_DET боксов.
+
+Usage:
+    python -m src.main.python.benchmarking.sweep --confs 0.3:0.7:0.05 --ious 0.3:0.7:0.05 --ks 1:5:0.5
+"""
+
+import os
+import time
+import argparse
+import itertools
+import numpy as np
+import pandas as pd
+from multiprocessing import Pool, cpu_count
+from src.main.resources.config import MODEL_NAME, BATCH_SIZE, DATASET_FOLDER, PREDICT_MAX_DET, SWEEP_MAX_DET
+from src.main.python.image_slicer.image_slicer import iter_image_slices
+from src.main.python.model.yolo import predict_tiles
+from src.main.python.model.backends import load_model
+from src.main.python.model.detection_cache import DetectionCache
+from src.main.python.iou_filter.iou_filter import find_image_duplicates
+from src.main.python.outlier_filter.outlier_filter import get_outlier_mask
+from src.main.python.benchmarking.benchmarking import load_benchmark, find_benchmark_images, evaluate_counts
+from src.main.python.manifest.manifest import scan_manifest
+
+SWEEP_CSV = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmarking_sweep.csv")
+
+# Сырые детекции кадров в процессах пула, задаются в _init_worker
+_images = None
+
+
+def parse_grid(values):
+    """
+    Значения сетки: список чисел и/или диапазонов "start:stop:step" (stop включительно).
+    """
+    grid = []
+    for value in values:
+        if ":" in value:
+            start, stop, step = map(float, value.split(":"))
+            grid.extend(np.round(np.arange(start, stop + step / 2, step), 6).tolist())
+        else:
+            grid.append(float(value))
+    return sorted(set(grid))
+
+
+def load_raw_detections(model, image_paths, conf, device=None, batch_size=BATCH_SIZE, cache=None, max_det=SWEEP_MAX_DET):
+    """
+    Returns:
+        dict image_name -> Detections с порогом уверенности conf, без фильтрации;
+        max_det с запасом, чтобы боксы не отсекались до фильтра по conf сетки
+    """
+    raw_detections = {}
+    for image_name, image_path in image_paths.items():
+        raw_detections[image_name] = predict_tiles(model, iter_image_slices(image_path), batch_size, device, conf,
+                                                   image_path, cache=cache, max_det=max_det)
+    return raw_detections
+
+
+def cap_per_tile(indices, tile_ids, scores, max_det=PREDICT_MAX_DET):
+    """
+    Оставляет из indices не больше max_det самых уверенных боксов каждого фрагмента, как max_det модели.
+
+    Returns:
+        отсортированные индексы оставшихся боксов
+    """
+    order = indices[np.lexsort((-scores[indices], tile_ids[indices]))]
+    sorted_tiles = tile_ids[order]
+    first = np.searchsorted(sorted_tiles, sorted_tiles, side="left")
+    return np.sort(order[np.arange(len(order)) - first < max_det])
+
+
+def _prepare_image(detections):
+    xyxy = detections.xyxy.astype(np.float64)
+    areas = (xyxy[:, 2] - xyxy[:, 0]) * (xyxy[:, 3] - xyxy[:, 1])
+    return xyxy, detections.tile_offsets()[detections.tile_id], detections.tile_id, detections.conf, areas
+
+
+def _init_worker(images):
+    global _images
+    _images = images
+
+
+def _sweep_worker(args):
+    conf, iou_threshold, threshold_ks = args
+    counts = np.zeros((len(threshold_ks), len(_images)), dtype=np.int64)
+    for image_index, (xyxy, tile_offsets, tile_ids, scores, areas) in enumerate(_images):
+        kept = cap_per_tile(np.flatnonzero(scores >= conf), tile_ids, scores)
+        # IoU фильтрация не зависит от threshold_k - считается один раз на (conf, iou)
+        duplicates = find_image_duplicates(xyxy[kept], tile_offsets[kept], tile_ids[kept], iou_threshold)
+        kept = kept[~duplicates]
+        for k_index, threshold_k in enumerate(threshold_ks):
+            counts[k_index, image_index] = int(get_outlier_mask(areas[kept], tile_ids[kept], threshold_k).sum())
+    return conf, iou_threshold, counts
+
+
+def sweep(raw_detections, benchmark, confs, iou_thresholds, threshold_ks, workers=-1):
+    """
+    Считает MAE подсчета для каждой точки сетки.
+
+    Фильтрация по conf после инференса с меньшим порогом эквивалентна инференсу с conf:
+    NMS модели подавляет боксы только более уверенными, которые не отсекаются порогом,
+    а обрезка до PREDICT_MAX_DET на фрагмент повторяется после фильтра (cap_per_tile).
+
+    Args:
+        raw_detections: результат load_raw_detections с conf <= min(confs) и max_det >= PREDICT_MAX_DET
+        workers: число процессов, -1 - все ядра, кроме одного
+
+    Returns:
+        DataFrame: conf, iou_threshold, threshold_k, mae, mae_accuracy (среднее по кадрам), отсортирован по mae
+    """
+    image_names = list(raw_detections)
+    images = [_prepare_image(raw_detections[image_name]) for image_name in image_names]
+    tasks = [(conf, iou_threshold, list(threshold_ks)) for conf, iou_threshold in itertools.product(confs, iou_thresholds)]
+
+    if workers == -1:
+        workers = max(1, cpu_count() - 1)
+    if workers > 1 and len(tasks) > 1:
+        with Pool(processes=min(workers, len(tasks)), initializer=_init_worker, initargs=(images,)) as pool:
+            results = pool.map(_sweep_worker, tasks)
+    else:
+        _init_worker(images)
+        results = [_sweep_worker(task) for task in tasks]
+
+    rows = []
+    for conf, iou_threshold, counts in results:
+        for threshold_k, image_counts in zip(threshold_ks, counts):
+            evaluation, mae = evaluate_counts(benchmark, dict(zip(image_names, image_counts.tolist())))
+            rows.append({
+                'conf': conf,
+                'iou_threshold': iou_threshold,
+                'threshold_k': threshold_k,
+                'mae': mae,
+                'mae_accuracy': evaluation['mae_accuracy'].mean(),
+            })
+    return pd.DataFrame(rows).sort_values(['mae', 'conf', 'iou_threshold', 'threshold_k'], ignore_index=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sweep confidence, IoU and outlier thresholds on cached raw detections")
+    parser.add_argument("--model", default=MODEL_NAME, help=f"Model name without extension (default: {MODEL_NAME})")
+    parser.add_argument("--model-format", default=".pt", help="Model format: .pt, .onnx or _openvino_model (default: .pt)")
+    parser.add_argument("--device", default=None, help="Device for inference")
+    parser.add_argument("--dataset-folder", default=DATASET_FOLDER, help=f"Folder with benchmark images (default: {DATASET_FOLDER})")
+    parser.add_argument("--manifest", action="store_true",
+                        help="Scan the dataset folder into the manifest once and list images from it")
+    parser.add_argument("--limit", type=int, default=None, help="Number of benchmark images to use")
+    parser.add_argument("--confs", nargs="+", default=["0.25:0.7:0.05"], help="Confidence thresholds (values or start:stop:step)")
+    parser.add_argument("--ious", nargs="+", default=["0.3:0.7:0.05"], help="IoU thresholds (values or start:stop:step)")
+    parser.add_argument("--ks", nargs="+", default=["1:5:0.5"], help="Outlier IQR multipliers (values or start:stop:step)")
+    parser.add_argument("--workers", type=int, default=-1, help="Number of worker processes (-1 = all cores but one)")
+    parser.add_argument("--no-cache", action="store_true", help="Do not use the detection cache")
+    parser.add_argument("--output", default=SWEEP_CSV, help=f"Output CSV (default: {SWEEP_CSV})")
+    args = parser.parse_args()
+
+    confs, iou_thresholds, threshold_ks = parse_grid(args.confs), parse_grid(args.ious), parse_grid(args.ks)
+    benchmark = load_benchmark()
+    manifest = scan_manifest(args.dataset_folder) if args.manifest else None
+    image_paths = dict(list(find_benchmark_images(benchmark, args.dataset_folder, manifest).items())[:args.limit])
+    if manifest is not None:
+        manifest.close()
+    print(f"Кадров: {len(image_paths)}, точек сетки: {len(confs) * len(iou_thresholds) * len(threshold_ks)}")
+
+    start_time = time.time()
+    model = load_model(args.model, args.model_format, args.device)
+    cache = None if args.no_cache else DetectionCache()
+    raw_detections = load_raw_detections(model, image_paths, min(confs), args.device, cache=cache)
+    print(f"Сырые детекции: {time.time() - start_time:.1f} секунд{'' if cache is None else f', {cache}'}")
+
+    start_time = time.time()
+    results = sweep(raw_detections, benchmark, confs, iou_thresholds, threshold_ks, args.workers)
+    print(f"Перебор: {time.time() - start_time:.1f} секунд")
+    results.to_csv(args.output, index=False)
+    print(f"Результаты сохранены в {args.output}")
+    print(results.head(10).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+import os
+import numpy as np
+from src.main.resources.config import SLICE_SIZE, OVERLAPPING_PERCENTAGE, SLICES_FOLDER
+from src.main.python.image_slicer.image_slicer import get_slice_grid, get_slice_filename
+
+
+def generate_aerial_image(width, height, seed=0, animals=200):
+    """
+    Синтетический аэроснимок степи: плавный фон с низкочастотными пятнами,
+    зернистый шум и группы мелких темных пятен - "животных".
+
+    Returns:
+        массив HxWx3 uint8 RGB
+    """
+    rng = np.random.default_rng(seed)
+    # Низкочастотные пятна растительности - случайная сетка, растянутая до размера кадра
+    coarse = rng.random((height // 256 + 2, width // 256 + 2))
+    rows = np.linspace(0, coarse.shape[0] - 1, height)
+    cols = np.linspace(0, coarse.shape[1] - 1, width)
+    row_index, col_index = rows.astype(int), cols.astype(int)
+    row_t, col_t = (rows - row_index)[:, None], (cols - col_index)[None, :]
+    row_next, col_next = np.minimum(row_index + 1, coarse.shape[0] - 1), np.minimum(col_index + 1, coarse.shape[1] - 1)
+    patches = (coarse[row_index][:, col_index] * (1 - row_t) * (1 - col_t)
+               + coarse[row_next][:, col_index] * row_t * (1 - col_t)
+               + coarse[row_index][:, col_next] * (1 - row_t) * col_t
+               + coarse[row_next][:, col_next] * row_t * col_t)
+
+    base = np.array([176, 160, 112], dtype=np.float32)
+    image = base + (patches[..., None] - 0.5) * np.array([40, 45, 30], dtype=np.float32)
+    image += rng.normal(0, 6, (height, width, 1)).astype(np.float32)
+
+    # Животные держатся группами
+    herds = max(1, animals // 25)
+    centers = rng.random((herds, 2)) * [width, height]
+    positions = centers[rng.integers(0, herds, animals)] + rng.normal(0, 60, (animals, 2))
+    for x, y in positions:
+        x, y = int(np.clip(x, 4, width - 5)), int(np.clip(y, 4, height - 5))
+        image[y - 3:y + 4, x - 4:x + 5] = [92, 80, 60]
+    return np.clip(image, 0, 255).astype(np.uint8)
+
+
+def generate_seam_boxes(n_boxes, seed=0, image_width=4000, image_height=3000, seam_fraction=0.7,
+                        box_size=(10, 40), slice_size=SLICE_SIZE, overlap_percentage=OVERLAPPING_PERCENTAGE,
+                        slices_folder=SLICES_FOLDER):
+    """
+    Синтетические детекции фрагментов, сгущенные у швов между фрагментами.
+
+    Боксы генерируются в координатах изображения; бокс, попавший в зону перекрытия,
+    записывается в каждый фрагмент, который его целиком содержит, со сдвигом до 1 пикселя -
+    как дубликаты, которые должен убрать filter_iou. Изображений столько, чтобы на каждое
+    приходилось около 2000 записей.
+
+    Returns:
+        boxes_list: список словарей {'source_image_path', 'coordinates'} в координатах фрагментов,
+        как у process_folder; всего около n_boxes боксов
+    """
+    rng = np.random.default_rng(seed)
+    grid = get_slice_grid(image_width, image_height, slice_size, overlap_percentage)
+    lefts = np.array([left for _, _, left, _ in grid])
+    tops = np.array([top for _, _, _, top in grid])
+    seams_x = np.unique(lefts)[1:]
+    seams_y = np.unique(tops)[1:]
+    overlap = slice_size * overlap_percentage // 100
+
+    images = max(1, n_boxes // 2000)
+    boxes_list = []
+    total = 0
+    for image_index in range(images):
+        base_name = f"synthetic_{image_index:03d}"
+        tiles = {}
+        image_budget = (n_boxes - total) // (images - image_index)
+        image_total = 0
+        while image_total < image_budget:
+            size = rng.uniform(*box_size, 2)
+            if rng.random() < seam_fraction and len(seams_x) and len(seams_y):
+                # Центр в полосе перекрытия по одной из осей
+                if rng.random() < 0.5:
+                    x = rng.choice(seams_x) + rng.uniform(0, overlap)
+                    y = rng.uniform(0, image_height)
+                else:
+                    x = rng.uniform(0, image_width)
+                    y = rng.choice(seams_y) + rng.uniform(0, overlap)
+            else:
+                x, y = rng.uniform(0, image_width), rng.uniform(0, image_height)
+            x1 = float(np.clip(x - size[0] / 2, 0, image_width - size[0]))
+            y1 = float(np.clip(y - size[1] / 2, 0, image_height - size[1]))
+            x2, y2 = x1 + size[0], y1 + size[1]
+            containing = np.flatnonzero((lefts <= x1) & (lefts + slice_size >= x2) & (tops <= y1) & (tops + slice_size >= y2))
+            for tile_index in containing:
+                jitter = rng.uniform(-1, 1, 4)
+                left, top = lefts[tile_index], tops[tile_index]
+                box = [round(x1 - left + jitter[0], 2), round(y1 - top + jitter[1], 2),
+                       round(x2 - left + jitter[2], 2), round(y2 - top + jitter[3], 2)]
+                tiles.setdefault(tile_index, []).append(box)
+                image_total += 1
+        for tile_index in sorted(tiles):
+            row, col, left, top = grid[tile_index]
+            slice_filename = get_slice_filename(base_name, row, col, left, top)
+            boxes_list.append({
+                'source_image_path': os.path.join(slices_folder, base_name, slice_filename),
+                'coordinates': tiles[tile_index],
+            })
+        total += image_total
+    return boxes_list
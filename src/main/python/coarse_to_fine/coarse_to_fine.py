@@ -0,0 +1,72 @@
+import numpy as np
+from PIL import Image
+from src.main.resources.config import (
+    SLICE_SIZE, OVERLAPPING_PERCENTAGE, BATCH_SIZE, COARSE_SCALE, COARSE_CONFIDENCE_THRESHOLD, ROI_MARGIN
+)
+from src.main.python.image_slicer.image_slicer import get_slice_grid, get_roi_slice_grid, iter_array_slices
+from src.main.python.model.yolo import iter_predictions
+
+
+def downscale_image(image_array, scale=COARSE_SCALE):
+    """
+    Уменьшение кадра в scale раз усреднением блоков scale x scale (Image.reduce).
+    """
+    if scale == 1:
+        return image_array
+    return np.asarray(Image.fromarray(image_array).reduce(scale))
+
+
+def detect_coarse(model, coarse_array, scale=COARSE_SCALE, batch_size=BATCH_SIZE, device=None,
+                  conf=COARSE_CONFIDENCE_THRESHOLD, slice_size=SLICE_SIZE, cache=None):
+    """
+    Детекция на уменьшенном кадре целиком (фрагментами slice_size, если он больше фрагмента).
+
+    Returns:
+        xyxy float32 (K, 4) в координатах исходного кадра
+    """
+    height, width = coarse_array.shape[:2]
+    # Кадр меньше половины фрагмента get_slice_grid не режет - идет в модель одним дополненным фрагментом
+    grid = get_slice_grid(width, height, slice_size) if min(width, height) >= slice_size // 2 else [(0, 0, 0, 0)]
+    boxes = [xyxy + np.array([left, top, left, top], dtype=np.float32)
+             for _, _, left, top, _, xyxy, _ in iter_predictions(model, iter_array_slices(coarse_array, grid, slice_size),
+                                                                 batch_size, device, conf, cache)]
+    if not boxes:
+        return np.zeros((0, 4), dtype=np.float32)
+    return np.concatenate(boxes) * scale
+
+
+def get_roi_mask(xyxy, img_width, img_height, scale=COARSE_SCALE, margin=ROI_MARGIN):
+    """
+    Маска областей интереса в разрешении грубого прохода: боксы, расширенные на margin пикселей
+    исходного кадра - стадо держится плотно, соседние животные попадают в ту же область.
+    """
+    mask = np.zeros((-(-img_height // scale), -(-img_width // scale)), dtype=bool)
+    for x1, y1, x2, y2 in np.asarray(xyxy, dtype=np.float64).reshape(-1, 4):
+        left, top = max(0, int((x1 - margin) // scale)), max(0, int((y1 - margin) // scale))
+        right, bottom = int(np.ceil((x2 + margin) / scale)), int(np.ceil((y2 + margin) / scale))
+        mask[top:bottom, left:right] = True
+    return mask
+
+
+def iter_roi_slices(image_array, model, batch_size=BATCH_SIZE, device=None, scale=COARSE_SCALE,
+                    conf=COARSE_CONFIDENCE_THRESHOLD, margin=ROI_MARGIN, slice_size=SLICE_SIZE,
+                    overlap_percentage=OVERLAPPING_PERCENTAGE, stats=None, cache=None):
+    """
+    Фрагменты полного разрешения только вокруг областей, найденных грубым проходом.
+
+    Args:
+        stats: dict, в который добавляются счетчики 'tiles' (полная сетка) и 'skipped'
+
+    Yields:
+        (row, col, left, top, slice) как у iter_array_slices
+    """
+    img_height, img_width = image_array.shape[:2]
+    xyxy = detect_coarse(model, downscale_image(image_array, scale), scale, batch_size, device, conf, slice_size, cache)
+    roi_mask = get_roi_mask(xyxy, img_width, img_height, scale, margin)
+    grid = get_roi_slice_grid(img_width, img_height, roi_mask, slice_size, overlap_percentage)
+    if stats is not None:
+        tiles_count = len(get_slice_grid(img_width, img_height, slice_size, overlap_percentage))
+        stats["tiles"] = stats.get("tiles", 0) + tiles_count
+        stats["skipped"] = stats.get("skipped", 0) + tiles_count - len(grid)
+    print(f"Грубый проход: {len(xyxy)} детекций, фрагментов {len(grid)}")
+    yield from iter_array_slices(image_array, grid, slice_size)
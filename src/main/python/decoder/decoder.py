@@ -0,0 +1,138 @@
+import io
+import math
+import functools
+import numpy as np
+from PIL import Image
+from src.main.resources.config import DECODER_BACKEND, PREVIEW_MAX_SIZE
+
+# Коэффициенты уменьшения, которые JPEG умеет декодировать сразу в DCT-области
+DCT_SCALES = (1, 2, 4, 8)
+JPEG_MAGIC = b"\xff\xd8\xff"
+
+
+def _load_turbojpeg():
+    from turbojpeg import TurboJPEG, TJPF_RGB
+    decoder = TurboJPEG()
+
+    def decode(data, scale):
+        return decoder.decode(data, pixel_format=TJPF_RGB, scaling_factor=(1, scale))
+    return decode
+
+
+def _load_simplejpeg():
+    import simplejpeg
+
+    def decode(data, scale):
+        # simplejpeg выбирает наименьший DCT-масштаб, не меньше min_height x min_width
+        height, width = simplejpeg.decode_jpeg_header(data)[:2]
+        return simplejpeg.decode_jpeg(data, colorspace="RGB",
+                                      min_height=math.ceil(height / scale), min_width=math.ceil(width / scale))
+    return decode
+
+
+# Быстрые JPEG-декодеры (libjpeg-turbo) в порядке предпочтения; PIL - запасной для всего остального
+JPEG_BACKENDS = {
+    "turbojpeg": _load_turbojpeg,
+    "simplejpeg": _load_simplejpeg,
+}
+
+
+@functools.lru_cache(maxsize=None)
+def get_jpeg_decoder(backend=DECODER_BACKEND):
+    """
+    JPEG-декодер по имени: "turbojpeg", "simplejpeg", "pil" или "auto" - первый установленный.
+
+    Returns:
+        (имя, функция decode(bytes, scale) -> HxWx3 uint8 RGB) или ("pil", None)
+    """
+    if backend == "pil":
+        return "pil", None
+    if backend != "auto" and backend not in JPEG_BACKENDS:
+        raise ValueError(f"Unknown decoder backend: {backend}")
+    for name in ([backend] if backend != "auto" else list(JPEG_BACKENDS)):
+        try:
+            return name, JPEG_BACKENDS[name]()
+        except (ImportError, OSError, RuntimeError) as e:
+            # turbojpeg без системной libturbojpeg падает при создании декодера
+            if backend != "auto":
+                raise ValueError(f"Decoder backend {name} is not available: {e}")
+    return "pil", None
+
+
+def _decode_pil(source, scale):
+    with Image.open(source) as image:
+        width, height = image.size
+        target_size = (math.ceil(width / scale), math.ceil(height / scale))
+        if scale > 1:
+            # Для JPEG draft включает DCT-уменьшение декодера, для остальных форматов ничего не делает.
+            # Масштаб draft - размер // запрошенный размер, поэтому запрашивается floor: при ceil
+            # для нечетных размеров (5657 / 2829) draft остался бы на полном разрешении
+            image.draft("RGB", (max(1, width // scale), max(1, height // scale)))
+        image.load()
+        if image.mode != "RGB":
+            image = image.convert("RGB")
+        # Досчитываем уменьшение, только если draft его не сделал (не JPEG)
+        if image.size != target_size:
+            image = image.reduce(round(image.size[0] / target_size[0]))
+        return np.asarray(image)
+
+
+def decode_image(source, scale=1, backend=DECODER_BACKEND):
+    """
+    Декодирует изображение в массив HxWx3 uint8 RGB.
+
+    JPEG декодируется быстрым бэкендом (libjpeg-turbo), если он установлен; остальные
+    форматы и JPEG, который бэкенд не смог прочитать (CMYK, поврежденный файл), - через PIL.
+    scale 2, 4 или 8 уменьшает кадр в DCT-области: декодер не восстанавливает полное
+    разрешение, поэтому уменьшенное декодирование в разы быстрее полного.
+
+    Args:
+        source: путь к файлу или содержимое файла (bytes)
+        scale: один из DCT_SCALES; размер результата - ceil(размер / scale)
+
+    Returns:
+        массив HxWx3 uint8 RGB
+    """
+    if scale not in DCT_SCALES:
+        raise ValueError(f"Scale must be one of {DCT_SCALES}")
+    name, decode = get_jpeg_decoder(backend)
+    if decode is not None:
+        data = source
+        if not isinstance(source, bytes):
+            with open(source, "rb") as f:
+                data = f.read()
+        if data[:3] == JPEG_MAGIC:
+            try:
+                return decode(data, scale)
+            except (ValueError, OSError, RuntimeError):
+                pass
+        source = data
+    return _decode_pil(io.BytesIO(source) if isinstance(source, bytes) else source, scale)
+
+
+def get_preview_scale(width, height, max_size=PREVIEW_MAX_SIZE):
+    """
+    Наименьший DCT-масштаб, при котором большая сторона превью не больше max_size (но не больше 8).
+    """
+    for scale in DCT_SCALES:
+        if max(width, height) / scale <= max_size:
+            return scale
+    return DCT_SCALES[-1]
+
+
+def decode_preview(image_path, max_size=PREVIEW_MAX_SIZE, backend=DECODER_BACKEND, raster_cache=None):
+    """
+    Уменьшенная копия кадра для визуализации.
+
+    Args:
+        raster_cache: RasterCache; превью берется из него и сохраняется в нем
+
+    Returns:
+        (массив превью HxWx3 uint8 RGB, (ширина, высота) исходного кадра)
+    """
+    with Image.open(image_path) as image:
+        size = image.size
+    scale = get_preview_scale(*size, max_size)
+    if raster_cache is not None:
+        return raster_cache.load(image_path, scale), size
+    return decode_image(image_path, scale, backend), size
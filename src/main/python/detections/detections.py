@@ -0,0 +1,120 @@
+import numpy as np
+from src.main.python.utils.utils import get_slice_coordinates, get_source_image_name
+
+
+class Detections:
+    """
+    Компактный контейнер детекций в формате struct-of-arrays.
+
+    Вместо списка словарей {'source_image_path', 'coordinates'} боксы хранятся
+    в непрерывных массивах: xyxy float32 (N, 4), conf float32 (N,) и
+    tile_id int32 (N,) - индекс фрагмента в таблице sources (пути фрагментов,
+    каждый путь хранится один раз). Около 24 байт на бокс.
+
+    Координаты всегда глобальные - в системе исходного изображения,
+    как у boxes_list после update_coordinates.
+    """
+
+    __slots__ = ("xyxy", "conf", "tile_id", "sources")
+
+    def __init__(self, xyxy=None, conf=None, tile_id=None, sources=None):
+        self.xyxy = np.ascontiguousarray(np.zeros((0, 4)) if xyxy is None else xyxy, dtype=np.float32).reshape(-1, 4)
+        self.conf = np.ascontiguousarray(np.ones(len(self.xyxy)) if conf is None else conf, dtype=np.float32).reshape(-1)
+        self.tile_id = np.ascontiguousarray(np.zeros(len(self.xyxy)) if tile_id is None else tile_id, dtype=np.int32).reshape(-1)
+        self.sources = list(sources) if sources is not None else []
+        if not len(self.xyxy) == len(self.conf) == len(self.tile_id):
+            raise ValueError("xyxy, conf and tile_id must have the same length")
+
+    def __len__(self):
+        return len(self.xyxy)
+
+    def __repr__(self):
+        return f"Detections(boxes={len(self)}, tiles={len(self.sources)})"
+
+    @classmethod
+    def from_boxes_list(cls, boxes_list, local=True):
+        """
+        Args:
+            boxes_list: список словарей с ключами 'source_image_path' и 'coordinates'
+            local: координаты заданы в системе фрагмента (как у process_folder)
+                и сдвигаются на смещение из имени фрагмента
+        """
+        sources = [boxes['source_image_path'] for boxes in boxes_list]
+        group_sizes = [len(boxes['coordinates']) for boxes in boxes_list]
+        xyxy = np.array([box for boxes in boxes_list for box in boxes['coordinates']], dtype=np.float32).reshape(-1, 4)
+        tile_id = np.repeat(np.arange(len(sources), dtype=np.int32), group_sizes)
+        detections = cls(xyxy, None, tile_id, sources)
+        if local:
+            detections = detections.offset(detections.tile_offsets())
+        return detections
+
+    def to_boxes_list(self):
+        """
+        Обратное преобразование в список словарей, по одному на фрагмент с боксами.
+        """
+        boxes_list = []
+        order = np.argsort(self.tile_id, kind="stable")
+        tile_ids, starts = np.unique(self.tile_id[order], return_index=True)
+        for tile_id, indices in zip(tile_ids, np.split(order, starts[1:])):
+            boxes_list.append({
+                'source_image_path': self.sources[tile_id],
+                'coordinates': self.xyxy[indices].tolist()
+            })
+        return boxes_list
+
+    @classmethod
+    def concat(cls, detections_list):
+        """
+        Объединяет несколько контейнеров, таблицы фрагментов сливаются без повторов.
+        """
+        sources = []
+        source_ids = {}
+        xyxy, conf, tile_id = [], [], []
+        for detections in detections_list:
+            for source in detections.sources:
+                if source not in source_ids:
+                    source_ids[source] = len(sources)
+                    sources.append(source)
+            remap = np.array([source_ids[source] for source in detections.sources], dtype=np.int32)
+            xyxy.append(detections.xyxy)
+            conf.append(detections.conf)
+            tile_id.append(remap[detections.tile_id] if len(detections) else detections.tile_id)
+        if not xyxy:
+            return cls()
+        return cls(np.concatenate(xyxy), np.concatenate(conf), np.concatenate(tile_id), sources)
+
+    def filter(self, mask):
+        """
+        Оставляет боксы по булевой маске или массиву индексов, таблица фрагментов не меняется.
+        """
+        return Detections(self.xyxy[mask], self.conf[mask], self.tile_id[mask], self.sources)
+
+    def offset(self, offsets):
+        """
+        Сдвигает боксы на смещение их фрагмента.
+
+        Args:
+            offsets: массив (len(sources), 2) - (dx, dy) для каждого фрагмента
+        """
+        offsets = np.asarray(offsets, dtype=np.float32).reshape(-1, 2)
+        shift = np.tile(offsets[self.tile_id], 2)
+        return Detections(self.xyxy + shift, self.conf, self.tile_id, self.sources)
+
+    def tile_offsets(self):
+        """
+        (left, top) каждого фрагмента из таблицы sources, по имени файла фрагмента.
+        """
+        return np.array([get_slice_coordinates(source) for source in self.sources], dtype=np.float32).reshape(-1, 2)
+
+    def source_image_ids(self):
+        """
+        Номер исходного изображения для каждого бокса и список имен изображений.
+        """
+        names = {}
+        tile_source_ids = np.array([names.setdefault(get_source_image_name(source), len(names)) for source in self.sources],
+                                   dtype=np.int32)
+        source_ids = tile_source_ids[self.tile_id] if len(self) else np.zeros(0, dtype=np.int32)
+        return source_ids, list(names)
+
+    def areas(self):
+        return (self.xyxy[:, 2] - self.xyxy[:, 0]) * (self.xyxy[:, 3] - self.xyxy[:, 1])
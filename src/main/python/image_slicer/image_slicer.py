@@ -3,100 +3,445 @@ import sys
 import argparse
 from PIL import Image
 import math
-from src.main.resources.config import OVERLAPPING_PERCENTAGE, SLICES_FOLDER, SLICE_SIZE, DATASET_FOLDER
+import tempfile
+import numpy as np
+from src.main.resources.config import (
+    OVERLAPPING_PERCENTAGE, SLICES_FOLDER, SLICE_SIZE, DATASET_FOLDER, IMAGE_MEMORY_BUDGET_MB, RASTER_CACHE_FOLDER
+)
+from src.main.python.decoder.decoder import decode_image
 # Разрешаем загрузку поврежденных изображений
 from PIL import ImageFile
 ImageFile.LOAD_TRUNCATED_IMAGES = True
-def create_image_slices(image_path):
+def get_slice_filename(base_name, row, col, left, top):
+    return f"{base_name}_slice_{row:03d}_{col:03d}_{left}_{top}.png"
+
+
+def get_slice_grid(img_width, img_height, slice_size=SLICE_SIZE, overlap_percentage=OVERLAPPING_PERCENTAGE):
+    """
+    Compute the slice grid of an image.
+
+    Returns:
+        list of (row, col, left, top) tuples, row-major
+    """
+    if not 0 <= overlap_percentage < 100:
+        raise ValueError("Overlap percentage must be between 0 and 99")
+
+    overlap_pixels = int(slice_size * overlap_percentage / 100)
+    step_size = slice_size - overlap_pixels
+
+    slices_x = math.ceil((img_width - overlap_pixels) / step_size)
+    slices_y = math.ceil((img_height - overlap_pixels) / step_size)
+
+    grid = []
+    for row in range(slices_y):
+        for col in range(slices_x):
+            left = col * step_size
+            top = row * step_size
+            right = left + slice_size
+            bottom = top + slice_size
+            if left + slice_size > img_width:
+                left = max(0, img_width - slice_size)
+                right = img_width
+            if top + slice_size > img_height:
+                top = max(0, img_height - slice_size)
+                bottom = img_height
+
+            if (right - left) < slice_size // 2 or (bottom - top) < slice_size // 2:
+                print("!!!!!! Error bro: right-left < SLICE_SIZE // 2 or bottom-top < SLICE_SIZE // 2")
+                break
+
+            grid.append((row, col, left, top))
+    return grid
+
+
+def get_roi_slice_grid(img_width, img_height, roi_mask, slice_size=SLICE_SIZE, overlap_percentage=OVERLAPPING_PERCENTAGE):
+    """
+    Slice grid restricted to a region-of-interest mask.
+
+    Args:
+        roi_mask: boolean array covering the whole image at any resolution
+            (e.g. the downscaled frame of a coarse pass)
+
+    Returns:
+        the get_slice_grid positions whose slice overlaps at least one True cell
+    """
+    mask_height, mask_width = roi_mask.shape[:2]
+    scale_x, scale_y = mask_width / img_width, mask_height / img_height
+    grid = []
+    for row, col, left, top in get_slice_grid(img_width, img_height, slice_size, overlap_percentage):
+        right, bottom = min(left + slice_size, img_width), min(top + slice_size, img_height)
+        region = roi_mask[int(top * scale_y):max(math.ceil(bottom * scale_y), int(top * scale_y) + 1),
+                          int(left * scale_x):max(math.ceil(right * scale_x), int(left * scale_x) + 1)]
+        if region.any():
+            grid.append((row, col, left, top))
+    return grid
+
+
+def get_overlap_strips(offsets, slice_size=SLICE_SIZE):
+    """
+    Overlap strips between neighbouring slices along one axis.
+
+    Args:
+        offsets: slice offsets along the axis (lefts or tops), as produced by get_slice_grid
+
+    Returns:
+        (starts, ends) sorted arrays, strip k covers [starts[k], ends[k])
+    """
+    offsets = np.unique(np.asarray(offsets, dtype=np.float64))
+    starts = offsets[1:]
+    ends = offsets[:-1] + slice_size
+    mask = starts < ends
+    return starts[mask], ends[mask]
+
+
+def _check_image_file(image_path):
+    if not os.path.exists(image_path):
+        raise FileNotFoundError(f"Image file not found: {image_path}")
+    if os.path.getsize(image_path) == 0:
+        raise ValueError(f"File is empty: {image_path}")
+
+
+def open_image(image_path):
+    """
+    Open an image lazily: only the header is read and validated, pixels are not decoded.
+    """
+    _check_image_file(image_path)
+    try:
+        return Image.open(image_path)
+    except Exception as e:
+        raise ValueError(f"Could not open image: {e}")
+
+
+def load_image(image_path):
+    """
+    Open and decode an image in a single pass.
+
+    The header is validated by Image.open and the pixels are decoded once by load()
+    on the same file handle, instead of verify() followed by a reopen.
+    """
+    image = open_image(image_path)
+    try:
+        image.load()
+    except Exception as e:
+        image.close()
+        raise ValueError(f"Could not open image: {e}")
+
+    print(f"Loaded image: {image_path}")
+    print(f"Image size: {image.size[0]} x {image.size[1]} pixels")
+    return image
+
+
+def get_image_size(image_path):
+    """
+    Image (width, height) read from the header, without decoding pixels.
+    """
+    with Image.open(image_path) as image:
+        return image.size
+
+
+def load_image_array(image_path, scale=1, raster_cache=None):
+    """
+    Decode an image into an HxWx3 uint8 RGB array with the configured decoder backend.
+
+    Args:
+        scale: 2, 4 or 8 decodes a JPEG downscaled in the DCT domain (see decode_image)
+        raster_cache: RasterCache; the decoded raster is opened from it as a read-only memmap
+    """
+    _check_image_file(image_path)
+    try:
+        image_array = decode_image(image_path, scale) if raster_cache is None else raster_cache.load(image_path, scale)
+    except Exception as e:
+        raise ValueError(f"Could not open image: {e}")
+
+    print(f"Loaded image: {image_path}")
+    print(f"Image size: {image_array.shape[1]} x {image_array.shape[0]} pixels")
+    return image_array
+
+
+def _get_raw_strips(image):
+    """
+    Uncompressed strips of an image (TIFF without compression, BMP, PPM), mapped straight from the file.
+
+    Returns:
+        list of (top, HxWx3 uint8 array) in top-to-bottom order, or None if the image is
+        compressed (JPEG, PNG, compressed TIFF) and has to be decoded by PIL
+    """
+    width, height = image.size
+    strips = []
+    for tile in image.tile:
+        codec_name, (x0, y0, x1, y1), offset, args = tile[:4]
+        rawmode, stride, orientation = (args, 0, 1) if isinstance(args, str) else (tuple(args) + (0, 1))[:3]
+        if codec_name != "raw" or rawmode not in ("RGB", "BGR") or (x0, x1) != (0, width) or orientation not in (1, -1):
+            return None
+        stride = stride or width * 3
+        rows = np.memmap(image.filename, dtype=np.uint8, mode="r", offset=offset, shape=(y1 - y0, stride))
+        strip = rows[:, :width * 3].reshape(y1 - y0, width, 3)
+        if orientation == -1:
+            strip = strip[::-1]
+        if rawmode == "BGR":
+            strip = strip[..., ::-1]
+        strips.append((y0, strip))
+    strips.sort(key=lambda strip: strip[0])
+    if sum(len(strip) for _, strip in strips) != height:
+        return None
+    return strips
+
+
+def iter_image_bands(image_path, band_height):
+    """
+    Decode an image as horizontal bands of band_height rows (the last one may be shorter).
+
+    Uncompressed strips are read straight from the file, so only the current band is in memory.
+    PIL cannot stop a JPEG or PNG decoder after a range of rows: such images are decoded
+    once in full and the bands are views into that array.
+
+    Yields:
+        (top, HxWx3 uint8 RGB array)
+    """
+    with open_image(image_path) as image:
+        strips = _get_raw_strips(image)
+        if strips is not None:
+            for top in range(0, image.size[1], band_height):
+                bottom = min(top + band_height, image.size[1])
+                parts = [strip[max(top - strip_top, 0):bottom - strip_top] for strip_top, strip in strips
+                         if strip_top < bottom and strip_top + len(strip) > top]
+                yield top, np.ascontiguousarray(parts[0] if len(parts) == 1 else np.concatenate(parts))
+            return
+
+    image_array = load_image_array(image_path)
+    for top in range(0, image_array.shape[0], band_height):
+        yield top, image_array[top:top + band_height]
+
+
+def iter_band_slices(bands, grid, slice_size=SLICE_SIZE):
+    """
+    Cut grid slices from a moving window over image bands.
+
+    The window holds only the rows between the top of the current grid row and its
+    bottom, so memory is bounded by (slice_size + band height) x width.
+
+    Args:
+        bands: iterable of (top, band) as produced by iter_image_bands
+        grid: row-major grid from get_slice_grid
+
+    Yields:
+        (row, col, left, top, slice), slice is a view into the window
+    """
+    bands = iter(bands)
+    window, window_top = None, 0
+    for row, col, left, top in grid:
+        if window is not None and top > window_top:
+            window, window_top = window[top - window_top:], top
+        while window is None or window_top + len(window) < top + slice_size:
+            band = next(bands, None)
+            if band is None:
+                break
+            band_top, band = band
+            if window is None or len(window) == 0:
+                window, window_top = band, band_top
+            else:
+                window = np.concatenate([window, band])
+        yield row, col, left, top, window[top - window_top:top - window_top + slice_size, left:left + slice_size]
+
+
+def iter_array_slices(image_array, grid, slice_size=SLICE_SIZE):
+    """
+    Yields:
+        (row, col, left, top, slice) for every grid position, slice is a view into image_array
+    """
+    for row, col, left, top in grid:
+        yield row, col, left, top, image_array[top:top + slice_size, left:left + slice_size]
+
+
+def iter_image_slices(image_path, slice_size=SLICE_SIZE, overlap_percentage=OVERLAPPING_PERCENTAGE,
+                      memory_budget_mb=IMAGE_MEMORY_BUDGET_MB, raster_cache=None):
+    """
+    Slice an image in memory without writing anything to disk.
+
+    The image is decoded once and every slice is a view into the same
+    RGB array, so consumers must copy a slice if they need to keep it
+    after modifying the source array. Uncompressed images (raw TIFF, BMP, PPM)
+    whose decoded size exceeds memory_budget_mb are read in row bands
+    (iter_image_bands) and sliced from a moving window instead. JPEG and PNG
+    are always decoded in full: PIL cannot stop their decoders after a range of
+    rows, so bands would only add window copies. With a raster_cache the slices
+    are views into the cached memmap, whatever the image size.
+
+    Yields:
+        (row, col, left, top, slice) tuples, slice is an HxWx3 uint8 ndarray view
+    """
+    img_width, img_height = get_image_size(image_path)
+    grid = get_slice_grid(img_width, img_height, slice_size, overlap_percentage)
+    print(f"Will create {len(grid)} slices")
+
+    row_bytes = img_width * 3
+    if raster_cache is None and img_height * row_bytes > memory_budget_mb * 1024 * 1024:
+        with open_image(image_path) as image:
+            has_raw_strips = _get_raw_strips(image) is not None
+        if has_raw_strips:
+            band_height = max(slice_size, int(memory_budget_mb * 1024 * 1024 // row_bytes) - slice_size)
+            print(f"Decoding in bands of {band_height} rows")
+            yield from iter_band_slices(iter_image_bands(image_path, band_height), grid, slice_size)
+            return
+
+    yield from iter_array_slices(load_image_array(image_path, raster_cache=raster_cache), grid, slice_size)
+
+
+def create_image_slices(image_path, overlap_percentage=OVERLAPPING_PERCENTAGE, destination_folder=SLICES_FOLDER, slice_size=SLICE_SIZE,
+                        raster_cache=None):
     if not os.path.exists(image_path):
         raise FileNotFoundError(f"Image file not found: {image_path}")
     if not image_path.lower().endswith(".jpg") and not image_path.lower().endswith(".jpeg") and not image_path.lower().endswith(".png"):
         print(f"Skipping invalid image: {image_path}")
         return 0
 
-    if not 0 <= OVERLAPPING_PERCENTAGE < 100:
+    if not 0 <= overlap_percentage < 100:
         raise ValueError("Overlap percentage must be between 0 and 99")
-    destination_folder = SLICES_FOLDER
     os.makedirs(destination_folder, exist_ok=True)
     image_name = os.path.basename(image_path)
     destination_folder = os.path.join(destination_folder, f"{image_name}")
     destination_folder = os.path.splitext(destination_folder)[0]
     os.makedirs(destination_folder, exist_ok=True)
 
-    try:
-        if os.path.getsize(image_path) == 0:
-            raise ValueError(f"File is empty: {image_path}")
-        
-        image = Image.open(image_path)
-        image.verify()
-        image = Image.open(image_path)
-        image.load()
+    overlap_pixels = int(slice_size * overlap_percentage / 100)
+    step_size = slice_size - overlap_pixels
 
-        print(f"Loaded image: {image_path}")
-        print(f"Image size: {image.size[0]} x {image.size[1]} pixels")
-    except Exception as e:
-        raise ValueError(f"Could not open image: {e}")
+    print(f"slice size: {slice_size}x{slice_size} pixels")
+    print(f"Overlap: {overlap_percentage}% ({overlap_pixels} pixels)")
+    print(f"Step size: {step_size} pixels")
 
-    overlap_pixels = int(SLICE_SIZE * OVERLAPPING_PERCENTAGE / 100)
-    step_size = SLICE_SIZE - overlap_pixels
+    base_name = os.path.splitext(os.path.basename(image_path))[0]
+    slice_count = 0
 
-    print(f"slice size: {SLICE_SIZE}x{SLICE_SIZE} pixels")
-    print(f"Overlap: {OVERLAPPING_PERCENTAGE}% ({overlap_pixels} pixels)")
-    print(f"Step size: {step_size} pixels")
-    
-    img_width, img_height = image.size
-    
-    slices_x = math.ceil((img_width - overlap_pixels) / step_size)
-    slices_y = math.ceil((img_height - overlap_pixels) / step_size)
+    for row, col, left, top, slice in iter_image_slices(image_path, slice_size, overlap_percentage, raster_cache=raster_cache):
+        slice_filename = get_slice_filename(base_name, row, col, left, top)
+        slice_path = os.path.join(destination_folder, slice_filename)
+        
+        Image.fromarray(slice).save(slice_path)
+        slice_count += 1
+        
+        if slice_count % 50 == 0:
+            print(f"Processed {slice_count} slices...")
     
-    print(f"Will create {slices_x} x {slices_y} = {slices_x * slices_y} slices")
+    print(f"Successfully created {slice_count} slices in '{destination_folder}'")
+    return slice_count
+
     
+def _map_raster(image_path, temp_folder=None, memory_budget_mb=IMAGE_MEMORY_BUDGET_MB):
+    """
+    Decoded raster as a file that worker processes can np.memmap.
+
+    A single uncompressed top-down RGB strip is mapped straight from the source file;
+    anything else is copied into a raw temporary file in temp_folder (the system temp
+    folder by default, never next to the slices). Uncompressed strips are copied band by
+    band; JPEG and PNG are decoded once in full first (see iter_image_bands).
+
+    Returns:
+        (path, offset, shape, is_temporary)
+    """
+    with open_image(image_path) as image:
+        width, height = image.size
+        strips = _get_raw_strips(image)
+        if strips is not None and len(strips) == 1:
+            strip = strips[0][1]
+            if isinstance(strip, np.memmap) and strip.strides == (width * 3, 3, 1):
+                return image_path, strip.offset, strip.shape, False
+
+    file_descriptor, raster_path = tempfile.mkstemp(suffix=".raw", dir=temp_folder)
+    os.close(file_descriptor)
+    try:
+        raster = np.memmap(raster_path, dtype=np.uint8, mode="w+", shape=(height, width, 3))
+        band_height = max(1, int(memory_budget_mb * 1024 * 1024 // (width * 3)))
+        for top, band in iter_image_bands(image_path, band_height):
+            raster[top:top + len(band)] = band
+        raster.flush()
+        del raster
+    except BaseException:
+        os.remove(raster_path)
+        raise
+    return raster_path, 0, (height, width, 3), True
+
+
+def _slice_rows_worker(args):
+    (raster_path, offset, shape), grid, base_name, destination_folder, slice_size = args
+    image_array = np.memmap(raster_path, dtype=np.uint8, mode="r", offset=offset, shape=shape)
+    for row, col, left, top, slice in iter_array_slices(image_array, grid, slice_size):
+        Image.fromarray(np.ascontiguousarray(slice)).save(
+            os.path.join(destination_folder, get_slice_filename(base_name, row, col, left, top)))
+    return len(grid)
+
+
+def create_image_slices_rows_parallel(image_path, workers=-1, overlap_percentage=OVERLAPPING_PERCENTAGE,
+                                      destination_folder=SLICES_FOLDER, slice_size=SLICE_SIZE, rows_per_task=1,
+                                      raster_cache=None, scratch_folder=None):
+    """
+    Slice one large image (e.g. a stitched orthomosaic) with several processes.
+
+    The raster is decoded once into a memory-mapped file (or mapped straight from an
+    uncompressed TIFF), and each worker cuts and encodes a range of grid rows from it.
+    Output is the same as create_image_slices.
+
+    Args:
+        workers: number of processes, -1 - all cores but one
+        rows_per_task: grid rows per worker task
+        raster_cache: RasterCache; workers map the cached raster instead of a temporary file
+        scratch_folder: folder for the temporary raster, the system temp folder by default
+
+    Returns:
+        number of slices written
+    """
+    from multiprocessing import Pool, cpu_count
+    from tqdm import tqdm
+
+    if workers == -1:
+        workers = max(1, cpu_count() - 1)
     base_name = os.path.splitext(os.path.basename(image_path))[0]
-    slice_count = 0
+    destination_folder = os.path.join(destination_folder, base_name)
+    os.makedirs(destination_folder, exist_ok=True)
 
-    for row in range(slices_y):
-        for col in range(slices_x):
-            left = col * step_size
-            top = row * step_size
-            right = left + SLICE_SIZE
-            bottom = top + SLICE_SIZE
-            if left + SLICE_SIZE > img_width:
-                left = img_width - SLICE_SIZE
-                right = img_width
-            if top + SLICE_SIZE > img_height:
-                top = img_height - SLICE_SIZE
-                bottom = img_height
+    img_width, img_height = get_image_size(image_path)
+    grid = get_slice_grid(img_width, img_height, slice_size, overlap_percentage)
+    rows = {}
+    for position in grid:
+        rows.setdefault(position[0], []).append(position)
+    row_indices = sorted(rows)
+    row_ranges = [row_indices[start:start + rows_per_task] for start in range(0, len(row_indices), rows_per_task)]
+    print(f"Will create {len(grid)} slices in {len(row_ranges)} row tasks using {workers} processes")
 
+    if raster_cache is not None:
+        raster = raster_cache.load(image_path)
+        raster_path, offset, shape, is_temporary = raster.filename, raster.offset, raster.shape, False
+    else:
+        raster_path, offset, shape, is_temporary = _map_raster(image_path, scratch_folder)
+    try:
+        tasks = [((raster_path, offset, shape), [position for row in row_range for position in rows[row]],
+                  base_name, destination_folder, slice_size) for row_range in row_ranges]
+        with Pool(processes=min(workers, len(tasks)) or 1) as pool:
+            slice_count = sum(tqdm(pool.imap_unordered(_slice_rows_worker, tasks), total=len(tasks), desc="Slicing rows"))
+    finally:
+        if is_temporary:
+            os.remove(raster_path)
 
-            if (right - left) < SLICE_SIZE // 2 or (bottom - top) < SLICE_SIZE // 2:
-                print("!!!!!! Error bro: right-left < SLICE_SIZE // 2 or bottom-top < SLICE_SIZE // 2")
-                break
-            
-            slice = image.crop((left, top, right, bottom))
-            
-            slice_filename = f"{base_name}_slice_{row:03d}_{col:03d}_{left}_{top}.png"
-            slice_path = os.path.join(destination_folder, slice_filename)
-            
-            slice.save(slice_path)
-            slice_count += 1
-            
-            if slice_count % 50 == 0:
-                print(f"Processed {slice_count} slices...")
-    
     print(f"Successfully created {slice_count} slices in '{destination_folder}'")
     return slice_count
 
-    
-def create_images_slices_parallel(workers=1):
+
+def create_images_slices_parallel(workers=1, manifest=None):
     from multiprocessing import Pool, cpu_count
     from tqdm import tqdm 
+    from src.main.python.manifest.manifest import list_images
 
-    image_paths = [f"{DATASET_FOLDER}/{image_path}" for image_path in os.listdir(DATASET_FOLDER) 
-                   if image_path.lower().endswith((".jpg", ".jpeg", ".png"))]
+    image_paths = list_images(DATASET_FOLDER, manifest=manifest)
     if workers == -1:
         workers = max(1, cpu_count() - 1)
     print(f"Processing {len(image_paths)} images using {workers} processes")
 
+    # Изображений меньше, чем процессов (например, один ортофотоплан) - параллелим внутри изображения
+    if len(image_paths) < workers:
+        total_slices = sum(create_image_slices_rows_parallel(image_path, workers) for image_path in image_paths)
+        print(f"\nCompleted: {len(image_paths)} images, {total_slices} total slices")
+        return
+
     with Pool(processes=workers) as pool:
         results = list(tqdm(
             pool.imap(create_image_slices, image_paths),
@@ -120,22 +465,41 @@ Examples:
     )
     
     parser.add_argument("--image_path", help="Path to the input image")
-    parser.add_argument("--overlap_percentage", type=float, 
-                       help="Overlap percentage between slices (0-99)")
-    parser.add_argument("--destination_folder", 
-                       help="Directory to save the sliced images")
-    parser.add_argument("--slice-size", type=int, default=512,
-                       help="Size of each slice in pixels (default: 512)")
+    parser.add_argument("--overlap_percentage", type=float, default=OVERLAPPING_PERCENTAGE,
+                       help=f"Overlap percentage between slices (0-99, default: {OVERLAPPING_PERCENTAGE})")
+    parser.add_argument("--destination_folder", default=SLICES_FOLDER,
+                       help=f"Directory to save the sliced images (default: {SLICES_FOLDER})")
+    parser.add_argument("--slice-size", type=int, default=SLICE_SIZE,
+                       help=f"Size of each slice in pixels (default: {SLICE_SIZE})")
+    parser.add_argument("--workers", type=int, default=1,
+                       help="Processes slicing rows of the image in parallel (-1 = all cores but one, default: 1)")
+    parser.add_argument("--raster-cache", action="store_true",
+                       help=f"Open the decoded image from the raster cache ({RASTER_CACHE_FOLDER})")
     
     args = parser.parse_args()
     
     try:
-        create_image_slices(
-            args.image_path, 
-            args.overlap_percentage, 
-            args.destination_folder,
-            args.slice_size
-        )
+        raster_cache = None
+        if args.raster_cache:
+            from src.main.python.image_slicer.raster_cache import RasterCache
+            raster_cache = RasterCache()
+        if args.workers != 1:
+            create_image_slices_rows_parallel(
+                args.image_path,
+                args.workers,
+                args.overlap_percentage,
+                args.destination_folder,
+                args.slice_size,
+                raster_cache=raster_cache
+            )
+        else:
+            create_image_slices(
+                args.image_path, 
+                args.overlap_percentage, 
+                args.destination_folder,
+                args.slice_size,
+                raster_cache
+            )
     except Exception as e:
         print(f"Error: {e}")
         sys.exit(1)
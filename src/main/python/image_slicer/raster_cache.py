@@ -0,0 +1,120 @@
+import os
+import numpy as np
+from src.main.resources.config import RASTER_CACHE_FOLDER, RASTER_CACHE_SIZE_MB, IMAGE_MEMORY_BUDGET_MB
+from src.main.python.utils.utils import get_file_hash
+from src.main.python.image_slicer.image_slicer import get_image_size, iter_image_bands
+from src.main.python.decoder.decoder import decode_image
+
+
+class RasterCache:
+    """
+    Дисковый кэш декодированных кадров: повторные запуски (подбор параметров, визуализация,
+    нарезка с другим SLICE_SIZE) открывают готовый растр вместо декодирования JPEG.
+
+    Кадр хранится как <folder>/<хэш содержимого файла>_<scale>.npy (HxWx3 uint8 RGB) и
+    отдается через np.load(mmap_mode="r"): фрагменты - срезы отображенного массива без копирования.
+    Файлы пишутся через временный файл и os.replace, поэтому кэш можно делить между процессами.
+    Если передан manifest, хэш содержимого берется из него, а не вычисляется чтением файла.
+    Время изменения файла обновляется при каждом обращении; при превышении size_mb удаляются
+    давно не использованные растры.
+
+        cache = RasterCache()
+        image_array = cache.load("image.jpg")
+    """
+
+    def __init__(self, folder=RASTER_CACHE_FOLDER, size_mb=RASTER_CACHE_SIZE_MB, manifest=None):
+        os.makedirs(folder, exist_ok=True)
+        self.folder = folder
+        self.size = int(size_mb * 1024 * 1024)
+        self.manifest = manifest
+        self.hits = 0
+        self.misses = 0
+        # (путь, размер, mtime) -> хэш содержимого, чтобы не перечитывать файл при каждом обращении
+        self._hashes = {}
+        self._evict()
+
+    def get_raster_path(self, image_path, scale=1):
+        stat = os.stat(image_path)
+        key = (os.path.abspath(image_path), stat.st_size, stat.st_mtime_ns)
+        if key not in self._hashes:
+            file_hash = self.manifest.get_hash(image_path) if self.manifest is not None else None
+            self._hashes[key] = file_hash or get_file_hash(image_path)
+        return os.path.join(self.folder, f"{self._hashes[key]}_{scale}.npy")
+
+    def load(self, image_path, scale=1):
+        """
+        Декодированный кадр (или его DCT-уменьшенная копия, см. decode_image) из кэша;
+        при промахе кадр декодируется и сохраняется.
+
+        Returns:
+            np.memmap HxWx3 uint8 RGB только для чтения
+        """
+        raster_path = self.get_raster_path(image_path, scale)
+        try:
+            raster = np.load(raster_path, mmap_mode="r")
+            os.utime(raster_path)
+            self.hits += 1
+            return raster
+        except (FileNotFoundError, ValueError):
+            # ValueError - поврежденный файл, перезаписывается
+            pass
+        self.misses += 1
+        self._write(image_path, scale, raster_path)
+        self._evict(keep=raster_path)
+        return np.load(raster_path, mmap_mode="r")
+
+    def _write(self, image_path, scale, raster_path):
+        temp_path = f"{raster_path}.{os.getpid()}.tmp"
+        try:
+            if scale == 1:
+                # Несжатые форматы переносятся полосами, не занимая память целым кадром
+                width, height = get_image_size(image_path)
+                raster = np.lib.format.open_memmap(temp_path, mode="w+", dtype=np.uint8, shape=(height, width, 3))
+                band_height = max(1, int(IMAGE_MEMORY_BUDGET_MB * 1024 * 1024 // (width * 3)))
+                for top, band in iter_image_bands(image_path, band_height):
+                    raster[top:top + len(band)] = band
+            else:
+                image_array = decode_image(image_path, scale)
+                raster = np.lib.format.open_memmap(temp_path, mode="w+", dtype=np.uint8, shape=image_array.shape)
+                raster[:] = image_array
+            raster.flush()
+            del raster
+            os.replace(temp_path, raster_path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def _evict(self, keep=None):
+        rasters = []
+        for filename in os.listdir(self.folder):
+            if not filename.endswith(".npy"):
+                continue
+            path = os.path.join(self.folder, filename)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            rasters.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in rasters)
+        for _, size, path in sorted(rasters):
+            if total <= self.size:
+                break
+            if path == keep:
+                continue
+            try:
+                # Открытые memmap продолжают работать: на POSIX файл удаляется после закрытия
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    def clear(self):
+        for filename in os.listdir(self.folder):
+            if filename.endswith(".npy"):
+                os.remove(os.path.join(self.folder, filename))
+
+    def __len__(self):
+        return sum(filename.endswith(".npy") for filename in os.listdir(self.folder))
+
+    def __repr__(self):
+        return f"RasterCache(folder={self.folder!r}, rasters={len(self)}, hits={self.hits}, misses={self.misses})"
@@ -16,9 +16,11 @@ import matplotlib.patches as patches
 from PIL import Image
 import math
 from matplotlib.colors import to_rgba
+from src.main.python.decoder.decoder import decode_image, decode_preview
+from src.main.python.image_slicer.raster_cache import RasterCache
 
 
-def visualize_image_slicing(image_path, overlap_percentage, slice_size=640, show_slices_count=6):
+def visualize_image_slicing(image_path, overlap_percentage, slice_size=640, show_slices_count=6, raster_cache=None):
     """
     Visualize the image slicing process with overlapping slices.
     
@@ -27,6 +29,7 @@ def visualize_image_slicing(image_path, overlap_percentage, slice_size=640, show
         overlap_percentage (float): Percentage of overlap (0-99)
         slice_size (int): Size of each slice in pixels
         show_slices_count (int): Number of sample slices to display
+        raster_cache (RasterCache): Open the decoded image and preview from this cache
     """
     
     # Validate inputs
@@ -36,19 +39,18 @@ def visualize_image_slicing(image_path, overlap_percentage, slice_size=640, show
     if not 0 <= overlap_percentage < 100:
         raise ValueError("Overlap percentage must be between 0 and 99")
     
-    # Load image
+    # Load image: full resolution for the sample slices, a DCT-downscaled preview for the overview plots
     try:
-        image = Image.open(image_path)
-        img_array = np.array(image)
+        img_array = decode_image(image_path) if raster_cache is None else raster_cache.load(image_path)
+        preview, (img_width, img_height) = decode_preview(image_path, raster_cache=raster_cache)
         print(f"Loaded image: {image_path}")
-        print(f"Image size: {image.size[0]} x {image.size[1]} pixels")
+        print(f"Image size: {img_width} x {img_height} pixels")
     except Exception as e:
         raise ValueError(f"Could not open image: {e}")
     
     # Calculate parameters
     overlap_pixels = int(slice_size * overlap_percentage / 100)
     step_size = slice_size - overlap_pixels
-    img_width, img_height = image.size
     
     # Calculate number of slices
     slices_x = math.ceil((img_width - overlap_pixels) / step_size)
@@ -64,7 +66,7 @@ def visualize_image_slicing(image_path, overlap_percentage, slice_size=640, show
     
     # 1. Original image with grid overlay
     ax1 = plt.subplot(2, 3, 1)
-    ax1.imshow(img_array)
+    ax1.imshow(preview, extent=(0, img_width, img_height, 0))
     ax1.set_title(f'Original Image\n{img_width} x {img_height} pixels', fontsize=12)
     
     # Draw grid lines
@@ -83,7 +85,7 @@ def visualize_image_slicing(image_path, overlap_percentage, slice_size=640, show
     
     # 2. Overlap visualization
     ax2 = plt.subplot(2, 3, 2)
-    ax2.imshow(img_array, alpha=0.3)
+    ax2.imshow(preview, alpha=0.3, extent=(0, img_width, img_height, 0))
     ax2.set_title(f'Overlap Visualization\n{overlap_percentage}% overlap ({overlap_pixels}px)', fontsize=12)
     
     # Color different overlapping regions
@@ -218,15 +220,14 @@ Memory usage (approximate):
     return sample_positions
 
 
-def create_detailed_overlap_visualization(image_path, overlap_percentage, slice_size=512):
+def create_detailed_overlap_visualization(image_path, overlap_percentage, slice_size=512, raster_cache=None):
     """
     Create a detailed visualization focusing on overlap regions.
     """
     
     # Load image
-    image = Image.open(image_path)
-    img_array = np.array(image)
-    img_width, img_height = image.size
+    img_array = decode_image(image_path) if raster_cache is None else raster_cache.load(image_path)
+    img_height, img_width = img_array.shape[:2]
     
     # Calculate parameters
     overlap_pixels = int(slice_size * overlap_percentage / 100)
@@ -293,17 +294,20 @@ def main():
                        help="Size of each slice in pixels (default: 512)")
     parser.add_argument("--detailed", action="store_true",
                        help="Show detailed overlap visualization")
+    parser.add_argument("--raster-cache", action="store_true",
+                       help="Open the decoded image from the raster cache")
     
     args = parser.parse_args()
     
     try:
+        raster_cache = RasterCache() if args.raster_cache else None
         print("Creating main visualization...")
-        visualize_image_slicing(args.image_path, args.overlap_percentage, args.slice_size)
+        visualize_image_slicing(args.image_path, args.overlap_percentage, args.slice_size, raster_cache=raster_cache)
         
         if args.detailed:
             print("Creating detailed overlap visualization...")
             create_detailed_overlap_visualization(
-                args.image_path, args.overlap_percentage, args.slice_size
+                args.image_path, args.overlap_percentage, args.slice_size, raster_cache
             )
             
     except Exception as e:
@@ -1,5 +1,15 @@
 import os
-from src.main.resources.config import IOU_THRESHOLD
+import numpy as np
+from multiprocessing import Pool, cpu_count
+from src.main.resources.config import IOU_THRESHOLD, SLICE_SIZE
+from src.main.python.image_slicer.image_slicer import get_overlap_strips
+from src.main.python.utils.utils import get_slice_coordinates, get_source_image_name
+from src.main.python.detections.detections import Detections
+
+# Сколько боксов обрабатывается за раз при поиске пар, ограничивает память под кандидатов
+PAIRS_CHUNK_SIZE = 4096
+# Размер ячейки сетки - этот перцентиль сторон боксов: единичные огромные боксы на него не влияют
+CELL_SIZE_PERCENTILE = 95
 
 def calculate_iou(box1, box2):
     # box = [x1, y1, x2, y2]
@@ -12,17 +22,284 @@ def calculate_iou(box1, box2):
         return 0.0
 
     intersection_area = (x_right - x_left) * (y_bottom - y_top)
-    print("intersection_area", intersection_area)
     box1_area = (box1[2] - box1[0]) * (box1[3] - box1[1])
     box2_area = (box2[2] - box2[0]) * (box2[3] - box2[1])
     union_area = box1_area + box2_area - intersection_area
-    print("union_area", union_area)
 
     if union_area == 0:
         return 0.0
 
     return intersection_area / union_area
 
+def pairwise_iou(boxes1, boxes2):
+    """
+    IoU для всех пар боксов, та же арифметика, что и в calculate_iou.
+
+    Args:
+        boxes1: массив (N, 4) в формате [x1, y1, x2, y2]
+        boxes2: массив (M, 4) в формате [x1, y1, x2, y2]
+
+    Returns:
+        массив (N, M)
+    """
+    boxes1 = np.asarray(boxes1, dtype=np.float64)[:, None, :]
+    boxes2 = np.asarray(boxes2, dtype=np.float64)[None, :, :]
+    return _iou(boxes1, boxes2)
+
+def _iou(boxes1, boxes2):
+    x_left = np.maximum(boxes1[..., 0], boxes2[..., 0])
+    y_top = np.maximum(boxes1[..., 1], boxes2[..., 1])
+    x_right = np.minimum(boxes1[..., 2], boxes2[..., 2])
+    y_bottom = np.minimum(boxes1[..., 3], boxes2[..., 3])
+
+    intersection_area = (x_right - x_left) * (y_bottom - y_top)
+    intersection_area = np.where((x_right < x_left) | (y_bottom < y_top), 0.0, intersection_area)
+    box1_area = (boxes1[..., 2] - boxes1[..., 0]) * (boxes1[..., 3] - boxes1[..., 1])
+    box2_area = (boxes2[..., 2] - boxes2[..., 0]) * (boxes2[..., 3] - boxes2[..., 1])
+    union_area = box1_area + box2_area - intersection_area
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        iou = intersection_area / union_area
+    return np.where(union_area == 0, 0.0, iou)
+
+def _expand_ranges(positions, starts, ends):
+    counts = np.maximum(ends - starts, 0)
+    total = int(counts.sum())
+    first = np.repeat(positions, counts)
+    offsets = np.repeat(np.cumsum(counts) - counts, counts)
+    second = np.repeat(starts, counts) + np.arange(total) - offsets
+    return first, second
+
+def find_candidate_pairs(boxes, cell_size=None):
+    """
+    Кандидаты в пересекающиеся пары через равномерную сетку.
+
+    Бокс попадает в ячейку по левому верхнему углу. Если бокс не больше ячейки,
+    пересекаться с ним могут только боксы из соседних ячеек, поэтому сравниваются
+    только они, а не все N x N пар. Размер ячейки - CELL_SIZE_PERCENTILE-й перцентиль
+    сторон, чтобы один огромный или ложный бокс не превращал сетку в одну ячейку.
+    Боксы больше ячейки сравниваются с боксами всех накрытых ими ячеек, а между собой -
+    рекурсивно, на своей сетке.
+
+    Yields:
+        first, second - индексы пар кандидатов (first != second), порциями
+    """
+    boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+    if len(boxes) < 2:
+        return
+    sides = np.maximum(boxes[:, 2] - boxes[:, 0], boxes[:, 3] - boxes[:, 1])
+    if cell_size is None:
+        cell_size = np.percentile(sides, CELL_SIZE_PERCENTILE)
+    cell_size = max(float(cell_size), 1e-6)
+    large = sides > cell_size
+    small_indices = np.flatnonzero(~large)
+    large_indices = np.flatnonzero(large)
+
+    if len(small_indices):
+        small_boxes = boxes[small_indices]
+        cells_x = np.floor(small_boxes[:, 0] / cell_size).astype(np.int64)
+        cells_y = np.floor(small_boxes[:, 1] / cell_size).astype(np.int64)
+        origin_x, origin_y = cells_x.min() - 1, cells_y.min() - 1
+        cells_x -= origin_x
+        cells_y -= origin_y
+        width, height = int(cells_x.max()) + 2, int(cells_y.max()) + 2
+        keys = cells_x * height + cells_y
+        order = small_indices[np.argsort(keys, kind="stable")]
+        sorted_keys = np.sort(keys, kind="stable")
+
+        # Половина окрестности 3x3, чтобы каждая пара ячеек рассматривалась один раз
+        neighbours = [(1, -1), (1, 0), (1, 1), (0, 1)]
+        for chunk_start in range(0, len(sorted_keys), PAIRS_CHUNK_SIZE):
+            positions = np.arange(chunk_start, min(chunk_start + PAIRS_CHUNK_SIZE, len(sorted_keys)))
+            chunk_keys = sorted_keys[positions]
+            same_cell_end = np.searchsorted(sorted_keys, chunk_keys, side="right")
+            first, second = _expand_ranges(positions, positions + 1, same_cell_end)
+            yield order[first], order[second]
+            for dx, dy in neighbours:
+                neighbour_keys = chunk_keys + dx * height + dy
+                starts = np.searchsorted(sorted_keys, neighbour_keys, side="left")
+                ends = np.searchsorted(sorted_keys, neighbour_keys, side="right")
+                first, second = _expand_ranges(positions, starts, ends)
+                yield order[first], order[second]
+
+        if len(large_indices):
+            # Малый бокс из ячейки левее или выше большого бокса тоже может его задевать
+            large_boxes = boxes[large_indices]
+            x0 = np.clip(np.floor(large_boxes[:, 0] / cell_size).astype(np.int64) - 1 - origin_x, 0, width - 1)
+            x1 = np.clip(np.floor(large_boxes[:, 2] / cell_size).astype(np.int64) - origin_x, 0, width - 1)
+            y0 = np.clip(np.floor(large_boxes[:, 1] / cell_size).astype(np.int64) - 1 - origin_y, 0, height - 1)
+            y1 = np.clip(np.floor(large_boxes[:, 3] / cell_size).astype(np.int64) - origin_y, 0, height - 1)
+            # Ключи одного столбца ячеек идут подряд: по диапазону на каждый накрытый столбец
+            columns = x1 - x0 + 1
+            for chunk_start in range(0, len(large_indices), PAIRS_CHUNK_SIZE):
+                chunk = slice(chunk_start, chunk_start + PAIRS_CHUNK_SIZE)
+                box_positions = np.repeat(np.arange(len(large_indices))[chunk], columns[chunk])
+                column_x = x0[box_positions] + np.arange(len(box_positions)) - np.repeat(
+                    np.cumsum(columns[chunk]) - columns[chunk], columns[chunk])
+                starts = np.searchsorted(sorted_keys, column_x * height + y0[box_positions], side="left")
+                ends = np.searchsorted(sorted_keys, column_x * height + y1[box_positions], side="right")
+                first, second = _expand_ranges(box_positions, starts, ends)
+                yield large_indices[first], order[second]
+
+    if len(large_indices) >= 2:
+        for first, second in find_candidate_pairs(boxes[large_indices]):
+            yield large_indices[first], large_indices[second]
+
+def _touches_strips(starts, ends, strip_starts, strip_ends):
+    if len(strip_starts) == 0:
+        return np.zeros(len(starts), dtype=bool)
+    # Первая полоса, которая заканчивается правее начала бокса
+    index = np.searchsorted(strip_ends, starts, side="right")
+    in_range = index < len(strip_starts)
+    touches = np.zeros(len(starts), dtype=bool)
+    touches[in_range] = strip_starts[index[in_range]] < ends[in_range]
+    return touches
+
+def find_seam_candidate_pairs(boxes, tile_offsets, tile_ids, slice_size=SLICE_SIZE):
+    """
+    Кандидаты в дубликаты только у швов между фрагментами.
+
+    Дубликаты появляются, когда один объект попал в зону перекрытия соседних фрагментов,
+    поэтому сравниваются только боксы, задевающие полосы перекрытия сетки image_slicer,
+    только из разных фрагментов и только из соседних ячеек (find_candidate_pairs).
+    Пары внутри одного фрагмента не рассматриваются - их уже подавил NMS модели.
+
+    Args:
+        boxes: массив (N, 4) в глобальных координатах
+        tile_offsets: массив (N, 2) - (left, top) фрагмента каждого бокса
+        tile_ids: массив (N,) - номер фрагмента каждого бокса
+
+    Yields:
+        first, second - индексы пар кандидатов, порциями
+    """
+    boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+    tile_offsets = np.asarray(tile_offsets).reshape(-1, 2)
+    tile_ids = np.asarray(tile_ids)
+    if len(boxes) < 2:
+        return
+
+    strip_starts_x, strip_ends_x = get_overlap_strips(tile_offsets[:, 0], slice_size)
+    strip_starts_y, strip_ends_y = get_overlap_strips(tile_offsets[:, 1], slice_size)
+    on_seam = (_touches_strips(boxes[:, 0], boxes[:, 2], strip_starts_x, strip_ends_x)
+               | _touches_strips(boxes[:, 1], boxes[:, 3], strip_starts_y, strip_ends_y))
+    seam_indices = np.flatnonzero(on_seam)
+    if len(seam_indices) < 2:
+        return
+
+    for first, second in find_candidate_pairs(boxes[seam_indices]):
+        first, second = seam_indices[first], seam_indices[second]
+        mask = tile_ids[first] != tile_ids[second]
+        yield first[mask], second[mask]
+
+def find_overlapping_pairs(boxes, iou_threshold=IOU_THRESHOLD, candidate_pairs=None):
+    """
+    Находит все пары боксов с IoU > iou_threshold.
+
+    Args:
+        boxes: массив (N, 4) в формате [x1, y1, x2, y2]
+        candidate_pairs: генератор пар кандидатов, по умолчанию find_candidate_pairs(boxes)
+
+    Returns:
+        first, second, iou - индексы пар (first < second) в лексикографическом порядке и их IoU
+    """
+    boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+    if candidate_pairs is None:
+        candidate_pairs = find_candidate_pairs(boxes)
+
+    first_list, second_list, iou_list = [], [], []
+    for first, second in candidate_pairs:
+        if len(first) == 0:
+            continue
+        iou = _iou(boxes[first], boxes[second])
+        mask = iou > iou_threshold
+        first_list.append(first[mask])
+        second_list.append(second[mask])
+        iou_list.append(iou[mask])
+
+    if not first_list:
+        return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.intp), np.empty(0, dtype=np.float64)
+    first = np.concatenate(first_list)
+    second = np.concatenate(second_list)
+    iou = np.concatenate(iou_list)
+    first, second = np.minimum(first, second), np.maximum(first, second)
+    pairs_order = np.lexsort((second, first))
+    return first[pairs_order], second[pairs_order], iou[pairs_order]
+
+def find_duplicates(boxes, iou_threshold=IOU_THRESHOLD, backend="numpy", scores=None, candidate_pairs=None):
+    """
+    Помечает дубликаты среди боксов.
+
+    Бэкенд "numpy" (по умолчанию) и "python" повторяют исходную логику filter_iou:
+    пары (i, j) просматриваются по порядку, в дубликаты попадает i, а если i уже там - j.
+    Дубликаты, как и раньше, сравниваются по значению координат.
+    Бэкенд "torchvision" - классический NMS через batched_nms: из каждой группы
+    перекрывающихся боксов остается бокс с наибольшим score (по умолчанию - более поздний,
+    как и в исходной логике для пары боксов). Требует установленного torchvision.
+
+    Args:
+        boxes: массив (N, 4) в формате [x1, y1, x2, y2]
+        scores: уверенности (N,), используются только бэкендом "torchvision"
+        candidate_pairs: генератор пар кандидатов для бэкенда "numpy", например find_seam_candidate_pairs
+
+    Returns:
+        булев массив (N,), True - бокс является дубликатом
+    """
+    boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+    if len(boxes) == 0:
+        return np.zeros(0, dtype=bool)
+
+    if backend == "torchvision":
+        return _find_duplicates_torchvision(boxes, iou_threshold, scores)
+    if backend == "python":
+        first, second = _find_overlapping_pairs_python(boxes, iou_threshold)
+    elif backend == "numpy":
+        first, second, _ = find_overlapping_pairs(boxes, iou_threshold, candidate_pairs)
+    else:
+        raise ValueError(f"Unknown backend: {backend}")
+
+    duplicates = np.zeros(len(boxes), dtype=bool)
+    if len(first) == 0:
+        return duplicates
+    # Одинаковые боксы имеют IoU = 1 и сами образуют пару, поэтому ключи
+    # по значению достаточно построить только для боксов из найденных пар
+    involved = np.union1d(first, second)
+    _, keys = np.unique(boxes[involved], axis=0, return_inverse=True)
+    keys = keys.reshape(-1)
+    box_keys = np.full(len(boxes), -1, dtype=np.intp)
+    box_keys[involved] = keys
+    duplicate_keys = np.zeros(keys.max() + 1, dtype=bool)
+    for i, j in zip(box_keys[first].tolist(), box_keys[second].tolist()):
+        if not duplicate_keys[i]:
+            duplicate_keys[i] = True
+        elif not duplicate_keys[j]:
+            duplicate_keys[j] = True
+    duplicates[involved] = duplicate_keys[keys]
+    return duplicates
+
+def _find_overlapping_pairs_python(boxes, iou_threshold):
+    boxes = boxes.tolist()
+    first, second = [], []
+    for i in range(len(boxes)):
+        for j in range(i + 1, len(boxes)):
+            if calculate_iou(boxes[i], boxes[j]) > iou_threshold:
+                first.append(i)
+                second.append(j)
+    return np.array(first, dtype=np.intp), np.array(second, dtype=np.intp)
+
+def _find_duplicates_torchvision(boxes, iou_threshold, scores=None):
+    import torch
+    from torchvision.ops import batched_nms
+
+    if scores is None:
+        scores = np.arange(len(boxes), dtype=np.float32)
+    boxes_tensor = torch.from_numpy(boxes).float()
+    scores_tensor = torch.as_tensor(scores, dtype=torch.float32)
+    groups = torch.zeros(len(boxes), dtype=torch.int64)
+    keep = batched_nms(boxes_tensor, scores_tensor, groups, iou_threshold).numpy()
+    duplicates = np.ones(len(boxes), dtype=bool)
+    duplicates[keep] = False
+    return duplicates
+
 def update_coordinates(boxes_list):
     import os
     new_boxes_list = boxes_list.copy()
@@ -39,48 +316,104 @@ def update_coordinates(boxes_list):
             box[3] = box[3] + y_min
 
     return new_boxes_list
-def verbose(all_boxes, i, j, iou):
-    print(f"Боксы с IoU > {IOU_THRESHOLD}:")
-    print(f"Бокс 1: {all_boxes[i]['coordinates']} (из {all_boxes[i]['source']})")
-    print(f"Бокс 2: {all_boxes[j]['coordinates']} (из {all_boxes[j]['source']})")         
-    print(f"IoU: {iou:.4f}")    
-    print("---")
-
-def filter_iou(boxes_list):
+
+def find_image_duplicates(boxes, tile_offsets, tile_ids, iou_threshold=IOU_THRESHOLD, backend="numpy", candidates="grid", scores=None):
+    """
+    Помечает дубликаты среди боксов одного исходного изображения.
+
+    Args:
+        boxes: массив (N, 4) в глобальных координатах изображения
+        tile_offsets: массив (N, 2) - (left, top) фрагмента каждого бокса
+        tile_ids: массив (N,) - номер фрагмента каждого бокса
+        scores: уверенности (N,) для бэкенда "torchvision"
+
+    Returns:
+        булев массив (N,), True - бокс является дубликатом
+    """
+    candidate_pairs = None
+    if candidates == "seam":
+        candidate_pairs = find_seam_candidate_pairs(boxes, tile_offsets, tile_ids)
+    elif candidates != "grid":
+        raise ValueError(f"Unknown candidates: {candidates}")
+    return find_duplicates(boxes, iou_threshold, backend, scores, candidate_pairs)
+
+def _find_image_duplicates_worker(args):
+    return find_image_duplicates(*args)
+
+def find_duplicates_by_source(boxes, tile_offsets, tile_ids, source_ids, iou_threshold=IOU_THRESHOLD,
+                              backend="numpy", candidates="grid", workers=1, scores=None):
+    """
+    Помечает дубликаты, сравнивая боксы только в пределах своего исходного изображения.
+
+    Изображения обрабатываются независимо, при workers > 1 - в пуле процессов
+    (workers=-1 - все ядра, кроме одного).
+
+    Args:
+        source_ids: массив (N,) - номер исходного изображения каждого бокса
+    """
+    source_ids = np.asarray(source_ids, dtype=np.intp)
+    order = np.argsort(source_ids, kind="stable")
+    partitions = np.split(order, np.cumsum(np.bincount(source_ids))[:-1]) if len(order) else []
+    tasks = [(boxes[indices], tile_offsets[indices], tile_ids[indices], iou_threshold, backend, candidates,
+              None if scores is None else scores[indices])
+             for indices in partitions]
+
+    if workers == -1:
+        workers = max(1, cpu_count() - 1)
+    if workers > 1 and len(tasks) > 1:
+        with Pool(processes=min(workers, len(tasks))) as pool:
+            results = pool.map(_find_image_duplicates_worker, tasks)
+    else:
+        results = [_find_image_duplicates_worker(task) for task in tasks]
+
+    duplicates = np.zeros(len(boxes), dtype=bool)
+    for indices, image_duplicates in zip(partitions, results):
+        duplicates[indices] = image_duplicates
+    return duplicates
+
+def filter_iou(boxes_list, iou_threshold=IOU_THRESHOLD, backend="numpy", candidates="grid", workers=1):
+    """
+    Удаляет дубликаты детекций с соседних фрагментов.
+
+    Боксы сравниваются только в пределах своего исходного изображения (префикс
+    имени фрагмента до "_slice_"), см. find_duplicates_by_source.
+
+    candidates="grid" сравнивает все близкие боксы и дает тот же результат, что и полный перебор.
+    candidates="seam" сравнивает только боксы у швов между разными фрагментами
+    (find_seam_candidate_pairs), что почти линейно по числу боксов на больших мозаиках.
+
+    Args:
+        boxes_list: список словарей с ключами 'source_image_path' и 'coordinates'
+            в координатах фрагментов, либо Detections - тогда возвращается Detections,
+            а бэкенд "torchvision" использует уверенности детекций
+    """
+    if isinstance(boxes_list, Detections):
+        return _filter_iou_detections(boxes_list, iou_threshold, backend, candidates, workers)
+
     new_boxes_list = update_coordinates(boxes_list)
-    all_boxes = []
-    for box_group in new_boxes_list:
-        source_path = box_group['source_image_path']
-        for coord in box_group['coordinates']:
-            all_boxes.append({
-                'coordinates': coord,
-                'source': source_path
-            })
+    all_boxes = [coord for box_group in new_boxes_list for coord in box_group['coordinates']]
 
     with_duplicates = len(all_boxes)
     print(f"Всего боксов для сравнения: {with_duplicates}")
-    count = 0
-    duplicates_list = []
-    for i in range(len(all_boxes)):
-        for j in range(i + 1, len(all_boxes)):
-            iou = calculate_iou(all_boxes[i]['coordinates'], all_boxes[j]['coordinates'])
-            if iou > IOU_THRESHOLD:
-                if all_boxes[i]['coordinates'] not in duplicates_list:
-                    duplicates_list.append(all_boxes[i]['coordinates'])
-                    verbose(all_boxes, i, j, iou)
-                    count += 1
-                else:
-                    if all_boxes[j]['coordinates'] not in duplicates_list:
-                        duplicates_list.append(all_boxes[j]['coordinates'])
-                        verbose(all_boxes, i, j, iou)
-                        count += 1
-    filtered_boxes_list = []       
-    
+    boxes = np.array(all_boxes, dtype=np.float64).reshape(-1, 4)
+    group_sizes = [len(box_group['coordinates']) for box_group in new_boxes_list]
+    tile_offsets = np.repeat(np.array([get_slice_coordinates(box_group['source_image_path']) for box_group in new_boxes_list],
+                                      dtype=np.float64).reshape(-1, 2), group_sizes, axis=0)
+    tile_ids = np.repeat(np.arange(len(new_boxes_list)), group_sizes)
+    source_names = {}
+    group_source_ids = [source_names.setdefault(get_source_image_name(box_group['source_image_path']), len(source_names))
+                        for box_group in new_boxes_list]
+    source_ids = np.repeat(np.array(group_source_ids, dtype=np.intp), group_sizes)
+
+    duplicates = find_duplicates_by_source(boxes, tile_offsets, tile_ids, source_ids, iou_threshold, backend, candidates, workers)
+    count = int(duplicates.sum())
+
+    filtered_boxes_list = []
+    start = 0
     for boxes in new_boxes_list:
-        coordinates = []
-        for box in boxes['coordinates']:
-            if box not in duplicates_list:
-                coordinates.append(box)
+        end = start + len(boxes['coordinates'])
+        coordinates = [box for box, is_duplicate in zip(boxes['coordinates'], duplicates[start:end]) if not is_duplicate]
+        start = end
         if coordinates:
             filtered_boxes_list.append({
                 'source_image_path': boxes['source_image_path'],
@@ -88,7 +421,23 @@ def filter_iou(boxes_list):
             })
 
 
-    print(f"Количество боксов с IoU > {IOU_THRESHOLD}: {count}")
+    print(f"Количество боксов с IoU > {iou_threshold}: {count}")
     without_duplicates = len(all_boxes) - count
     print(f"Количество боксов без дубликатов: {without_duplicates}")
-    return filtered_boxes_list  
\ No newline at end of file
+    return filtered_boxes_list
+
+def _filter_iou_detections(detections, iou_threshold, backend, candidates, workers):
+    print(f"Всего боксов для сравнения: {len(detections)}")
+    source_ids, _ = detections.source_image_ids()
+    duplicates = find_duplicates_by_source(
+        detections.xyxy.astype(np.float64),
+        detections.tile_offsets()[detections.tile_id],
+        detections.tile_id,
+        source_ids,
+        iou_threshold, backend, candidates, workers,
+        scores=detections.conf
+    )
+    count = int(duplicates.sum())
+    print(f"Количество боксов с IoU > {iou_threshold}: {count}")
+    print(f"Количество боксов без дубликатов: {len(detections) - count}")
+    return detections.filter(~duplicates)
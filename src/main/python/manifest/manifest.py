@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+"""
+Манифест датасета: один раз проиндексированные сведения о снимках в SQLite.
+
+Для каждого изображения хранятся размер и mtime файла, хэш содержимого, размеры в пикселях,
+формат, признак обрезанного файла (нет маркера конца JPEG / PNG), координаты GPS и высота из EXIF,
+а для снимков DJI - относительная высота полета из XMP. Повторное сканирование перечитывает
+только новые и измененные (по размеру и mtime) файлы, поэтому список изображений папки
+берется из манифеста без открытия файлов.
+
+Манифест подключается явно: его открывают и досканируют один раз (scan_manifest или
+флаг --manifest бенчмарков) и передают стадиям параметром manifest, а list_images берет
+список из него без повторного сканирования. Без манифеста стадии используют os.listdir.
+
+Usage:
+    python -m src.main.python.manifest.manifest scan dataset --workers -1
+    python -m src.main.python.manifest.manifest show dataset
+"""
+
+import os
+import re
+import sys
+import sqlite3
+import argparse
+from multiprocessing import Pool, cpu_count
+from PIL import Image
+from src.main.resources.config import MANIFEST_PATH
+from src.main.python.utils.utils import get_file_hash
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+COLUMNS = ("size", "mtime_ns", "hash", "width", "height", "format", "truncated",
+           "latitude", "longitude", "altitude", "relative_altitude", "error")
+# Маркеры конца файла: без них изображение обрезано (PIL дочитывает его только с LOAD_TRUNCATED_IMAGES)
+END_MARKERS = {
+    "JPEG": b"\xff\xd9",
+    "PNG": b"IEND\xaeB`\x82",
+}
+# Относительная высота полета в XMP снимков DJI: drone-dji:RelativeAltitude="+120.30"
+RELATIVE_ALTITUDE_PATTERN = re.compile(rb'RelativeAltitude\s*=\s*"?\s*([+-]?\d+(?:\.\d+)?)')
+GPS_IFD = 0x8825
+
+
+def _to_degrees(value, ref):
+    degrees, minutes, seconds = (float(part) for part in value)
+    degrees += minutes / 60 + seconds / 3600
+    return -degrees if ref in ("S", "W") else degrees
+
+
+def get_gps(image):
+    """
+    Returns:
+        (широта, долгота, высота над уровнем моря в метрах) из EXIF GPS, None для отсутствующих
+    """
+    gps = image.getexif().get_ifd(GPS_IFD)
+    latitude = _to_degrees(gps[2], gps.get(1)) if 2 in gps else None
+    longitude = _to_degrees(gps[4], gps.get(3)) if 4 in gps else None
+    altitude = None
+    if 6 in gps:
+        # GPSAltitudeRef = 1 - ниже уровня моря
+        altitude = -float(gps[6]) if gps.get(5) in (1, b"\x01") else float(gps[6])
+    return latitude, longitude, altitude
+
+
+def is_truncated(image_path, image_format):
+    """
+    True, если в конце файла нет маркера конца изображения; None для форматов без проверки.
+    """
+    end_marker = END_MARKERS.get(image_format)
+    if end_marker is None:
+        return None
+    with open(image_path, "rb") as f:
+        f.seek(max(0, os.path.getsize(image_path) - 1024))
+        tail = f.read()
+    # Некоторые камеры дописывают нули после маркера конца
+    return not tail.rstrip(b"\x00").endswith(end_marker)
+
+
+def scan_image(image_path):
+    """
+    Сведения об одном изображении без декодирования пикселей.
+
+    Returns:
+        dict с ключами COLUMNS; если файл не открывается, заполнены только size, mtime_ns, hash и error
+    """
+    stat = os.stat(image_path)
+    record = dict.fromkeys(COLUMNS)
+    record.update(size=stat.st_size, mtime_ns=stat.st_mtime_ns, hash=get_file_hash(image_path))
+    try:
+        with Image.open(image_path) as image:
+            record.update(width=image.size[0], height=image.size[1], format=image.format)
+            xmp = image.info.get("xmp")
+            try:
+                record["latitude"], record["longitude"], record["altitude"] = get_gps(image)
+            except Exception:
+                # Поврежденный EXIF не мешает обработке кадра
+                pass
+    except Exception as e:
+        record["error"] = str(e) or type(e).__name__
+        return record
+    if xmp:
+        match = RELATIVE_ALTITUDE_PATTERN.search(xmp if isinstance(xmp, bytes) else xmp.encode())
+        if match:
+            record["relative_altitude"] = float(match.group(1))
+    truncated = is_truncated(image_path, record["format"])
+    record["truncated"] = None if truncated is None else int(truncated)
+    return record
+
+
+def _scan_worker(args):
+    folder, filename = args
+    return filename, scan_image(os.path.join(folder, filename))
+
+
+class Manifest:
+    """
+    Манифест изображений на SQLite: строка на файл, ключ - абсолютный путь папки и имя файла.
+
+        manifest = Manifest()
+        manifest.scan("dataset")
+        image_paths = manifest.list_images("dataset")
+    """
+
+    def __init__(self, path=MANIFEST_PATH):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS images (folder TEXT, filename TEXT, size INTEGER, mtime_ns INTEGER, "
+            "hash TEXT, width INTEGER, height INTEGER, format TEXT, truncated INTEGER, latitude REAL, "
+            "longitude REAL, altitude REAL, relative_altitude REAL, error TEXT, PRIMARY KEY (folder, filename))"
+        )
+        self.connection.commit()
+
+    def scan(self, folder, extensions=IMAGE_EXTENSIONS, workers=-1):
+        """
+        Досканирует папку: новые и измененные файлы индексируются параллельно, удаленные убираются.
+
+        Args:
+            workers: число процессов, -1 - все ядра, кроме одного
+
+        Returns:
+            (число проиндексированных файлов, число удаленных записей)
+        """
+        folder_key = os.path.abspath(folder)
+        known = {filename: (size, mtime_ns) for filename, size, mtime_ns in self.connection.execute(
+            "SELECT filename, size, mtime_ns FROM images WHERE folder = ?", (folder_key,))}
+        entries = {}
+        with os.scandir(folder) as iterator:
+            for entry in iterator:
+                if entry.name.lower().endswith(extensions) and entry.is_file():
+                    stat = entry.stat()
+                    entries[entry.name] = (stat.st_size, stat.st_mtime_ns)
+        changed = sorted(filename for filename, stat in entries.items() if known.get(filename) != stat)
+        removed = [filename for filename in known if filename not in entries]
+
+        if changed:
+            if workers == -1:
+                workers = max(1, cpu_count() - 1)
+            tasks = [(folder_key, filename) for filename in changed]
+            if workers > 1 and len(tasks) > 1:
+                with Pool(processes=min(workers, len(tasks))) as pool:
+                    results = pool.imap_unordered(_scan_worker, tasks, chunksize=16)
+                    self._upsert(folder_key, results)
+            else:
+                self._upsert(folder_key, map(_scan_worker, tasks))
+        if removed:
+            self.connection.executemany("DELETE FROM images WHERE folder = ? AND filename = ?",
+                                        [(folder_key, filename) for filename in removed])
+        self.connection.commit()
+        if changed or removed:
+            print(f"Манифест {folder}: {len(entries)} изображений, проиндексировано {len(changed)}, удалено {len(removed)}")
+        return len(changed), len(removed)
+
+    def _upsert(self, folder_key, results):
+        placeholders = ", ".join("?" * (len(COLUMNS) + 2))
+        self.connection.executemany(
+            f"INSERT OR REPLACE INTO images (folder, filename, {', '.join(COLUMNS)}) VALUES ({placeholders})",
+            ([folder_key, filename] + [record[column] for column in COLUMNS] for filename, record in results)
+        )
+
+    def list_images(self, folder, extensions=IMAGE_EXTENSIONS, skip_truncated=False):
+        """
+        Пути к открывающимся изображениям папки по данным последнего scan, в порядке имен.
+        """
+        query = "SELECT filename FROM images WHERE folder = ? AND error IS NULL"
+        if skip_truncated:
+            query += " AND COALESCE(truncated, 0) = 0"
+        return [os.path.join(folder, filename)
+                for filename, in self.connection.execute(query + " ORDER BY filename", (os.path.abspath(folder),))
+                if filename.lower().endswith(extensions)]
+
+    def get(self, image_path):
+        """
+        Запись изображения (dict с ключами COLUMNS) или None, если файла нет в манифесте.
+        """
+        row = self.connection.execute(
+            f"SELECT {', '.join(COLUMNS)} FROM images WHERE folder = ? AND filename = ?",
+            (os.path.abspath(os.path.dirname(image_path)), os.path.basename(image_path))
+        ).fetchone()
+        return None if row is None else dict(zip(COLUMNS, row))
+
+    def get_hash(self, image_path):
+        """
+        Хэш содержимого из манифеста, если файл не менялся после сканирования, иначе None.
+        """
+        record = self.get(image_path)
+        if record is None:
+            return None
+        stat = os.stat(image_path)
+        if (record["size"], record["mtime_ns"]) != (stat.st_size, stat.st_mtime_ns):
+            return None
+        return record["hash"]
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __len__(self):
+        return self.connection.execute("SELECT COUNT(*) FROM images").fetchone()[0]
+
+    def __repr__(self):
+        return f"Manifest(path={self.path!r}, images={len(self)})"
+
+
+def scan_manifest(folder, path=MANIFEST_PATH, workers=-1):
+    """
+    Открывает манифест и досканирует folder - один раз перед стадиями, которые его читают.
+
+        with scan_manifest("dataset") as manifest:
+            process_images(model, device, manifest=manifest)
+    """
+    manifest = Manifest(path)
+    manifest.scan(folder, workers=workers)
+    return manifest
+
+
+def list_images(folder, extensions=IMAGE_EXTENSIONS, manifest=None):
+    """
+    Изображения папки для стадий пайплайна.
+
+    С manifest список берется из него по данным последнего scan, без открытия файлов;
+    неоткрывающиеся файлы в него не попадают. Без manifest - os.listdir с фильтром по расширению.
+
+    Returns:
+        отсортированный список путей
+    """
+    if manifest is None:
+        return sorted(os.path.join(folder, filename) for filename in os.listdir(folder)
+                      if filename.lower().endswith(extensions))
+    return manifest.list_images(folder, extensions)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build and inspect the dataset manifest")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    scan_parser = subparsers.add_parser("scan", help="Index new and changed images of a folder")
+    scan_parser.add_argument("folder")
+    scan_parser.add_argument("--workers", type=int, default=-1, help="Number of worker processes (-1 = all cores but one)")
+    show_parser = subparsers.add_parser("show", help="Print manifest statistics of a folder")
+    show_parser.add_argument("folder")
+    parser.add_argument("--manifest", default=MANIFEST_PATH, help=f"Manifest database (default: {MANIFEST_PATH})")
+    args = parser.parse_args()
+
+    try:
+        with Manifest(args.manifest) as manifest:
+            if args.command == "scan":
+                manifest.scan(args.folder, workers=args.workers)
+            folder_key = os.path.abspath(args.folder)
+            images, errors, truncated, gps, pixels = manifest.connection.execute(
+                "SELECT COUNT(*), COUNT(error), COALESCE(SUM(truncated), 0), COUNT(latitude), "
+                "COALESCE(SUM(CAST(width AS REAL) * height), 0) FROM images WHERE folder = ?", (folder_key,)
+            ).fetchone()
+            print(f"{args.folder}: {images} изображений, {pixels / 1e6:.0f} Мпикс, не открываются {errors}, "
+                  f"обрезаны {truncated}, с GPS {gps}")
+            for filename, error in manifest.connection.execute(
+                    "SELECT filename, error FROM images WHERE folder = ? AND error IS NOT NULL ORDER BY filename LIMIT 10",
+                    (folder_key,)):
+                print(f"  {filename}: {error}")
+    except Exception as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
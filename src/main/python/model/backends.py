@@ -0,0 +1,64 @@
+import os
+import shutil
+from ultralytics import YOLO
+from src.main.python.utils.utils import get_file_hash
+from src.main.resources.config import BATCH_SIZE, SLICE_SIZE, EXPORTED_MODELS_FOLDER
+
+# Суффикс файла/папки модели -> формат экспорта ultralytics
+EXPORT_FORMATS = {
+    ".onnx": "onnx",
+    "_openvino_model": "openvino",
+}
+
+
+def get_exported_model_path(weights_path, model_format, cache_folder=EXPORTED_MODELS_FOLDER, tag=""):
+    """
+    Путь к экспортированной модели в кэше: <cache_folder>/<хэш весов>/<имя><tag><model_format>.
+    """
+    model_name = os.path.splitext(os.path.basename(weights_path))[0]
+    return os.path.join(cache_folder, get_file_hash(weights_path), f"{model_name}{tag}{model_format}")
+
+
+def export_model(weights_path, model_format, cache_folder=EXPORTED_MODELS_FOLDER, tag="", **export_kwargs):
+    """
+    Экспортирует .pt веса в ONNX или OpenVINO IR один раз и кэширует результат по хэшу весов.
+
+    Экспорт делается с динамическим батчем, чтобы модель принимала батчи predict_tiles.
+
+    Args:
+        weights_path: путь к .pt весам
+        model_format: ".onnx" или "_openvino_model"
+        tag: суффикс имени для вариантов одной модели (например, "_int8")
+        export_kwargs: дополнительные аргументы YOLO.export
+
+    Returns:
+        путь к экспортированной модели
+    """
+    if model_format not in EXPORT_FORMATS:
+        raise ValueError(f"Unsupported model format: {model_format}")
+    exported_path = get_exported_model_path(weights_path, model_format, cache_folder, tag)
+    if os.path.exists(exported_path):
+        print(f"Модель из кэша: {exported_path}")
+        return exported_path
+
+    print(f"Экспорт {weights_path} в {EXPORT_FORMATS[model_format]}")
+    export_kwargs = {"imgsz": SLICE_SIZE, "dynamic": True, "batch": BATCH_SIZE, **export_kwargs}
+    result_path = YOLO(weights_path).export(format=EXPORT_FORMATS[model_format], **export_kwargs)
+    os.makedirs(os.path.dirname(exported_path), exist_ok=True)
+    shutil.move(str(result_path), exported_path)
+    print(f"Модель сохранена в кэш: {exported_path}")
+    return exported_path
+
+
+def load_model(model_name, model_format=".pt", device=None):
+    """
+    Загружает модель в нужном формате. Для ".pt" - обычная PyTorch-модель на device,
+    для ONNX/OpenVINO веса {model_name}.pt экспортируются (или берутся из кэша).
+    Экспортированные модели выбирают устройство при predict, .to() к ним не применяется.
+    """
+    if model_format == ".pt":
+        model = YOLO(f'{model_name}{model_format}')
+        if device is not None:
+            model.to(device)
+        return model
+    return YOLO(export_model(f'{model_name}.pt', model_format), task="detect")
@@ -0,0 +1,188 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+import numpy as np
+from src.main.resources.config import DETECTION_CACHE_PATH, DETECTION_CACHE_SIZE_MB
+from src.main.python.utils.utils import get_file_hash
+
+
+def get_tile_hash(tile):
+    # Хэш пикселей фрагмента вместе с формой массива
+    tile = np.ascontiguousarray(tile)
+    tile_hash = hashlib.blake2b(digest_size=16)
+    tile_hash.update(str(tile.shape).encode())
+    tile_hash.update(tile.data)
+    return tile_hash.hexdigest()
+
+
+def get_model_hash(model):
+    """
+    Хэш весов модели YOLO: .pt файла, .onnx файла или содержимого папки OpenVINO.
+    """
+    path = getattr(model, "ckpt_path", None) or getattr(model, "model_name", None)
+    if path is None or not os.path.exists(str(path)):
+        raise ValueError("Cannot determine model weights path")
+    if not os.path.isdir(path):
+        return get_file_hash(path)
+    model_hash = hashlib.sha256()
+    for filename in sorted(os.listdir(path)):
+        file_path = os.path.join(path, filename)
+        if os.path.isfile(file_path):
+            model_hash.update(f"{filename}:{get_file_hash(file_path)}".encode())
+    return model_hash.hexdigest()[:16]
+
+
+class DetectionCache:
+    """
+    Кэш сырых детекций YOLO на SQLite с вытеснением по LRU.
+
+    Ключ - хэш пикселей фрагмента + хэш весов модели + порог уверенности + хэш остальных
+    параметров predict (imgsz, iou и max_det NMS, устройство, half, путь инференса), значение -
+    боксы xyxy в координатах фрагмента и уверенности (float32). Если хэш весов модели
+    определить нельзя, кэш для нее не используется. Повторные прогоны
+    с другими IOU_THRESHOLD / OUTLIER_THRESHOLD_K берут детекции из кэша без инференса.
+    Суммарный размер значений ограничен size_mb, при превышении удаляются давно не читанные записи.
+    """
+
+    def __init__(self, path=DETECTION_CACHE_PATH, size_mb=DETECTION_CACHE_SIZE_MB):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self.size_limit = int(size_mb * 1024 * 1024)
+        self.hits = 0
+        self.misses = 0
+        self._model_hashes = {}
+        self._lock = threading.Lock()
+        # Пайплайн обращается к кэшу из потока инференса
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS detections "
+            "(key TEXT PRIMARY KEY, xyxy BLOB, conf BLOB, size INTEGER, accessed REAL)"
+        )
+        self.connection.execute("CREATE INDEX IF NOT EXISTS detections_accessed ON detections (accessed)")
+        self.connection.commit()
+        self.size = self.connection.execute("SELECT COALESCE(SUM(size), 0) FROM detections").fetchone()[0]
+
+    def get_key(self, tile, model_hash, conf, settings=None):
+        settings_hash = hashlib.blake2b(json.dumps(settings or {}, sort_keys=True).encode(), digest_size=8).hexdigest()
+        return f"{get_tile_hash(tile)}:{model_hash}:{conf:g}:{settings_hash}"
+
+    def get_many(self, keys):
+        """
+        Returns:
+            dict key -> (xyxy float32 (K, 4), conf float32 (K,)) для найденных ключей
+        """
+        found = {}
+        with self._lock:
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                rows = self.connection.execute(
+                    f"SELECT key, xyxy, conf FROM detections WHERE key IN ({','.join('?' * len(chunk))})", chunk
+                ).fetchall()
+                for key, xyxy, conf in rows:
+                    found[key] = (np.frombuffer(xyxy, dtype=np.float32).reshape(-1, 4).copy(),
+                                  np.frombuffer(conf, dtype=np.float32).copy())
+            if found:
+                now = time.time()
+                self.connection.executemany("UPDATE detections SET accessed = ? WHERE key = ?",
+                                            [(now, key) for key in found])
+                self.connection.commit()
+        return found
+
+    def put_many(self, items):
+        """
+        Args:
+            items: итерируемое из (key, xyxy, conf)
+        """
+        now = time.time()
+        rows = []
+        for key, xyxy, conf in items:
+            xyxy = np.ascontiguousarray(xyxy, dtype=np.float32).tobytes()
+            conf = np.ascontiguousarray(conf, dtype=np.float32).tobytes()
+            rows.append((key, xyxy, conf, len(key) + len(xyxy) + len(conf), now))
+        with self._lock:
+            for key, *_ in rows:
+                previous = self.connection.execute("SELECT size FROM detections WHERE key = ?", (key,)).fetchone()
+                if previous:
+                    self.size -= previous[0]
+            self.connection.executemany("INSERT OR REPLACE INTO detections VALUES (?, ?, ?, ?, ?)", rows)
+            self.size += sum(row[3] for row in rows)
+            self._evict()
+            self.connection.commit()
+
+    def _evict(self):
+        while self.size > self.size_limit:
+            rows = self.connection.execute(
+                "SELECT key, size FROM detections ORDER BY accessed LIMIT 256"
+            ).fetchall()
+            if not rows:
+                self.size = 0
+                return
+            evicted = []
+            for key, size in rows:
+                evicted.append((key,))
+                self.size -= size
+                if self.size <= self.size_limit:
+                    break
+            self.connection.executemany("DELETE FROM detections WHERE key = ?", evicted)
+
+    def get_model_hash(self, model):
+        """
+        Хэш весов модели или None, если его определить нельзя (кэш для модели отключается).
+        """
+        if id(model) not in self._model_hashes:
+            try:
+                self._model_hashes[id(model)] = get_model_hash(model)
+            except ValueError as e:
+                print(f"Кэш детекций отключен для модели: {e}")
+                self._model_hashes[id(model)] = None
+        return self._model_hashes[id(model)]
+
+    def predict(self, model, slices, predict_function, conf, settings=None):
+        """
+        Детекции для фрагментов: из кэша, а для отсутствующих - через predict_function,
+        результат которой сохраняется в кэш.
+
+        Args:
+            predict_function: predict_function(slices) -> список (xyxy, conf) по фрагментам
+            settings: dict остальных параметров predict, влияющих на результат (входит в ключ)
+
+        Returns:
+            список (xyxy, conf) в порядке slices
+        """
+        model_hash = self.get_model_hash(model)
+        if model_hash is None:
+            return predict_function(slices)
+        keys = [self.get_key(slice, model_hash, conf, settings) for slice in slices]
+        found = self.get_many(keys)
+        missing = [i for i, key in enumerate(keys) if key not in found]
+        self.hits += len(keys) - len(missing)
+        self.misses += len(missing)
+        if missing:
+            predictions = predict_function([slices[i] for i in missing])
+            items = [(keys[i], xyxy, scores) for i, (xyxy, scores) in zip(missing, predictions)]
+            self.put_many(items)
+            found.update((key, (xyxy, scores)) for key, xyxy, scores in items)
+        return [found[key] for key in keys]
+
+    def clear(self):
+        with self._lock:
+            self.connection.execute("DELETE FROM detections")
+            self.connection.commit()
+            self.size = 0
+
+    def close(self):
+        self.connection.close()
+
+    def __len__(self):
+        with self._lock:
+            return self.connection.execute("SELECT COUNT(*) FROM detections").fetchone()[0]
+
+    def __repr__(self):
+        return (f"DetectionCache(path={self.path!r}, entries={len(self)}, size={self.size / 1024 / 1024:.1f} MB, "
+                f"hits={self.hits}, misses={self.misses})")
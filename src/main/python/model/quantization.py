@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Post-training INT8 квантизация модели для CPU (OpenVINO + NNCF через экспорт ultralytics)
+и проверка точности подсчета на benchmarking.csv.
+
+Usage:
+    python -m src.main.python.model.quantization --weights best_4_pytorch.pt --limit 20
+"""
+
+import os
+import sys
+import time
+import random
+import hashlib
+import argparse
+import yaml
+from ultralytics import YOLO
+from src.main.resources.config import (
+    MODEL_NAME, DATASET_FOLDER, EXPORTED_MODELS_FOLDER,
+    CALIBRATION_DATASET_FOLDER, CALIBRATION_SAMPLE_SIZE, INT8_MAE_TOLERANCE
+)
+from src.main.python.model.backends import export_model, get_exported_model_path
+from src.main.python.pipeline.pipeline import run_image
+from src.main.python.benchmarking.benchmarking import load_benchmark, find_benchmark_images, evaluate_counts
+from src.main.python.manifest.manifest import scan_manifest
+
+
+def sample_calibration_images(dataset_folder=CALIBRATION_DATASET_FOLDER, sample_size=CALIBRATION_SAMPLE_SIZE, seed=0):
+    """
+    Случайная выборка фрагментов для калибровки (PNG-фрагменты из dataset/2.0.0).
+    """
+    image_paths = []
+    for root, _, filenames in os.walk(dataset_folder):
+        for filename in filenames:
+            if filename.lower().endswith((".png", ".jpg", ".jpeg")):
+                image_paths.append(os.path.join(root, filename))
+    image_paths.sort()
+    random.Random(seed).shuffle(image_paths)
+    return image_paths[:sample_size]
+
+
+def write_calibration_data(image_paths, output_folder):
+    """
+    Описание датасета в формате ultralytics: калибровка NNCF берет изображения из val.
+
+    Returns:
+        путь к data.yaml
+    """
+    os.makedirs(output_folder, exist_ok=True)
+    images_list_path = os.path.abspath(os.path.join(output_folder, "calibration.txt"))
+    with open(images_list_path, "w") as f:
+        for image_path in image_paths:
+            f.write(f"{os.path.abspath(image_path)}\n")
+    data_path = os.path.join(output_folder, "calibration.yaml")
+    with open(data_path, "w") as f:
+        yaml.safe_dump({"train": images_list_path, "val": images_list_path, "names": {0: "saiga"}}, f)
+    return data_path
+
+
+def get_calibration_hash(calibration_images):
+    """
+    Хэш калибровочной выборки: отсортированные абсолютные пути и размеры файлов.
+    Другая папка, размер выборки или seed дают другой хэш.
+    """
+    calibration_hash = hashlib.blake2b(digest_size=8)
+    for image_path in sorted(os.path.abspath(image_path) for image_path in calibration_images):
+        calibration_hash.update(f"{image_path}\t{os.path.getsize(image_path)}\n".encode())
+    return calibration_hash.hexdigest()
+
+
+def quantize_model(weights_path, calibration_images, cache_folder=EXPORTED_MODELS_FOLDER):
+    """
+    INT8 OpenVINO модель, откалиброванная на calibration_images, кэшируется рядом с FP32-экспортом.
+    Ключ кэша - хэш весов и хэш калибровочной выборки, поэтому новая выборка дает новую калибровку.
+
+    Returns:
+        путь к INT8 модели
+    """
+    tag = f"_int8_{get_calibration_hash(calibration_images)}"
+    exported_path = get_exported_model_path(weights_path, "_openvino_model", cache_folder, tag=tag)
+    data_path = write_calibration_data(calibration_images, f"{exported_path}_calibration")
+    return export_model(weights_path, "_openvino_model", cache_folder, tag=tag,
+                        int8=True, data=data_path, fraction=1.0)
+
+
+def evaluate_model(model, image_paths, benchmark, device="cpu"):
+    """
+    Прогоняет полный пайплайн на кадрах бенчмарка.
+
+    Returns:
+        (таблица ошибок evaluate_counts, MAE, время в секундах)
+    """
+    predicted_counts = {}
+    start_time = time.perf_counter()
+    for image_name, image_path in image_paths.items():
+        predicted_counts[image_name] = len(run_image(image_path, model, device))
+    elapsed = time.perf_counter() - start_time
+    results, mae = evaluate_counts(benchmark, predicted_counts)
+    return results, mae, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Quantize the model to INT8 and validate count MAE")
+    parser.add_argument("--weights", default=f"{MODEL_NAME}.pt", help=f"Path to .pt weights (default: {MODEL_NAME}.pt)")
+    parser.add_argument("--calibration-folder", default=CALIBRATION_DATASET_FOLDER,
+                        help=f"Folder with calibration tiles (default: {CALIBRATION_DATASET_FOLDER})")
+    parser.add_argument("--sample-size", type=int, default=CALIBRATION_SAMPLE_SIZE,
+                        help=f"Number of calibration tiles (default: {CALIBRATION_SAMPLE_SIZE})")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the calibration sample (default: 0)")
+    parser.add_argument("--dataset-folder", default=DATASET_FOLDER, help=f"Folder with benchmark images (default: {DATASET_FOLDER})")
+    parser.add_argument("--manifest", action="store_true",
+                        help="Scan the dataset folder into the manifest once and list images from it")
+    parser.add_argument("--limit", type=int, default=None, help="Number of benchmark images to validate on")
+    parser.add_argument("--tolerance", type=float, default=INT8_MAE_TOLERANCE,
+                        help=f"Allowed MAE increase of the INT8 model (default: {INT8_MAE_TOLERANCE})")
+    args = parser.parse_args()
+
+    calibration_images = sample_calibration_images(args.calibration_folder, args.sample_size, args.seed)
+    print(f"Калибровочных фрагментов: {len(calibration_images)}")
+    int8_path = quantize_model(args.weights, calibration_images)
+    fp32_path = export_model(args.weights, "_openvino_model")
+
+    benchmark = load_benchmark()
+    manifest = scan_manifest(args.dataset_folder) if args.manifest else None
+    image_paths = dict(list(find_benchmark_images(benchmark, args.dataset_folder, manifest).items())[:args.limit])
+    if manifest is not None:
+        manifest.close()
+    print(f"Кадров для проверки: {len(image_paths)}")
+
+    _, fp32_mae, fp32_time = evaluate_model(YOLO(fp32_path, task="detect"), image_paths, benchmark)
+    _, int8_mae, int8_time = evaluate_model(YOLO(int8_path, task="detect"), image_paths, benchmark)
+
+    print(f"{'model':<10}{'MAE':>10}{'seconds':>12}")
+    print(f"{'FP32':<10}{fp32_mae:>10.3f}{fp32_time:>12.1f}")
+    print(f"{'INT8':<10}{int8_mae:>10.3f}{int8_time:>12.1f}")
+    print(f"Изменение MAE: {int8_mae - fp32_mae:+.3f} (допуск {args.tolerance}), ускорение: {fp32_time / int8_time:.2f}x")
+    if int8_mae - fp32_mae > args.tolerance:
+        print("INT8 модель не укладывается в допуск по MAE")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
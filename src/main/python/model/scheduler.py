@@ -0,0 +1,166 @@
+import time
+import multiprocessing as mp
+from queue import Empty
+from collections import OrderedDict
+from src.main.resources.config import MODEL_NAME, BATCH_SIZE, CONFIDENCE_THRESHOLD, TILES_PER_TASK, WORKER_IMAGE_CACHE_SIZE
+from src.main.python.image_slicer.image_slicer import get_image_size, get_slice_grid, load_image_array, iter_array_slices
+from src.main.python.detections.detections import Detections
+
+
+def create_tasks(image_paths, tiles_per_task=TILES_PER_TASK):
+    """
+    Делит сетку фрагментов каждого изображения на задачи по tiles_per_task фрагментов,
+    чтобы плотный кадр мог обрабатываться несколькими воркерами.
+
+    Returns:
+        список (image_index, image_path, [(row, col, left, top), ...])
+    """
+    tasks = []
+    for image_index, image_path in enumerate(image_paths):
+        grid = get_slice_grid(*get_image_size(image_path))
+        for start in range(0, len(grid), tiles_per_task):
+            tasks.append((image_index, image_path, grid[start:start + tiles_per_task]))
+    return tasks
+
+
+def _take_task(queues, worker_index, remaining, victim_index=None):
+    """
+    Сначала своя очередь, затем очередь, из которой воркер крал в прошлый раз, затем остальные по кругу.
+
+    Задачи одного изображения лежат в очереди подряд, поэтому вор, который держится своей
+    жертвы, забирает непрерывные серии задач одного кадра, а не прыгает между кадрами.
+
+    Returns:
+        (задача, номер очереди) или (None, None)
+    """
+    order = [worker_index]
+    if victim_index is not None and victim_index != worker_index:
+        order.append(victim_index)
+    order += [queue_index for queue_index in ((worker_index + offset) % len(queues) for offset in range(1, len(queues)))
+              if queue_index != victim_index]
+    for queue_index in order:
+        try:
+            task = queues[queue_index].get_nowait()
+        except Empty:
+            continue
+        with remaining.get_lock():
+            remaining.value -= 1
+        return task, queue_index
+    return None, None
+
+
+def _get_image_array(image_arrays, image_path, cache_size=WORKER_IMAGE_CACHE_SIZE):
+    """
+    Декодированный кадр из LRU воркера; при промахе кадр декодируется, самый давний вытесняется.
+
+    Returns:
+        (массив HxWx3, True если кадр пришлось декодировать)
+    """
+    if image_path in image_arrays:
+        image_arrays.move_to_end(image_path)
+        return image_arrays[image_path], False
+    image_arrays[image_path] = load_image_array(image_path)
+    while len(image_arrays) > cache_size:
+        image_arrays.popitem(last=False)
+    return image_arrays[image_path], True
+
+
+def _worker(worker_index, device, model_name, model_format, queues, remaining, results_queue, batch_size, conf):
+    # Модель загружается один раз внутри процесса, а не передается через pickle
+    from src.main.python.model.backends import load_model
+    from src.main.python.model.yolo import predict_tiles
+
+    model = load_model(model_name, model_format, device)
+    # Несколько последних кадров: вор, вернувшийся к своему кадру после чужой задачи, не декодирует его заново
+    image_arrays = OrderedDict()
+    victim_index = None
+    processed, stolen, decoded = 0, 0, 0
+    while True:
+        task, queue_index = _take_task(queues, worker_index, remaining, victim_index)
+        if task is None:
+            if remaining.value <= 0:
+                break
+            # Задачи еще в пути через очередь - ждем
+            time.sleep(0.01)
+            continue
+        if queue_index != worker_index:
+            victim_index = queue_index
+            stolen += 1
+        image_index, image_path, grid = task
+        image_array, is_decoded = _get_image_array(image_arrays, image_path)
+        detections = predict_tiles(model, iter_array_slices(image_array, grid), batch_size, device, conf, image_path)
+        results_queue.put((image_index, len(grid), detections))
+        processed += 1
+        decoded += is_decoded
+    results_queue.put((None, worker_index, (processed, stolen, decoded)))
+
+
+def process_images_parallel(image_paths, devices, model_name=MODEL_NAME, model_format=".pt", workers_per_device=1,
+                            tiles_per_task=TILES_PER_TASK, batch_size=BATCH_SIZE, conf=CONFIDENCE_THRESHOLD):
+    """
+    Параллельная детекция с work stealing.
+
+    На каждое устройство запускается workers_per_device процессов, каждый загружает свою
+    модель один раз. Задачи (пачки фрагментов) раздаются по изображениям в личные очереди
+    воркеров, а освободившийся воркер забирает задачи из чужих очередей, поэтому
+    несколько плотных кадров не оставляют остальных без работы. Вор держится одной очереди
+    и забирает подряд задачи одного кадра, а последние WORKER_IMAGE_CACHE_SIZE кадров
+    воркер держит декодированными, поэтому кража не декодирует кадр на каждую задачу.
+    Для N процессов на CPU: devices=['cpu'], workers_per_device=N; для GPU: devices=get_devices().
+
+    Yields:
+        (image_path, Detections) по мере завершения всех фрагментов изображения
+    """
+    image_paths = list(image_paths)
+    tasks = create_tasks(image_paths, tiles_per_task)
+    tiles_left = [0] * len(image_paths)
+    for image_index, _, grid in tasks:
+        tiles_left[image_index] += len(grid)
+    workers_devices = [device for device in devices for _ in range(workers_per_device)]
+    print(f"Обработка {len(image_paths)} изображений ({len(tasks)} задач) используя {len(workers_devices)} процессов")
+
+    # spawn: CUDA не поддерживает fork после инициализации
+    context = mp.get_context("spawn")
+    queues = [context.Queue() for _ in workers_devices]
+    remaining = context.Value("i", len(tasks))
+    results_queue = context.Queue()
+    for task in tasks:
+        queues[task[0] % len(queues)].put(task)
+
+    workers = [
+        context.Process(target=_worker, args=(worker_index, device, model_name, model_format, queues, remaining,
+                                              results_queue, batch_size, conf), daemon=True)
+        for worker_index, device in enumerate(workers_devices)
+    ]
+    for worker in workers:
+        worker.start()
+
+    start_time = time.time()
+    image_detections = [[] for _ in image_paths]
+    finished_workers = 0
+    try:
+        while finished_workers < len(workers):
+            try:
+                image_index, tiles_count, detections = results_queue.get(timeout=1)
+            except Empty:
+                failed = [worker for worker in workers if worker.exitcode not in (None, 0)]
+                if failed:
+                    raise RuntimeError(f"Воркер завершился с ошибкой, код {failed[0].exitcode}")
+                continue
+            if image_index is None:
+                processed, stolen, decoded = detections
+                print(f"Воркер {tiles_count} ({workers_devices[tiles_count]}): задач {processed}, украдено {stolen}, "
+                      f"декодировано кадров {decoded}")
+                finished_workers += 1
+                continue
+            image_detections[image_index].append(detections)
+            tiles_left[image_index] -= tiles_count
+            if tiles_left[image_index] == 0:
+                yield image_paths[image_index], Detections.concat(image_detections[image_index])
+                image_detections[image_index] = None
+    finally:
+        for worker in workers:
+            worker.join(timeout=1)
+            if worker.is_alive():
+                worker.terminate()
+    print(f"Время обработки: {time.time() - start_time:.2f} секунд")
@@ -1,14 +1,20 @@
 import torch
+import numpy as np
 from ultralytics import YOLO
 import os
 import time
-from src.main.python.utils.utils import copyfile
+from src.main.python.utils.utils import copyfile, get_rss_mb, get_slice_coordinates
 import sys
 if 'src.config' in sys.modules:
     del sys.modules['src.config']
-from src.main.resources.config import CONFIDENCE_THRESHOLD, SLICE_SIZE, SLICES_FOLDER
-from multiprocessing import Pool, cpu_count
-from tqdm import tqdm 
+from src.main.resources.config import (
+    BATCH_SIZE, CONFIDENCE_THRESHOLD, SLICE_SIZE, SLICES_FOLDER, DATASET_FOLDER, PREDICT_IOU, PREDICT_MAX_DET
+)
+from src.main.python.image_slicer.image_slicer import iter_image_slices, get_slice_filename
+from src.main.python.detections.detections import Detections
+from src.main.python.model.backends import load_model
+from src.main.python.manifest.manifest import list_images
+from PIL import Image
 
 def get_devices():
     devices = []
@@ -26,11 +32,11 @@ def get_devices():
     return devices
 
 def get_models(model_name, devices, model_format=".pt"):
+    # model_format: ".pt", ".onnx" или "_openvino_model" (экспорт с кэшем, см. backends.export_model)
     models = []
     for device in devices:
-        models.append(YOLO(f'{model_name}{model_format}'))
-        models[-1].to(device)
-        print(f"Модель загружена на: {device}")
+        models.append(load_model(model_name, model_format, device))
+        print(f"Модель {model_format} загружена на: {device}")
     return models
 
 def create_classes_file(output_folder):
@@ -92,65 +98,212 @@ def read_annotation_folder(folder_path, image_size=SLICE_SIZE):
             boxes_list.extend(read_annotation_folder(subfolder_path, image_size))
     return boxes_list
 
-def process_folder(folder_path, model, device, output_folder):
-    predictions = model.predict(folder_path, conf=CONFIDENCE_THRESHOLD, device=device, verbose=False)
-    total_detections = sum(len(prediction.boxes.conf) for prediction in predictions)
+def iter_folder_tiles(folder_path):
+    """
+    PNG-фрагменты папки в формате iter_image_slices, имя файла - последним элементом.
+    """
+    for filename in sorted(os.listdir(folder_path)):
+        if filename.lower().endswith(".png"):
+            left, top = get_slice_coordinates(filename)
+            with Image.open(os.path.join(folder_path, filename)) as image:
+                slice = np.asarray(image.convert("RGB"))
+            yield None, None, left, top, slice, filename
+
+def process_folder(folder_path, model, device, output_folder, max_in_flight=BATCH_SIZE, cache=None):
+    """
+    Детекция на PNG-фрагментах папки в потоковом режиме.
+
+    Результаты обрабатываются по мере получения (stream=True), одновременно в памяти
+    не больше max_in_flight результатов (размер батча predict), а не вся папка.
+    С cache (DetectionCache) фрагменты читаются в память и уже посчитанные берутся из кэша.
+    В конце печатается пиковый RSS процесса за время обработки папки.
+    """
+    if cache is None:
+        predictions = (
+            (os.path.basename(prediction.path), prediction.boxes.xyxy.cpu().numpy(), prediction.boxes.conf.cpu().numpy())
+            for prediction in model.predict(folder_path, conf=CONFIDENCE_THRESHOLD, device=device, verbose=False,
+                                            stream=True, batch=max_in_flight)
+        )
+    else:
+        predictions = (
+            (filename, xyxy, scores)
+            for row, col, left, top, slice, filename, xyxy, scores
+            in iter_predictions(model, iter_folder_tiles(folder_path), max_in_flight, device, cache=cache)
+        )
     destination_folder_path = os.path.join(output_folder, os.path.basename(folder_path))
+    total_detections = 0
     boxes_list = []
-    if total_detections > 0:
-        for prediction in predictions:
-            if len(prediction.boxes.conf) > 0:
-                if not os.path.exists(destination_folder_path):
-                    os.makedirs(destination_folder_path)
-                image_filename = os.path.basename(prediction.path)
-                destination_image_path = os.path.join(destination_folder_path, image_filename)
-                source_image_path = os.path.join(folder_path, image_filename)
-                boxes_data = {'source_image_path': source_image_path, 'coordinates': prediction.boxes.xyxy.tolist()}
-                boxes_list.append(boxes_data)
-                copyfile(source_image_path, destination_image_path)
-                create_annotation_file(
-                    image_path=destination_image_path,
-                    boxes=prediction.boxes.xyxy.tolist(),
-                    classes_folder=destination_folder_path,
-                    image_size=(SLICE_SIZE, SLICE_SIZE)
-                )
+    peak_rss = get_rss_mb()
+    for image_filename, xyxy, scores in predictions:
+        rss = get_rss_mb()
+        if rss is not None and rss > peak_rss:
+            peak_rss = rss
+        if len(scores) == 0:
+            continue
+        total_detections += len(scores)
+        if not os.path.exists(destination_folder_path):
+            os.makedirs(destination_folder_path)
+        destination_image_path = os.path.join(destination_folder_path, image_filename)
+        source_image_path = os.path.join(folder_path, image_filename)
+        coordinates = xyxy.tolist()
+        boxes_data = {'source_image_path': source_image_path, 'coordinates': coordinates}
+        boxes_list.append(boxes_data)
+        copyfile(source_image_path, destination_image_path)
+        create_annotation_file(
+            image_path=destination_image_path,
+            boxes=coordinates,
+            classes_folder=destination_folder_path,
+            image_size=(SLICE_SIZE, SLICE_SIZE)
+        )
+    if peak_rss is not None:
+        print(f"{os.path.basename(folder_path)}: пиковая память {peak_rss:.0f} МБ")
     return total_detections, boxes_list
 
-# def worker_function(args):
-#     """Wrapper function for multiprocessing"""
-#     folder_path, model, device, output_folder = args
-#     return process_folder(folder_path, model, device, output_folder)
-
-# def process_folders_parallel(models, devices, output_folder):
-#     start_time = time.time()
-#     total_detections = 0
-#     folders_list = os.listdir(SLICES_FOLDER)
-    
-#     tasks = []
-#     num_workers = len(models)
-    
-#     for i, folder in enumerate(folders_list):
-#         model_idx = i % len(models)
-#         device_idx = (i // len(models)) % len(devices)
-#         tasks.append((f"{SLICES_FOLDER}/{folder}", models[model_idx], devices[device_idx], output_folder))
-#     print(f"Обработка {len(tasks)} папок с детекциями используя {num_workers} процессов")
-#     with Pool(processes=num_workers) as pool:
-#         results = list(tqdm(
-#             pool.imap(worker_function, tasks),
-#             total=len(tasks),
-#             desc="Processing folders"
-#         ))
-    
-#     total_detections = sum(results)
-#     processed_count = len([r for r in results if r > 0])
-    
-#     end_time = time.time()
-#     print(f"\nГотово! Обработано {processed_count} папок с детекциями")
-#     print(f"Общее количество детекций: {total_detections}")
-#     print(f"Время обработки: {end_time - start_time:.2f} секунд")
-#     return total_detections
-
-def process_folders(model, device, output_folder, slices_folder=SLICES_FOLDER):
+def iter_tile_batches(tiles, batch_size):
+    batch = []
+    for tile in tiles:
+        batch.append(tile)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def stack_tiles(slices, slice_size=SLICE_SIZE):
+    """
+    Собирает фрагменты HxWx3 uint8 в один непрерывный батч NCHW uint8.
+    Фрагменты меньше slice_size (изображение меньше фрагмента) дополняются нулями справа и снизу.
+    """
+    batch = np.zeros((len(slices), 3, slice_size, slice_size), dtype=np.uint8)
+    for i, slice in enumerate(slices):
+        height, width = slice.shape[:2]
+        batch[i, :, :height, :width] = slice.transpose(2, 0, 1)
+    return batch
+
+def predict_batch(model, slices, device=None, conf=CONFIDENCE_THRESHOLD, iou=PREDICT_IOU, max_det=PREDICT_MAX_DET):
+    """
+    Один forward на батч фрагментов.
+
+    Returns:
+        список (xyxy, conf) по фрагментам, xyxy в координатах фрагмента, float32 (K, 4)
+    """
+    # Тензор BCHW float 0-1 ultralytics использует без letterbox, каналы RGB
+    images = torch.from_numpy(stack_tiles(slices))
+    images = images.to(device or 'cpu').float().div_(255)
+    predictions = model.predict(images, conf=conf, iou=iou, max_det=max_det, device=device, verbose=False)
+    return [
+        (prediction.boxes.xyxy.cpu().numpy().astype(np.float32), prediction.boxes.conf.cpu().numpy().astype(np.float32))
+        for prediction in predictions
+    ]
+
+def iter_predictions(model, tiles, batch_size=BATCH_SIZE, device=None, conf=CONFIDENCE_THRESHOLD, cache=None,
+                     iou=PREDICT_IOU, max_det=PREDICT_MAX_DET):
+    """
+    Прогоняет фрагменты через модель батчами, один forward на батч.
+
+    Args:
+        tiles: итерируемое из кортежей (row, col, left, top, slice), как у iter_image_slices
+        cache: DetectionCache; фрагменты, уже посчитанные этой моделью с теми же параметрами predict, берутся из него
+        iou, max_det: параметры NMS модели
+
+    Yields:
+        (row, col, left, top, slice, xyxy, conf) - xyxy в координатах фрагмента, float32 (K, 4)
+    """
+    # Все, от чего зависят детекции, кроме фрагмента, весов и conf, - в ключ кэша
+    settings = {"route": "tensor", "imgsz": SLICE_SIZE, "iou": iou, "max_det": max_det, "half": False,
+                "device": str(device or "cpu").split(":")[0]}
+    for batch in iter_tile_batches(tiles, batch_size):
+        slices = [tile[4] for tile in batch]
+        if cache is None:
+            predictions = predict_batch(model, slices, device, conf, iou, max_det)
+        else:
+            predictions = cache.predict(model, slices, lambda missing: predict_batch(model, missing, device, conf, iou, max_det),
+                                        conf, settings)
+        for tile, (xyxy, scores) in zip(batch, predictions):
+            yield (*tile, xyxy, scores)
+
+def merge_tile_predictions(predictions, image_path=None, slices_folder=SLICES_FOLDER):
+    """
+    Собирает предсказания фрагментов одного изображения в Detections.
+
+    Args:
+        predictions: итерируемое из (row, col, left, top, xyxy, conf), xyxy в координатах фрагмента
+        image_path: исходное изображение, по нему строятся пути фрагментов в Detections.sources
+            (как у фрагментов в slices_folder)
+
+    Returns:
+        Detections, боксы сдвинуты на (left, top) фрагмента - в координатах исходного изображения
+    """
+    base_name = os.path.splitext(os.path.basename(image_path))[0] if image_path else "tile"
+    sources, xyxy_list, conf_list, tile_id_list = [], [], [], []
+    for row, col, left, top, xyxy, scores in predictions:
+        if len(scores) == 0:
+            continue
+        xyxy = xyxy + np.array([left, top, left, top], dtype=np.float32)
+        xyxy_list.append(xyxy)
+        conf_list.append(scores)
+        tile_id_list.append(np.full(len(scores), len(sources), dtype=np.int32))
+        sources.append(os.path.join(slices_folder, base_name, get_slice_filename(base_name, row, col, left, top)))
+    if not sources:
+        return Detections()
+    return Detections(np.concatenate(xyxy_list), np.concatenate(conf_list), np.concatenate(tile_id_list), sources)
+
+def predict_tiles(model, tiles, batch_size=BATCH_SIZE, device=None, conf=CONFIDENCE_THRESHOLD, image_path=None, slices_folder=SLICES_FOLDER,
+                  cache=None, max_det=PREDICT_MAX_DET):
+    """
+    Батчевая детекция на фрагментах в памяти.
+
+    Returns:
+        Detections в координатах исходного изображения, см. merge_tile_predictions
+    """
+    predictions = iter_predictions(model, tiles, batch_size, device, conf, cache, max_det=max_det)
+    return merge_tile_predictions(
+        ((row, col, left, top, xyxy, scores) for row, col, left, top, slice, xyxy, scores in predictions),
+        image_path, slices_folder
+    )
+
+def process_image(image_path, model, device, output_folder=None, save_slices=False, slices_folder=SLICES_FOLDER, batch_size=BATCH_SIZE,
+                  cache=None):
+    """
+    Детекция на фрагментах изображения без промежуточных PNG на диске.
+
+    Фрагменты берутся из iter_image_slices как срезы одного декодированного массива.
+    Запись на диск опциональна: save_slices сохраняет все фрагменты в slices_folder,
+    output_folder - фрагменты с детекциями и их аннотации (как в process_folder).
+    """
+    base_name = os.path.splitext(os.path.basename(image_path))[0]
+    slices_folder_path = os.path.join(slices_folder, base_name)
+    destination_folder_path = os.path.join(output_folder, base_name) if output_folder else None
+    if save_slices:
+        os.makedirs(slices_folder_path, exist_ok=True)
+
+    total_detections = 0
+    boxes_list = []
+    predictions = iter_predictions(model, iter_image_slices(image_path), batch_size, device, cache=cache)
+    for row, col, left, top, slice, xyxy, scores in predictions:
+        slice_filename = get_slice_filename(base_name, row, col, left, top)
+        if save_slices:
+            Image.fromarray(slice).save(os.path.join(slices_folder_path, slice_filename))
+
+        if len(scores) == 0:
+            continue
+        total_detections += len(scores)
+        coordinates = xyxy.tolist()
+        boxes_list.append({'source_image_path': os.path.join(slices_folder_path, slice_filename), 'coordinates': coordinates})
+
+        if destination_folder_path:
+            os.makedirs(destination_folder_path, exist_ok=True)
+            destination_image_path = os.path.join(destination_folder_path, slice_filename)
+            Image.fromarray(slice).save(destination_image_path)
+            create_annotation_file(
+                image_path=destination_image_path,
+                boxes=coordinates,
+                classes_folder=destination_folder_path,
+                image_size=(SLICE_SIZE, SLICE_SIZE)
+            )
+    return total_detections, boxes_list
+
+def process_folders(model, device, output_folder, slices_folder=SLICES_FOLDER, max_in_flight=BATCH_SIZE, cache=None):
     print(f"Обработка изображений на устройстве: {device}\nПапка вывода: {output_folder}")
     start_time = time.time()
     processed_count = 0
@@ -158,7 +311,7 @@ def process_folders(model, device, output_folder, slices_folder=SLICES_FOLDER):
     for folder in os.listdir(slices_folder):
         folder_path = os.path.join(slices_folder, folder)
         if os.path.isdir(folder_path):
-            detections, boxes_list = process_folder(folder_path, model, device, output_folder)
+            detections, boxes_list = process_folder(folder_path, model, device, output_folder, max_in_flight, cache)
             if detections > 0:
                 processed_count += 1
                 total_detections += detections
@@ -168,4 +321,24 @@ def process_folders(model, device, output_folder, slices_folder=SLICES_FOLDER):
     print(f"Общее количество детекций: {total_detections}")
     print(f"Время обработки: {end_time - start_time:.2f} секунд")
     print(f"Устройство: {device}")
-    return total_detections
\ No newline at end of file
+    return total_detections
+
+def process_images(model, device, output_folder=None, dataset_folder=DATASET_FOLDER, save_slices=False, batch_size=BATCH_SIZE, cache=None, manifest=None):
+    print(f"Обработка изображений на устройстве: {device}\nПапка вывода: {output_folder}")
+    start_time = time.time()
+    processed_count = 0
+    total_detections = 0
+    boxes_list = []
+    for image_path in list_images(dataset_folder, manifest=manifest):
+        detections, image_boxes_list = process_image(image_path, model, device, output_folder, save_slices, batch_size=batch_size, cache=cache)
+        if detections > 0:
+            processed_count += 1
+            total_detections += detections
+            boxes_list.extend(image_boxes_list)
+
+    end_time = time.time()
+    print(f"\nГотово! Обработано {processed_count} изображений с детекциями")
+    print(f"Общее количество детекций: {total_detections}")
+    print(f"Время обработки: {end_time - start_time:.2f} секунд")
+    print(f"Устройство: {device}")
+    return total_detections, boxes_list
@@ -1,54 +1,111 @@
+import logging
 import numpy as np
 from src.main.resources.config import OUTLIER_THRESHOLD_K
+from src.main.python.detections.detections import Detections
 
+logger = logging.getLogger(__name__)
 
-def filter_outliers(boxes_list):
+
+def _segment_percentile(sorted_values, starts, counts, q):
+    """
+    Перцентиль (линейная интерполяция, как np.percentile) для каждого сегмента
+    отсортированного массива. Сегмент k - sorted_values[starts[k]:starts[k] + counts[k]].
+    """
+    position = q * (counts - 1)
+    lower_index = np.floor(position).astype(np.intp)
+    upper_index = np.minimum(lower_index + 1, counts - 1)
+    t = position - lower_index
+    a = sorted_values[starts + lower_index]
+    b = sorted_values[starts + upper_index]
+    difference = b - a
+    # Та же формула интерполяции, что и в numpy, чтобы границы совпадали до бита
+    return np.where(t >= 0.5, b - difference * (1 - t), a + difference * t)
+
+
+def get_outlier_mask(areas, group_ids, threshold_k=OUTLIER_THRESHOLD_K):
+    """
+    Маска боксов, площадь которых лежит внутри границ Q1 - k*IQR и Q3 + k*IQR своей группы.
+
+    Квартили всех групп считаются за один проход: площади сортируются по (группа, площадь),
+    и перцентили берутся по сегментам отсортированного массива.
+
+    Args:
+        areas: массив (N,) площадей боксов
+        group_ids: массив (N,) неотрицательных номеров групп
+
+    Returns:
+        булев массив (N,), True - бокс остается
+    """
+    areas = np.asarray(areas, dtype=np.float64)
+    group_ids = np.asarray(group_ids, dtype=np.intp)
+    if len(areas) == 0:
+        return np.zeros(0, dtype=bool)
+
+    order = np.lexsort((areas, group_ids))
+    sorted_areas = areas[order]
+    counts = np.bincount(group_ids)
+    starts = np.cumsum(counts) - counts
+    groups = np.flatnonzero(counts)
+
+    q1 = np.zeros(len(counts))
+    q3 = np.zeros(len(counts))
+    q1[groups] = _segment_percentile(sorted_areas, starts[groups], counts[groups], 0.25)
+    q3[groups] = _segment_percentile(sorted_areas, starts[groups], counts[groups], 0.75)
+    iqr = q3 - q1
+    lower_bound = q1 - threshold_k * iqr
+    upper_bound = q3 + threshold_k * iqr
+
+    keep = (areas > lower_bound[group_ids]) & (areas < upper_bound[group_ids])
+
+    if logger.isEnabledFor(logging.DEBUG):
+        sums = np.bincount(group_ids, weights=areas)
+        kept = np.bincount(group_ids, weights=keep, minlength=len(counts))
+        for group in groups:
+            logger.debug(
+                "group %d: sum of areas %s, mean of areas %s, lower_bound %s, upper_bound %s, iqr %s, kept %d of %d",
+                group, sums[group], sums[group] / counts[group], lower_bound[group], upper_bound[group],
+                iqr[group], kept[group], counts[group]
+            )
+    return keep
+
+
+def filter_outliers(boxes_list, threshold_k=OUTLIER_THRESHOLD_K):
     """
     Фильтрует выбросы из списка боксов на основе их площади.
-    
+
     Args:
         boxes_list: Список словарей с ключами 'source_image_path' и 'coordinates'
-        
+            или Detections (группа - фрагмент, tile_id)
+        threshold_k: Множитель IQR для границ
+
     Returns:
-        filtered_boxes_from_outliers: Отфильтрованный список боксов
+        filtered_boxes_from_outliers: Отфильтрованный список боксов (или Detections)
     """
+    if isinstance(boxes_list, Detections):
+        xyxy = boxes_list.xyxy.astype(np.float64)
+        areas = (xyxy[:, 2] - xyxy[:, 0]) * (xyxy[:, 3] - xyxy[:, 1])
+        keep = get_outlier_mask(areas, boxes_list.tile_id, threshold_k)
+        logger.info("amount of filtered boxes from outliers: %d of %d", int(keep.sum()), len(keep))
+        return boxes_list.filter(keep)
+
+    group_sizes = [len(boxes['coordinates']) for boxes in boxes_list]
+    coordinates = np.array([box for boxes in boxes_list for box in boxes['coordinates']], dtype=np.float64).reshape(-1, 4)
+    areas = (coordinates[:, 2] - coordinates[:, 0]) * (coordinates[:, 3] - coordinates[:, 1])
+    group_ids = np.repeat(np.arange(len(boxes_list)), group_sizes)
+    keep = get_outlier_mask(areas, group_ids, threshold_k)
+
+    kept_counts = np.bincount(group_ids, weights=keep, minlength=len(boxes_list)).tolist()
+    keep = keep.tolist()
     filtered_boxes_from_outliers = []
-    
-    for boxes in boxes_list:
-        areas = []
-        for box in boxes['coordinates']:
-            box_area = (box[2] - box[0]) * (box[3] - box[1])
-            areas.append(box_area)
-        
-        if not areas:  # Если нет координат, пропускаем
-            continue
-            
-        mean_of_areas = sum(areas) / len(areas)
-
-        q1 = np.percentile(areas, 25)
-        q3 = np.percentile(areas, 75)
-        iqr = q3 - q1
-        lower_bound = q1 - OUTLIER_THRESHOLD_K * iqr
-        upper_bound = q3 + OUTLIER_THRESHOLD_K * iqr
-        
-        filtered_coordinates_from_outliers = []
-        for box in boxes['coordinates']:
-            box_area = (box[2] - box[0]) * (box[3] - box[1])
-            if box_area > lower_bound and box_area < upper_bound:
-                filtered_coordinates_from_outliers.append(box)
-        
-        print("sum of areas", sum(areas))
-        print("mean of areas", mean_of_areas)
-        print("lower_bound", lower_bound)
-        print("upper_bound", upper_bound)
-        print("iqr", iqr)
-        print("amount of filtered_coordinates_from_outliers", len(filtered_coordinates_from_outliers))
-        
-        if len(filtered_coordinates_from_outliers) > 0:
+    start = 0
+    for boxes, group_size, kept_count in zip(boxes_list, group_sizes, kept_counts):
+        group_keep = keep[start:start + group_size]
+        start += group_size
+        if kept_count > 0:
             filtered_boxes_from_outliers.append({
-                'source_image_path': boxes['source_image_path'], 
-                'coordinates': filtered_coordinates_from_outliers
+                'source_image_path': boxes['source_image_path'],
+                'coordinates': [box for box, is_kept in zip(boxes['coordinates'], group_keep) if is_kept]
             })
 
-    print("amount of filtered_boxes_from_outliers", len(filtered_boxes_from_outliers))
-    return filtered_boxes_from_outliers
\ No newline at end of file
+    logger.info("amount of filtered_boxes_from_outliers %d", len(filtered_boxes_from_outliers))
+    return filtered_boxes_from_outliers
@@ -0,0 +1,224 @@
+import time
+import threading
+from queue import Queue, Empty, Full
+from src.main.resources.config import BATCH_SIZE, CONFIDENCE_THRESHOLD, IOU_THRESHOLD, OUTLIER_THRESHOLD_K, PIPELINE_QUEUE_SIZE
+from src.main.python.image_slicer.image_slicer import iter_image_slices, load_image_array, get_slice_grid, iter_array_slices
+from src.main.python.model.yolo import predict_tiles, iter_predictions, merge_tile_predictions
+from src.main.python.iou_filter.iou_filter import filter_iou
+from src.main.python.outlier_filter.outlier_filter import filter_outliers
+from src.main.python.pipeline.shared_tiles import SharedTileDecoder
+from src.main.python.prescreen.prescreen import prescreen_tiles
+from src.main.python.coarse_to_fine.coarse_to_fine import iter_roi_slices
+
+# Маркер конца потока между стадиями
+_DONE = object()
+
+
+def run_image(image_path, model, device=None, batch_size=BATCH_SIZE, conf=CONFIDENCE_THRESHOLD,
+              iou_threshold=IOU_THRESHOLD, threshold_k=OUTLIER_THRESHOLD_K, cache=None, prescreen=False,
+              coarse_to_fine=False):
+    """
+    Полный пайплайн для одного изображения в памяти:
+    фрагменты -> YOLO -> IoU фильтрация -> фильтрация выбросов.
+
+    prescreen=True не отправляет в модель однородные фрагменты без объектов (prescreen_tiles).
+    coarse_to_fine=True режет фрагменты только вокруг детекций на уменьшенном кадре (iter_roi_slices).
+
+    Returns:
+        Detections в координатах исходного изображения
+    """
+    if coarse_to_fine:
+        tiles = iter_roi_slices(load_image_array(image_path), model, batch_size, device, cache=cache)
+    else:
+        tiles = iter_image_slices(image_path)
+    if prescreen:
+        tiles = prescreen_tiles(tiles)
+    detections = predict_tiles(model, tiles, batch_size, device, conf, image_path, cache=cache)
+    return filter_detections(detections, iou_threshold, threshold_k)
+
+
+def filter_detections(detections, iou_threshold=IOU_THRESHOLD, threshold_k=OUTLIER_THRESHOLD_K):
+    detections = filter_iou(detections, iou_threshold)
+    return filter_outliers(detections, threshold_k)
+
+
+def _put(queue, item, stop):
+    # put с периодической проверкой stop, чтобы стадия не зависла на полной очереди
+    while not stop.is_set():
+        try:
+            queue.put(item, timeout=0.1)
+            return True
+        except Full:
+            continue
+    return False
+
+
+def _iter_queue(queue, stop):
+    while not stop.is_set():
+        try:
+            item = queue.get(timeout=0.1)
+        except Empty:
+            continue
+        if item is _DONE:
+            return
+        yield item
+
+
+def _iter_timed(iterable, stage):
+    # Время ожидания входных данных копится в stage.wait_time: это простой стадии, а не работа
+    iterator = iter(iterable)
+    while True:
+        start_time = time.perf_counter()
+        try:
+            item = next(iterator)
+        except StopIteration:
+            return
+        finally:
+            stage.wait_time += time.perf_counter() - start_time
+        yield item
+
+
+class _Stage(threading.Thread):
+    """
+    Поток стадии пайплайна: считает время работы и сохраняет исключение для основного потока.
+    """
+
+    def __init__(self, name, target, stop, output_queue):
+        super().__init__(name=name, daemon=True)
+        self.target = target
+        self.stop = stop
+        self.output_queue = output_queue
+        self.busy_time = 0.0
+        self.wait_time = 0.0
+        self.error = None
+
+    def run(self):
+        try:
+            self.target(self)
+        except BaseException as error:
+            self.error = error
+            self.stop.set()
+        finally:
+            _put(self.output_queue, _DONE, self.stop)
+
+
+def run_pipeline(image_paths, model, device=None, batch_size=BATCH_SIZE, conf=CONFIDENCE_THRESHOLD,
+                 iou_threshold=IOU_THRESHOLD, threshold_k=OUTLIER_THRESHOLD_K, queue_size=PIPELINE_QUEUE_SIZE,
+                 decode_workers=0, cache=None, prescreen=False):
+    """
+    Конвейерная обработка набора изображений: три стадии в отдельных потоках,
+    связанные ограниченными очередями.
+
+        декодирование и нарезка -> инференс батчами -> сборка координат и фильтрация
+
+    Батчи инференса набираются из фрагментов подряд идущих изображений, поэтому модель
+    не простаивает на границах кадров, а декодирование следующего кадра идет одновременно
+    с инференсом текущего. Общее время стремится к времени самой медленной стадии,
+    а не к сумме стадий. Очереди ограничены queue_size, так что в памяти находится
+    не больше queue_size фрагментов.
+
+    decode_workers > 0 переносит декодирование в отдельные процессы (SharedTileDecoder):
+    фрагменты приходят через кольцевой буфер в shared_memory без pickle и копирования.
+    cache (DetectionCache) пропускает инференс для фрагментов, посчитанных ранее.
+    prescreen=True отсеивает пустые фрагменты еще на стадии нарезки (prescreen_tiles).
+
+    Результаты совпадают с run_image для каждого изображения.
+
+    Yields:
+        (image_path, Detections) сразу после обработки последнего фрагмента изображения
+    """
+    image_paths = list(image_paths)
+    stop = threading.Event()
+    tiles_queue = Queue(maxsize=queue_size)
+    predictions_queue = Queue(maxsize=queue_size)
+    results_queue = Queue(maxsize=queue_size)
+
+    def decode(stage):
+        for image_index, image_path in enumerate(image_paths):
+            start_time = time.perf_counter()
+            image_array = load_image_array(image_path)
+            grid = get_slice_grid(image_array.shape[1], image_array.shape[0])
+            tiles = list(iter_array_slices(image_array, grid))
+            if prescreen:
+                tiles = list(prescreen_tiles(tiles))
+            stage.busy_time += time.perf_counter() - start_time
+            # Сборка знает, сколько фрагментов ждать, до прихода первого предсказания
+            if not _put(predictions_queue, ("image", image_index, len(tiles)), stop):
+                return
+            for tile in tiles:
+                if not _put(tiles_queue, (*tile, image_index), stop):
+                    return
+
+    def infer_tiles(stage, tiles):
+        predictions = iter_predictions(model, _iter_timed(tiles, stage), batch_size, device, conf, cache)
+        while True:
+            start_time = time.perf_counter()
+            wait_time = stage.wait_time
+            prediction = next(predictions, None)
+            # Ожидание фрагментов от декодера внутри next не считается занятостью инференса
+            stage.busy_time += time.perf_counter() - start_time - (stage.wait_time - wait_time)
+            if prediction is None:
+                return
+            row, col, left, top, slice, image_index, xyxy, scores = prediction
+            if not _put(predictions_queue, ("tile", image_index, (row, col, left, top, xyxy, scores)), stop):
+                return
+
+    def infer(stage):
+        if not decode_workers:
+            infer_tiles(stage, _iter_queue(tiles_queue, stop))
+            return
+
+        def on_image(image_index, tiles_count):
+            _put(predictions_queue, ("image", image_index, tiles_count), stop)
+
+        with SharedTileDecoder(image_paths, decode_workers, hold=batch_size, on_image=on_image, prescreen=prescreen) as tiles:
+            infer_tiles(stage, tiles)
+
+    def merge(stage):
+        tiles_left = {}
+        image_predictions = {}
+
+        def emit(image_index):
+            start_time = time.perf_counter()
+            image_path = image_paths[image_index]
+            detections = merge_tile_predictions(image_predictions.pop(image_index), image_path)
+            detections = filter_detections(detections, iou_threshold, threshold_k)
+            del tiles_left[image_index]
+            stage.busy_time += time.perf_counter() - start_time
+            return _put(results_queue, (image_path, detections), stop)
+
+        for kind, image_index, payload in _iter_queue(predictions_queue, stop):
+            if kind == "image":
+                tiles_left[image_index] = tiles_left.get(image_index, 0) + payload
+                image_predictions.setdefault(image_index, [])
+            else:
+                tiles_left[image_index] = tiles_left.get(image_index, 0) - 1
+                image_predictions.setdefault(image_index, []).append(payload)
+            if tiles_left[image_index] == 0 and not emit(image_index):
+                return
+
+    # Маркер конца каждой стадии уходит в ее выходную очередь; сообщения "image" декодер
+    # кладет в очередь сборки раньше своего маркера, а значит и раньше маркера инференса
+    stages = [
+        _Stage("inference", infer, stop, predictions_queue),
+        _Stage("merge", merge, stop, results_queue),
+    ]
+    if not decode_workers:
+        stages.insert(0, _Stage("decode", decode, stop, tiles_queue))
+
+    start_time = time.time()
+    for stage in stages:
+        stage.start()
+    try:
+        for item in _iter_queue(results_queue, stop):
+            yield item
+    finally:
+        stop.set()
+        for stage in stages:
+            stage.join()
+    for stage in stages:
+        if stage.error is not None:
+            raise stage.error
+    elapsed = time.time() - start_time
+    busy = ", ".join(f"{stage.name} {stage.busy_time:.2f}" for stage in stages)
+    print(f"Время обработки: {elapsed:.2f} секунд, занятость стадий (с): {busy}")
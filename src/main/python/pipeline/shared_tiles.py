@@ -0,0 +1,201 @@
+import sys
+import multiprocessing as mp
+from collections import deque
+from multiprocessing import shared_memory, resource_tracker
+from queue import Empty
+import numpy as np
+from src.main.resources.config import SLICE_SIZE, OVERLAPPING_PERCENTAGE, BATCH_SIZE, SHARED_TILE_SLOTS
+from src.main.python.image_slicer.image_slicer import load_image_array, get_slice_grid, iter_array_slices
+from src.main.python.prescreen.prescreen import prescreen_tiles
+
+
+def _attach_shared_memory(name):
+    """
+    Подключает существующий сегмент по имени, не регистрируя его в resource_tracker:
+    сегментом владеет создавший его процесс, и только он делает unlink. До Python 3.13
+    подключение регистрирует сегмент, и при выходе процесса resource_tracker предупреждает
+    об утечке или удаляет сегмент. unregister после подключения не подходит: у процессов
+    spawn общий resource_tracker, и он снял бы регистрацию родителя.
+    """
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name, track=False)
+    register = resource_tracker.register
+    resource_tracker.register = lambda name, rtype: None
+    try:
+        return shared_memory.SharedMemory(name)
+    finally:
+        resource_tracker.register = register
+
+
+class TileRingBuffer:
+    """
+    Кольцевой буфер фрагментов в multiprocessing.shared_memory.
+
+    Память разбита на slots слотов slice_size x slice_size x 3 uint8. Писатель занимает
+    свободный слот (блокируется, если свободных нет - обратное давление), копирует в него
+    фрагмент и передает через очередь только номер слота и метаданные. Читатель получает
+    numpy-представление слота без копирования и возвращает слот вызовом release.
+
+    Буфер передается в дочерние процессы как аргумент Process: разделяемая память
+    подключается по имени без регистрации в resource_tracker (_attach_shared_memory),
+    очереди - штатно через multiprocessing.
+    """
+
+    def __init__(self, slots, slice_size=SLICE_SIZE, context=None):
+        context = context or mp.get_context("spawn")
+        self.slots = slots
+        self.slice_size = slice_size
+        self.shm = shared_memory.SharedMemory(create=True, size=slots * slice_size * slice_size * 3)
+        self.free_slots = context.Queue()
+        self.filled = context.Queue()
+        for slot in range(slots):
+            self.free_slots.put(slot)
+        self._array = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_array"] = None
+        state["shm"] = self.shm.name
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.shm = _attach_shared_memory(state["shm"])
+
+    @property
+    def array(self):
+        if self._array is None:
+            self._array = np.ndarray((self.slots, self.slice_size, self.slice_size, 3), dtype=np.uint8, buffer=self.shm.buf)
+        return self._array
+
+    def write(self, tile, meta):
+        slot = self.free_slots.get()
+        height, width = tile.shape[:2]
+        self.array[slot, :height, :width] = tile
+        self.filled.put((slot, height, width, meta))
+
+    def send(self, meta):
+        """
+        Сообщение без фрагмента, идет в общем порядке с фрагментами этого писателя.
+        """
+        self.filled.put((None, 0, 0, meta))
+
+    def read(self, timeout=None):
+        """
+        Returns:
+            (slot, view, meta); view - представление слота (None для сообщений send),
+            действительно до release(slot)
+        """
+        slot, height, width, meta = self.filled.get(timeout=timeout)
+        if slot is None:
+            return None, None, meta
+        return slot, self.array[slot, :height, :width], meta
+
+    def release(self, slot):
+        self.free_slots.put(slot)
+
+    def close(self, unlink=False):
+        """
+        Отключает разделяемую память. Представления, полученные из read, после этого недействительны:
+        numpy не удерживает отображение, обращение к ним приводит к падению процесса.
+        """
+        self._array = None
+        self.shm.close()
+        if unlink:
+            self.shm.unlink()
+
+
+def _decode_worker(ring, images, slice_size, overlap_percentage, prescreen):
+    for image_index, image_path in images:
+        image_array = load_image_array(image_path)
+        grid = get_slice_grid(image_array.shape[1], image_array.shape[0], slice_size, overlap_percentage)
+        tiles = list(iter_array_slices(image_array, grid, slice_size))
+        if prescreen:
+            tiles = list(prescreen_tiles(tiles))
+        ring.send(("image", image_index, len(tiles)))
+        for row, col, left, top, slice in tiles:
+            ring.write(slice, ("tile", image_index, row, col, left, top))
+    ring.send(("done", None, None))
+    ring.close()
+
+
+class SharedTileDecoder:
+    """
+    Декодирование и нарезка в decode_workers процессах, фрагменты передаются через TileRingBuffer.
+
+    Изображения раздаются процессам по кругу, порядок фрагментов между изображениями
+    разных процессов не гарантирован. Отданный фрагмент - представление слота без копии,
+    слот освобождается, когда после него отдано еще hold фрагментов, поэтому потребитель
+    должен скопировать фрагмент раньше (iter_predictions копирует батч из batch_size <= hold фрагментов).
+    Разделяемая память отключается при выходе из with, после этого фрагменты использовать нельзя.
+
+        with SharedTileDecoder(image_paths, decode_workers=4) as tiles:
+            for row, col, left, top, slice, image_index in tiles:
+                ...
+
+    Args:
+        on_image: вызывается как on_image(image_index, tiles_count) до первого фрагмента изображения
+        prescreen: отсеивать пустые фрагменты в процессах декодирования (prescreen_tiles)
+    """
+
+    def __init__(self, image_paths, decode_workers=2, slots=SHARED_TILE_SLOTS, hold=BATCH_SIZE, on_image=None,
+                 slice_size=SLICE_SIZE, overlap_percentage=OVERLAPPING_PERCENTAGE, prescreen=False):
+        if slots <= hold:
+            raise ValueError(f"slots ({slots}) must be greater than hold ({hold})")
+        self.image_paths = list(image_paths)
+        self.decode_workers = max(1, min(decode_workers, len(self.image_paths)))
+        self.slots = slots
+        self.hold = hold
+        self.on_image = on_image
+        self.slice_size = slice_size
+        self.overlap_percentage = overlap_percentage
+        self.prescreen = prescreen
+        self.ring = None
+        self.workers = []
+
+    def __enter__(self):
+        context = mp.get_context("spawn")
+        self.ring = TileRingBuffer(self.slots, self.slice_size, context)
+        images = list(enumerate(self.image_paths))
+        self.workers = [
+            context.Process(target=_decode_worker, daemon=True, args=(
+                self.ring, images[worker_index::self.decode_workers], self.slice_size, self.overlap_percentage,
+                self.prescreen))
+            for worker_index in range(self.decode_workers)
+        ]
+        for worker in self.workers:
+            worker.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        for worker in self.workers:
+            worker.join(timeout=1)
+            if worker.is_alive():
+                worker.terminate()
+        self.ring.close(unlink=True)
+
+    def __iter__(self):
+        """
+        Yields:
+            (row, col, left, top, slice, image_index), как у iter_image_slices плюс индекс изображения
+        """
+        held = deque()
+        finished_workers = 0
+        while finished_workers < len(self.workers):
+            try:
+                slot, view, (kind, image_index, *tile) = self.ring.read(timeout=1)
+            except Empty:
+                failed = [worker for worker in self.workers if worker.exitcode not in (None, 0)]
+                if failed:
+                    raise RuntimeError(f"Процесс декодирования завершился с ошибкой, код {failed[0].exitcode}")
+                continue
+            if kind == "done":
+                finished_workers += 1
+            elif kind == "image":
+                if self.on_image is not None:
+                    self.on_image(image_index, tile[0])
+            else:
+                held.append(slot)
+                if len(held) > self.hold:
+                    self.ring.release(held.popleft())
+                yield (*tile, view, image_index)
@@ -0,0 +1,62 @@
+import numpy as np
+from src.main.resources.config import (
+    PRESCREEN_DOWNSAMPLE, PRESCREEN_EDGE_THRESHOLD, PRESCREEN_MIN_EDGE_DENSITY, PRESCREEN_MIN_STD
+)
+
+# Веса яркости ITU-R BT.601
+GRAY_WEIGHTS = np.array([0.299, 0.587, 0.114], dtype=np.float32)
+
+
+def get_tile_features(tile, downsample=PRESCREEN_DOWNSAMPLE, edge_threshold=PRESCREEN_EDGE_THRESHOLD):
+    """
+    Дешевые признаки фрагмента по уменьшенной в downsample раз копии (среднее по блокам).
+
+    Returns:
+        (std яркости, доля пикселей с перепадом яркости больше edge_threshold)
+    """
+    height = tile.shape[0] // downsample * downsample
+    width = tile.shape[1] // downsample * downsample
+    if height == 0 or width == 0:
+        return 0.0, 0.0
+    blocks = tile[:height, :width].reshape(height // downsample, downsample, width // downsample, downsample, -1)
+    gray = blocks.mean(axis=(1, 3), dtype=np.float32)[..., :3] @ GRAY_WEIGHTS
+    if gray.shape[0] < 2 or gray.shape[1] < 2:
+        return float(gray.std()), 0.0
+    gradient = np.abs(np.diff(gray, axis=1))[:-1] + np.abs(np.diff(gray, axis=0))[:, :-1]
+    return float(gray.std()), float((gradient > edge_threshold).mean())
+
+
+def is_candidate_tile(tile, min_std=PRESCREEN_MIN_STD, min_edge_density=PRESCREEN_MIN_EDGE_DENSITY,
+                      downsample=PRESCREEN_DOWNSAMPLE, edge_threshold=PRESCREEN_EDGE_THRESHOLD):
+    """
+    Может ли на фрагменте быть объект: однородная степь без резких перепадов яркости отсеивается.
+
+    Фрагмент отсеивается, только если оба признака ниже порогов: малоконтрастный фрагмент
+    с перепадами или текстурный фрагмент с низким std остаются кандидатами.
+    """
+    std, edge_density = get_tile_features(tile, downsample, edge_threshold)
+    return std >= min_std or edge_density >= min_edge_density
+
+
+def prescreen_tiles(tiles, stats=None, **thresholds):
+    """
+    Пропускает дальше только фрагменты-кандидаты (is_candidate_tile).
+
+    Args:
+        tiles: итерируемое из (row, col, left, top, slice, ...), как у iter_image_slices
+        stats: dict, в который добавляются счетчики 'tiles' и 'skipped'
+        thresholds: пороги is_candidate_tile
+
+    Yields:
+        те же кортежи, только для фрагментов-кандидатов
+    """
+    if stats is not None:
+        stats.setdefault("tiles", 0)
+        stats.setdefault("skipped", 0)
+    for tile in tiles:
+        candidate = is_candidate_tile(tile[4], **thresholds)
+        if stats is not None:
+            stats["tiles"] += 1
+            stats["skipped"] += not candidate
+        if candidate:
+            yield tile
@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+"""
+Упакованный формат фрагментов: вместо тысяч PNG и TXT - несколько больших файлов.
+
+Папка шардов содержит пары shard-00000.bin / shard-00000.json. В .bin фрагменты лежат
+подряд как сырые HxWx3 uint8, в .json - индекс: имя фрагмента (путь относительно исходной
+папки), смещение, форма и YOLO-разметка (class, x_center, y_center, width, height).
+Файлы только дописываются; новый шард начинается, когда текущий превышает shard_size_mb.
+Чтение - через np.memmap, фрагмент отдается как представление без копирования.
+
+Usage:
+    python -m src.main.python.shards.shards pack slices shards/slices
+    python -m src.main.python.shards.shards unpack shards/slices slices_unpacked
+"""
+
+import os
+import sys
+import json
+import argparse
+import numpy as np
+from PIL import Image
+from src.main.resources.config import SHARD_SIZE_MB
+from src.main.python.image_slicer.image_slicer import iter_image_slices, get_slice_filename
+from src.main.python.utils.utils import get_slice_coordinates, get_source_image_name
+
+SHARD_PREFIX = "shard-"
+
+
+def _shard_paths(folder, shard_index):
+    base = os.path.join(folder, f"{SHARD_PREFIX}{shard_index:05d}")
+    return f"{base}.bin", f"{base}.json"
+
+
+def _list_shards(folder):
+    if not os.path.isdir(folder):
+        return []
+    return sorted(int(filename[len(SHARD_PREFIX):-len(".json")]) for filename in os.listdir(folder)
+                  if filename.startswith(SHARD_PREFIX) and filename.endswith(".json"))
+
+
+def _load_index(index_path):
+    with open(index_path) as f:
+        return json.load(f)
+
+
+class ShardWriter:
+    """
+    Дописывает фрагменты в папку шардов. Индекс сохраняется в close (и при переходе
+    к новому шарду) через временный файл, поэтому прерванная запись не портит уже сохраненные данные.
+
+        with ShardWriter("shards/slices") as writer:
+            writer.add("img/img_slice_000_000_0_0.png", tile, labels)
+    """
+
+    def __init__(self, folder, shard_size_mb=SHARD_SIZE_MB):
+        os.makedirs(folder, exist_ok=True)
+        self.folder = folder
+        self.shard_size = int(shard_size_mb * 1024 * 1024)
+        shards = _list_shards(folder)
+        self.shard_index = shards[-1] if shards else 0
+        self._open_shard()
+
+    def _open_shard(self):
+        bin_path, index_path = _shard_paths(self.folder, self.shard_index)
+        self.entries = _load_index(index_path) if os.path.exists(index_path) else []
+        # Данные после последней записи индекса (оборванная запись) отбрасываются
+        size = max((entry["offset"] + int(np.prod(entry["shape"])) for entry in self.entries), default=0)
+        self.file = open(bin_path, "r+b" if os.path.exists(bin_path) else "wb")
+        self.file.truncate(size)
+        self.file.seek(size)
+
+    def add(self, name, tile, labels=None):
+        """
+        Args:
+            name: имя фрагмента, например путь относительно папки slices
+            tile: массив HxWx3 uint8
+            labels: YOLO-разметка (K, 5): class, x_center, y_center, width, height
+        """
+        tile = np.ascontiguousarray(tile, dtype=np.uint8)
+        if self.entries and self.file.tell() + tile.nbytes > self.shard_size:
+            self._close_shard()
+            self.shard_index += 1
+            self._open_shard()
+        self.entries.append({
+            "name": name,
+            "offset": self.file.tell(),
+            "shape": list(tile.shape),
+            "labels": [] if labels is None else np.asarray(labels, dtype=np.float64).reshape(-1, 5).tolist(),
+        })
+        self.file.write(tile.data)
+
+    def _close_shard(self):
+        self.file.close()
+        _, index_path = _shard_paths(self.folder, self.shard_index)
+        with open(f"{index_path}.tmp", "w") as f:
+            json.dump(self.entries, f)
+        os.replace(f"{index_path}.tmp", index_path)
+
+    def close(self):
+        self._close_shard()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class ShardReader:
+    """
+    Произвольный доступ к фрагментам папки шардов через np.memmap.
+
+    reader[i] -> (tile, labels): tile - представление HxWx3 uint8 без копирования,
+    labels - float32 (K, 5). Подходит как map-style датасет для обучения;
+    iter_tiles отдает фрагменты в формате iter_image_slices для инференса.
+    """
+
+    def __init__(self, folder):
+        self.folder = folder
+        self.entries = []
+        self._memmaps = []
+        for shard_index in _list_shards(folder):
+            bin_path, index_path = _shard_paths(folder, shard_index)
+            entries = _load_index(index_path)
+            if not entries:
+                continue
+            for entry in entries:
+                entry["shard"] = len(self._memmaps)
+            self.entries.extend(entries)
+            self._memmaps.append(np.memmap(bin_path, dtype=np.uint8, mode="r"))
+        self._positions = {entry["name"]: position for position, entry in enumerate(self.entries)}
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __getitem__(self, position):
+        entry = self.entries[position]
+        size = int(np.prod(entry["shape"]))
+        tile = self._memmaps[entry["shard"]][entry["offset"]:entry["offset"] + size].reshape(entry["shape"])
+        return tile, np.asarray(entry["labels"], dtype=np.float32).reshape(-1, 5)
+
+    def __contains__(self, name):
+        return name in self._positions
+
+    def names(self):
+        return [entry["name"] for entry in self.entries]
+
+    def get(self, name):
+        return self[self._positions[name]]
+
+    def iter_tiles(self, source_name=None):
+        """
+        Фрагменты одного исходного изображения (или всех) для predict_tiles.
+
+        Yields:
+            (row, col, left, top, slice) как у iter_image_slices
+        """
+        for position, entry in enumerate(self.entries):
+            basename = os.path.basename(entry["name"])
+            if source_name is not None and get_source_image_name(basename) != source_name:
+                continue
+            row, col = (int(part) for part in os.path.splitext(basename)[0].rsplit("_slice_", 1)[1].split("_")[:2])
+            left, top = get_slice_coordinates(basename)
+            yield row, col, left, top, self[position][0]
+
+
+def read_yolo_labels(annotation_path):
+    if not os.path.exists(annotation_path):
+        return None
+    labels = []
+    with open(annotation_path) as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 5:
+                labels.append([float(part) for part in parts])
+    return labels
+
+
+def pack_folder(folder, shard_folder, shard_size_mb=SHARD_SIZE_MB):
+    """
+    Упаковывает PNG-фрагменты папки (рекурсивно) вместе с одноименными .txt разметками.
+
+    Returns:
+        число упакованных фрагментов
+    """
+    count = 0
+    with ShardWriter(shard_folder, shard_size_mb) as writer:
+        for root, dirs, filenames in os.walk(folder):
+            dirs.sort()
+            for filename in sorted(filenames):
+                if not filename.lower().endswith(".png"):
+                    continue
+                image_path = os.path.join(root, filename)
+                with Image.open(image_path) as image:
+                    tile = np.asarray(image.convert("RGB"))
+                labels = read_yolo_labels(os.path.splitext(image_path)[0] + ".txt")
+                writer.add(os.path.relpath(image_path, folder), tile, labels)
+                count += 1
+    print(f"Упаковано {count} фрагментов из {folder} в {shard_folder}")
+    return count
+
+
+def unpack_shards(shard_folder, folder):
+    """
+    Обратное преобразование: PNG-фрагменты и .txt разметки (если была) в исходной структуре папок.
+    """
+    reader = ShardReader(shard_folder)
+    for position, entry in enumerate(reader.entries):
+        tile, labels = reader[position]
+        image_path = os.path.join(folder, entry["name"])
+        os.makedirs(os.path.dirname(image_path), exist_ok=True)
+        Image.fromarray(np.asarray(tile)).save(image_path)
+        if len(labels):
+            with open(os.path.splitext(image_path)[0] + ".txt", "w") as f:
+                for label in entry["labels"]:
+                    f.write(f"{int(label[0])} {label[1]} {label[2]} {label[3]} {label[4]}\n")
+    print(f"Распаковано {len(reader)} фрагментов из {shard_folder} в {folder}")
+    return len(reader)
+
+
+def write_image_shards(image_path, writer):
+    """
+    Нарезает изображение сразу в шарды, без промежуточных PNG; имена как у create_image_slices.
+    """
+    base_name = os.path.splitext(os.path.basename(image_path))[0]
+    count = 0
+    for row, col, left, top, slice in iter_image_slices(image_path):
+        writer.add(os.path.join(base_name, get_slice_filename(base_name, row, col, left, top)), slice)
+        count += 1
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert between tile folders and packed tile shards")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    pack_parser = subparsers.add_parser("pack", help="Pack a folder of PNG tiles and YOLO labels into shards")
+    pack_parser.add_argument("folder")
+    pack_parser.add_argument("shard_folder")
+    pack_parser.add_argument("--shard-size-mb", type=float, default=SHARD_SIZE_MB,
+                             help=f"Maximum shard size in MB (default: {SHARD_SIZE_MB})")
+    unpack_parser = subparsers.add_parser("unpack", help="Unpack shards into a folder of PNG tiles and YOLO labels")
+    unpack_parser.add_argument("shard_folder")
+    unpack_parser.add_argument("folder")
+    args = parser.parse_args()
+
+    try:
+        if args.command == "pack":
+            pack_folder(args.folder, args.shard_folder, args.shard_size_mb)
+        else:
+            unpack_shards(args.shard_folder, args.folder)
+    except Exception as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
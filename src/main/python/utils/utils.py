@@ -1,11 +1,11 @@
-import torch
-from ultralytics import YOLO
 import os
-import time
+import sys
+import shutil
+import hashlib
 
 def copyfile(source_path, destination_path):
-    with open(source_path, 'rb') as src, open(destination_path, 'wb') as dst:
-        dst.write(src.read())
+    # Копирование порциями (sendfile, где доступен), без чтения всего файла в память
+    shutil.copyfile(source_path, destination_path)
         
 def copyfolder(source_folder, destination_folder):
     if not os.path.exists(destination_folder):
@@ -35,4 +35,35 @@ def get_slice_coordinates(filename):
     return x_min, y_min
 
 
-    
\ No newline at end of file
+    
+
+def get_source_image_name(filename):
+    # Имя исходного изображения - префикс имени фрагмента до "_slice_"
+    basename = os.path.splitext(os.path.basename(filename))[0]
+    return basename.rsplit('_slice_', 1)[0]
+
+def get_rss_mb():
+    # Текущий RSS процесса в МБ; где /proc недоступен - пиковый RSS из getrusage
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1024 / 1024
+    except (OSError, ValueError, AttributeError):
+        pass
+    return get_peak_rss_mb()
+
+def get_peak_rss_mb():
+    # Пиковый RSS процесса за все время работы в МБ (getrusage); None, где resource недоступен
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+
+def get_file_hash(path, chunk_size=1024 * 1024):
+    # SHA-256 содержимого файла (первые 16 символов), файл читается порциями
+    file_hash = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            file_hash.update(chunk)
+    return file_hash.hexdigest()[:16]
@@ -6,7 +6,17 @@
 import os
 from PIL import Image, ImageDraw, ImageFont
 import numpy as np
-from typing import List, Tuple, Optional
+from typing import List, Tuple, Optional, Union
+from src.main.python.detections.detections import Detections
+from src.main.python.decoder.decoder import decode_image
+from src.main.python.image_slicer.raster_cache import RasterCache
+from src.main.python.manifest.manifest import Manifest, list_images
+
+
+def _open_image(image_path: str, raster_cache: Optional[RasterCache] = None) -> Image.Image:
+    # Декодируем изображение (быстрым JPEG-декодером, если установлен) или берем растр из кэша
+    image_array = decode_image(image_path) if raster_cache is None else raster_cache.load(image_path)
+    return Image.fromarray(np.asarray(image_array))
 
 
 def draw_bounding_boxes_on_image(
@@ -16,7 +26,8 @@ def draw_bounding_boxes_on_image(
     box_color: str = "red",
     box_width: int = 3,
     label: str = "saiga",
-    font_size: int = 20
+    font_size: int = 20,
+    raster_cache: Optional[RasterCache] = None
 ) -> None:
     """
     Рисует боксы на изображении и сохраняет результат
@@ -29,9 +40,9 @@ def draw_bounding_boxes_on_image(
         box_width (int): Толщина линий боксов
         label (str): Подпись для боксов
         font_size (int): Размер шрифта для подписей
+        raster_cache (RasterCache): Кэш декодированных кадров, если задан
     """
-    # Открываем изображение
-    image = Image.open(image_path)
+    image = _open_image(image_path, raster_cache)
     draw = ImageDraw.Draw(image)
     
     # Пытаемся загрузить шрифт, если не получается - используем стандартный
@@ -71,83 +82,103 @@ def draw_bounding_boxes_on_image(
     print(f"Изображение с боксами сохранено: {output_path}")
 
 
+def get_matching_boxes(filtered_boxes_list: Union[List[dict], Detections], image_basename: str) -> List[List[float]]:
+    """
+    Возвращает боксы, относящиеся к изображению image_basename
+    
+    Args:
+        filtered_boxes_list (List[dict] | Detections): Список отфильтрованных боксов или Detections
+        image_basename (str): Имя изображения без расширения
+    """
+    if isinstance(filtered_boxes_list, Detections):
+        tile_mask = np.array([image_basename in source for source in filtered_boxes_list.sources], dtype=bool)
+        if not tile_mask.any():
+            return []
+        return filtered_boxes_list.xyxy[tile_mask[filtered_boxes_list.tile_id]].tolist()
+
+    matching_boxes = []
+    for box_group in filtered_boxes_list:
+        if image_basename in box_group['source_image_path']:
+            matching_boxes.extend(box_group['coordinates'])
+    return matching_boxes
+
+
 def create_visualization_from_filtered_boxes(
     original_images_folder: str,
-    filtered_boxes_list: List[dict],
+    filtered_boxes_list: Union[List[dict], Detections],
     output_folder: str,
     box_color: str = "red",
     box_width: int = 3,
-    label: str = "saiga"
+    label: str = "saiga",
+    raster_cache: Optional[RasterCache] = None,
+    manifest: Optional[Manifest] = None
 ) -> None:
     """
     Создает визуализацию для всех изображений с отфильтрованными боксами
     
     Args:
         original_images_folder (str): Папка с оригинальными изображениями
-        filtered_boxes_list (List[dict]): Список отфильтрованных боксов
+        filtered_boxes_list (List[dict] | Detections): Список отфильтрованных боксов или Detections
         output_folder (str): Папка для сохранения результатов
         box_color (str): Цвет боксов
         box_width (int): Толщина линий боксов
         label (str): Подпись для боксов
+        raster_cache (RasterCache): Кэш декодированных кадров, если задан
+        manifest (Manifest): Манифест датасета, если задан - список изображений берется из него
     """
     # Создаем папку для результатов
     if not os.path.exists(output_folder):
         os.makedirs(output_folder)
     
     # Обрабатываем каждое изображение
-    for image_name in os.listdir(original_images_folder):
-        if image_name.endswith((".JPG", ".jpg", ".JPEG", ".jpeg", ".PNG", ".png")):
-            source_image_path = os.path.join(original_images_folder, image_name)
-            output_image_path = os.path.join(output_folder, f"visualized_{image_name}")
-            
-            # Находим соответствующие боксы для этого изображения
-            image_basename = os.path.splitext(image_name)[0]
-            matching_boxes = []
-            
-            for box_group in filtered_boxes_list:
-                if image_basename in box_group['source_image_path']:
-                    matching_boxes.extend(box_group['coordinates'])
-            
-            if matching_boxes:
-                print(f"Обрабатываем {image_name}: найдено {len(matching_boxes)} боксов")
-                draw_bounding_boxes_on_image(
-                    image_path=source_image_path,
-                    boxes=matching_boxes,
-                    output_path=output_image_path,
-                    box_color=box_color,
-                    box_width=box_width,
-                    label=label
-                )
-            else:
-                print(f"Для {image_name} не найдено боксов")
+    for source_image_path in list_images(original_images_folder, manifest=manifest):
+        image_name = os.path.basename(source_image_path)
+        output_image_path = os.path.join(output_folder, f"visualized_{image_name}")
+        
+        # Находим соответствующие боксы для этого изображения
+        image_basename = os.path.splitext(image_name)[0]
+        matching_boxes = get_matching_boxes(filtered_boxes_list, image_basename)
+        
+        if matching_boxes:
+            print(f"Обрабатываем {image_name}: найдено {len(matching_boxes)} боксов")
+            draw_bounding_boxes_on_image(
+                image_path=source_image_path,
+                boxes=matching_boxes,
+                output_path=output_image_path,
+                box_color=box_color,
+                box_width=box_width,
+                label=label,
+                raster_cache=raster_cache
+            )
+        else:
+            print(f"Для {image_name} не найдено боксов")
 
 
 def create_single_image_visualization(
     image_path: str,
-    filtered_boxes_list: List[dict],
+    filtered_boxes_list: Union[List[dict], Detections],
     output_path: str,
     box_color: str = "red",
     box_width: int = 3,
-    label: str = "saiga"
+    label: str = "saiga",
+    raster_cache: Optional[RasterCache] = None
 ) -> None:
     """
     Создает визуализацию для одного изображения
     
     Args:
         image_path (str): Путь к изображению
-        filtered_boxes_list (List[dict]): Список отфильтрованных боксов
+        filtered_boxes_list (List[dict] | Detections): Список отфильтрованных боксов или Detections
         output_path (str): Путь для сохранения результата
         box_color (str): Цвет боксов
         box_width (int): Толщина линий боксов
         label (str): Подпись для боксов
+        raster_cache (RasterCache): Кэш декодированных кадров, если задан
     """
     image_basename = os.path.splitext(os.path.basename(image_path))[0]
-    matching_boxes = []
     
     # Находим соответствующие боксы
-    for box_group in filtered_boxes_list:
-        if image_basename in box_group['source_image_path']:
-            matching_boxes.extend(box_group['coordinates'])
+    matching_boxes = get_matching_boxes(filtered_boxes_list, image_basename)
     
     if matching_boxes:
         print(f"Найдено {len(matching_boxes)} боксов для {image_basename}")
@@ -157,7 +188,8 @@ def create_single_image_visualization(
             output_path=output_path,
             box_color=box_color,
             box_width=box_width,
-            label=label
+            label=label,
+            raster_cache=raster_cache
         )
     else:
         print(f"Для {image_basename} не найдено боксов")
@@ -170,7 +202,8 @@ def create_comparison_visualization(
     output_path: str,
     original_color: str = "blue",
     filtered_color: str = "red",
-    box_width: int = 3
+    box_width: int = 3,
+    raster_cache: Optional[RasterCache] = None
 ) -> None:
     """
     Создает сравнительную визуализацию оригинальных и отфильтрованных боксов
@@ -183,8 +216,9 @@ def create_comparison_visualization(
         original_color (str): Цвет для оригинальных боксов
         filtered_color (str): Цвет для отфильтрованных боксов
         box_width (int): Толщина линий боксов
+        raster_cache (RasterCache): Кэш декодированных кадров, если задан
     """
-    image = Image.open(image_path)
+    image = _open_image(image_path, raster_cache)
     draw = ImageDraw.Draw(image)
     
     # Рисуем оригинальные боксы
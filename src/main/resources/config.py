@@ -1,12 +1,64 @@
 import os
 
 MODEL_NAME = "best_4_pytorch"
+EXPORTED_MODELS_FOLDER = "exported_models"
 OVERLAPPING_PERCENTAGE = 20
 SLICE_SIZE = 640
 SLICES_FOLDER = "slices"
+# Изображения больше этого размера в декодированном виде нарезаются полосами (iter_image_bands)
+IMAGE_MEMORY_BUDGET_MB = 512
+# Декодер JPEG: "auto" - turbojpeg или simplejpeg, если установлены, иначе PIL
+DECODER_BACKEND = "auto"
+# Большая сторона превью при визуализации (decode_preview)
+PREVIEW_MAX_SIZE = 2048
+# Кэш декодированных кадров (RasterCache): папка с .npy растрами и ограничение размера
+RASTER_CACHE_FOLDER = os.path.join("cache", "rasters")
+RASTER_CACHE_SIZE_MB = 10240
+# Манифест датасета (Manifest): подключается явно - scan_manifest или флаг --manifest, стадии получают его параметром manifest
+MANIFEST_PATH = os.path.join("cache", "manifest.sqlite")
 
 PREDICT_FOLDER_PREFIX = "predicted_images_with_annotations"
 CONFIDENCE_THRESHOLD = 0.5
+# IoU внутреннего NMS модели и максимум боксов на фрагмент (значения ultralytics по умолчанию)
+PREDICT_IOU = 0.7
+PREDICT_MAX_DET = 300
+# max_det сырых детекций sweep: с запасом, чтобы обрезка PREDICT_MAX_DET повторялась уже после фильтра по conf
+SWEEP_MAX_DET = 30000
+BATCH_SIZE = 16
+# Фрагментов в одной задаче планировщика process_images_parallel
+TILES_PER_TASK = 32
+# Сколько декодированных кадров воркер планировщика держит в памяти (LRU)
+WORKER_IMAGE_CACHE_SIZE = 2
+# Емкость очередей между стадиями run_pipeline (фрагментов 640x640 RGB ~1.2 МБ каждый)
+PIPELINE_QUEUE_SIZE = 4 * BATCH_SIZE
+# Слотов кольцевого буфера фрагментов в shared_memory (iter_shared_tiles)
+SHARED_TILE_SLOTS = 4 * BATCH_SIZE
+
+# Кэш сырых детекций (DetectionCache): SQLite-файл и ограничение размера
+DETECTION_CACHE_PATH = os.path.join("cache", "detections.sqlite")
+DETECTION_CACHE_SIZE_MB = 1024
+
+# Допустимое падение фрагментов/с (%) в benchmark_pipeline относительно лучшего из последних запусков
+BENCHMARK_MAX_REGRESSION = 10
+# Сколько последних запусков той же конфигурации учитывается при выборе базового
+BENCHMARK_BASELINE_RUNS = 5
+
+# Максимальный размер одного файла шарда фрагментов (ShardWriter)
+SHARD_SIZE_MB = 1024
+
+# Предварительный отсев пустых фрагментов (prescreen): уменьшение, порог перепада яркости
+# соседних пикселей, минимальная доля таких пикселей и минимальное std яркости;
+# отсеиваются фрагменты, у которых оба признака ниже минимумов
+PRESCREEN_DOWNSAMPLE = 4
+PRESCREEN_EDGE_THRESHOLD = 30
+PRESCREEN_MIN_EDGE_DENSITY = 0.0005
+PRESCREEN_MIN_STD = 4.0
+
+# Грубый проход (coarse_to_fine): уменьшение кадра, порог уверенности детекций грубого прохода
+# и отступ в пикселях полного разрешения вокруг них, внутри которого фрагменты режутся полностью
+COARSE_SCALE = 4
+COARSE_CONFIDENCE_THRESHOLD = 0.1
+ROI_MARGIN = SLICE_SIZE // 2
 
 OUTLIER_FILTER_FOLDER_PREFIX = "outlier_filtered"
 OUTLIER_THRESHOLD_K = 3
@@ -16,5 +68,10 @@ IOU_THRESHOLD = 0.5
 
 EPOCHS = 150
 
+CALIBRATION_DATASET_FOLDER = os.path.join("dataset", "2.0.0")
+CALIBRATION_SAMPLE_SIZE = 300
+# Допустимый рост MAE подсчета (сайгаков на кадр) у INT8-модели относительно FP32
+INT8_MAE_TOLERANCE = 0.5
+
 # DATASET_FOLDER = os.path.join("dataset", "0.0.1", "АФС для обработки ИИ")
 DATASET_FOLDER = "dataset"
\ No newline at end of file
@@ -10,6 +10,34 @@ from ultralytics import YOLO
 
 
 DEFAULT_CONFIDENCE_THRESHOLD = 0.5
+JPEG_MAGIC = b"\xff\xd8\xff"
+
+
+def get_jpeg_decoder():
+    # Быстрый JPEG-декодер (libjpeg-turbo), если установлен; результат - BGR numpy, как ждет ultralytics
+    try:
+        from turbojpeg import TurboJPEG, TJPF_BGR
+        decoder = TurboJPEG()
+        return lambda image_bytes: decoder.decode(image_bytes, pixel_format=TJPF_BGR)
+    except (ImportError, OSError, RuntimeError):
+        pass
+    try:
+        import simplejpeg
+        return lambda image_bytes: simplejpeg.decode_jpeg(image_bytes, colorspace='BGR')
+    except ImportError:
+        return None
+
+
+_jpeg_decoder = get_jpeg_decoder()
+
+
+def decode_image(image_bytes):
+    if _jpeg_decoder is not None and image_bytes[:3] == JPEG_MAGIC:
+        try:
+            return _jpeg_decoder(image_bytes)
+        except (ValueError, OSError, RuntimeError):
+            pass
+    return Image.open(io.BytesIO(image_bytes))
 
 def get_device():
     if torch.cuda.is_available():
@@ -44,8 +72,7 @@ def model_fn(model_dir):
 
 def input_fn(request_body, request_content_type):
     if request_content_type == 'application/x-image':
-        image = Image.open(io.BytesIO(request_body))
-        return image
+        return decode_image(request_body)
     elif request_content_type == 'application/json':
         data = json.loads(request_body)
         
@@ -53,7 +80,7 @@ def input_fn(request_body, request_content_type):
             raise ValueError("JSON должен содержать поле 'image'")
         
         image_bytes = base64.b64decode(data['image'])
-        image = Image.open(io.BytesIO(image_bytes))
+        image = decode_image(image_bytes)
         
         conf_threshold = data.get('confidence_threshold', None)
         return {'image': image, 'conf_threshold': conf_threshold}
@@ -0,0 +1,17 @@
+import pytest
+
+# micro_benchmarks пишет и читает аннотации через model.yolo, которому нужен ultralytics
+pytest.importorskip("ultralytics")
+from src.main.python.benchmarking.micro_benchmarks import BENCHMARKS, run_benchmarks
+
+# Малые размеры: квадратичные эталоны и запись фрагментов на диск укладываются в секунды
+TEST_SIZES = {
+    "create_image_slices": 4,
+}
+
+
+@pytest.mark.parametrize("name", list(BENCHMARKS))
+def test_implementations_match_reference(name):
+    rows = run_benchmarks([name], [TEST_SIZES.get(name, 300)], repeat=1)
+    assert rows
+    assert [label for _, _, label, _, check in rows if check == "MISMATCH"] == []
@@ -0,0 +1,54 @@
+import copy
+import numpy as np
+from src.main.python.detections.detections import Detections
+from src.main.python.iou_filter.iou_filter import filter_iou, update_coordinates
+from src.main.python.outlier_filter.outlier_filter import filter_outliers
+
+
+def random_boxes_list(seed, tiles=12, slice_size=640, base_name="img"):
+    # Целочисленные боксы (точно представимы в float32) на фрагментах 3x4 с перекрытием 20%, часть фрагментов пустые
+    rng = np.random.default_rng(seed)
+    step = int(slice_size * 0.8)
+    boxes_list = []
+    for tile in range(tiles):
+        row, col = divmod(tile, 4)
+        n = int(rng.choice([0, 3, 40]))
+        xy = rng.integers(0, slice_size - 40, (n, 2))
+        wh = rng.integers(8, 40, (n, 2))
+        boxes_list.append({
+            'source_image_path': f"slices/{base_name}/{base_name}_slice_{row:03d}_{col:03d}_{col * step}_{row * step}.png",
+            'coordinates': np.hstack([xy, xy + wh]).astype(float).tolist(),
+        })
+    return boxes_list
+
+
+def test_boxes_list_round_trip():
+    boxes_list = random_boxes_list(0)
+    detections = Detections.from_boxes_list(copy.deepcopy(boxes_list))
+    assert len(detections) == sum(len(boxes['coordinates']) for boxes in boxes_list)
+    # Пустые фрагменты в обратное преобразование не попадают, координаты становятся глобальными
+    expected = [boxes for boxes in update_coordinates(copy.deepcopy(boxes_list)) if boxes['coordinates']]
+    assert detections.to_boxes_list() == expected
+
+
+def test_concat_merges_sources():
+    first = Detections.from_boxes_list(random_boxes_list(0))
+    second = Detections.from_boxes_list(random_boxes_list(1, base_name="other"))
+    merged = Detections.concat([first, second])
+    assert merged.to_boxes_list() == first.to_boxes_list() + second.to_boxes_list()
+    # Общие фрагменты хранятся в таблице один раз
+    doubled = Detections.concat([first, first])
+    assert doubled.sources == first.sources
+    assert len(doubled) == 2 * len(first)
+
+
+def test_filter_iou_matches_boxes_list():
+    boxes_list = random_boxes_list(2)
+    expected = filter_iou(copy.deepcopy(boxes_list))
+    assert filter_iou(Detections.from_boxes_list(copy.deepcopy(boxes_list))).to_boxes_list() == expected
+
+
+def test_filter_outliers_matches_boxes_list():
+    boxes_list = update_coordinates(random_boxes_list(3))
+    expected = filter_outliers(copy.deepcopy(boxes_list))
+    assert filter_outliers(Detections.from_boxes_list(boxes_list, local=False)).to_boxes_list() == expected
@@ -0,0 +1,127 @@
+import copy
+import numpy as np
+import pytest
+from src.main.resources.config import IOU_THRESHOLD
+from src.main.python.iou_filter.iou_filter import (
+    calculate_iou, filter_iou, find_candidate_pairs, find_seam_candidate_pairs, update_coordinates
+)
+from src.main.python.benchmarking.reference import reference_filter_iou
+from src.main.python.benchmarking.synthetic import generate_seam_boxes
+
+
+def random_tile_boxes(seed, tiles=12, boxes_per_tile=40, slice_size=640, base_name="img"):
+    # Целочисленные боксы на фрагментах одного изображения 3x4 с перекрытием 20%
+    rng = np.random.default_rng(seed)
+    step = int(slice_size * 0.8)
+    boxes_list = []
+    for tile in range(tiles):
+        row, col = divmod(tile, 4)
+        xy = rng.integers(0, slice_size - 40, (boxes_per_tile, 2))
+        wh = rng.integers(8, 40, (boxes_per_tile, 2))
+        boxes_list.append({
+            'source_image_path': f"slices/{base_name}/{base_name}_slice_{row:03d}_{col:03d}_{col * step}_{row * step}.png",
+            'coordinates': np.hstack([xy, xy + wh]).astype(float).tolist(),
+        })
+    return boxes_list
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_filter_iou_matches_reference_on_seam_boxes(seed):
+    # Около 1500 боксов одного изображения, сгущенных у швов, с дубликатами в зонах перекрытия
+    boxes_list = generate_seam_boxes(1500, seed=seed)
+    expected = reference_filter_iou(copy.deepcopy(boxes_list))
+    assert filter_iou(copy.deepcopy(boxes_list)) == expected
+
+
+@pytest.mark.parametrize("seed", range(3))
+@pytest.mark.parametrize("backend", ["numpy", "python"])
+def test_filter_iou_matches_reference_on_random_boxes(seed, backend):
+    boxes_list = random_tile_boxes(seed)
+    expected = reference_filter_iou(copy.deepcopy(boxes_list))
+    assert filter_iou(copy.deepcopy(boxes_list), backend=backend) == expected
+
+
+def test_filter_iou_matches_reference_on_equal_boxes():
+    # Одинаковые по значению боксы исходный цикл считает одним дубликатом
+    box = [10.0, 10.0, 30.0, 30.0]
+    boxes_list = [
+        {'source_image_path': "slices/img/img_slice_000_000_0_0.png", 'coordinates': [list(box), list(box), [12.0, 11.0, 31.0, 30.0]]},
+        {'source_image_path': "slices/img/img_slice_000_001_0_0.png", 'coordinates': [list(box), [100.0, 100.0, 120.0, 120.0]]},
+    ]
+    expected = reference_filter_iou(copy.deepcopy(boxes_list))
+    assert filter_iou(copy.deepcopy(boxes_list)) == expected
+
+
+def _pair_set(candidate_pairs):
+    pairs = set()
+    for first, second in candidate_pairs:
+        pairs.update(zip(np.minimum(first, second).tolist(), np.maximum(first, second).tolist()))
+    return pairs
+
+
+def _overlapping_pairs(boxes):
+    return {(i, j) for i in range(len(boxes)) for j in range(i + 1, len(boxes))
+            if calculate_iou(boxes[i], boxes[j]) > 0}
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_find_candidate_pairs_covers_all_overlaps(seed):
+    rng = np.random.default_rng(seed)
+    xy = rng.random((400, 2)) * 2000
+    wh = rng.random((400, 2)) * 60 + 5
+    # Несколько огромных боксов не должны выпасть из поиска по сетке
+    wh[:3] = 1500
+    boxes = np.hstack([xy, xy + wh])
+    assert _overlapping_pairs(boxes) <= _pair_set(find_candidate_pairs(boxes))
+
+
+def test_filter_iou_keeps_overlapping_boxes_of_different_images():
+    # Одинаковые глобальные координаты на разных кадрах - разные объекты, внутри кадра - дубликат
+    boxes_list = [
+        {'source_image_path': "slices/a/a_slice_000_000_0_0.png", 'coordinates': [[10.0, 10.0, 30.0, 30.0]]},
+        {'source_image_path': "slices/b/b_slice_000_000_0_0.png", 'coordinates': [[10.0, 10.0, 30.0, 30.0]]},
+        {'source_image_path': "slices/b/b_slice_000_001_5_0.png", 'coordinates': [[6.0, 10.0, 26.0, 30.0]]},
+    ]
+    filtered = filter_iou(copy.deepcopy(boxes_list))
+    # Из пары дубликатов, как и в исходном цикле, убирается первый бокс
+    assert [boxes['source_image_path'] for boxes in filtered] == [
+        "slices/a/a_slice_000_000_0_0.png", "slices/b/b_slice_000_001_5_0.png"
+    ]
+
+
+def test_filter_iou_workers_match_single_process():
+    boxes_list = [boxes for seed, base_name in enumerate("abc") for boxes in random_tile_boxes(seed, base_name=base_name)]
+    expected = reference_filter_iou(copy.deepcopy(boxes_list))
+    assert filter_iou(copy.deepcopy(boxes_list), workers=1) == expected
+    assert filter_iou(copy.deepcopy(boxes_list), workers=2) == expected
+
+
+def _global_boxes(boxes_list, local=True):
+    offsets = [[int(part) for part in boxes['source_image_path'][:-4].split('_')[-2:]] for boxes in boxes_list]
+    group_sizes = [len(boxes['coordinates']) for boxes in boxes_list]
+    if local:
+        boxes_list = update_coordinates(copy.deepcopy(boxes_list))
+    boxes = np.array([box for group in boxes_list for box in group['coordinates']])
+    return boxes, np.repeat(offsets, group_sizes, axis=0), np.repeat(np.arange(len(boxes_list)), group_sizes)
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_find_seam_candidate_pairs_covers_cross_tile_overlaps(seed):
+    boxes, tile_offsets, tile_ids = _global_boxes(random_tile_boxes(seed))
+    candidates = _pair_set(find_seam_candidate_pairs(boxes, tile_offsets, tile_ids, slice_size=640))
+    cross_tile = {(i, j) for i, j in _overlapping_pairs(boxes) if tile_ids[i] != tile_ids[j]}
+    assert cross_tile <= candidates
+    assert all(tile_ids[i] != tile_ids[j] for i, j in candidates)
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_filter_iou_seam_removes_cross_tile_duplicates(seed):
+    # В режиме "seam" пары внутри фрагмента не сравниваются, но дубликаты с соседних фрагментов убираются
+    boxes_list = generate_seam_boxes(1500, seed=seed)
+    filtered = filter_iou(copy.deepcopy(boxes_list), candidates="seam")
+    # filter_iou возвращает боксы уже в координатах изображения
+    boxes, _, tile_ids = _global_boxes(filtered, local=False)
+    assert not [(i, j) for i, j in _overlapping_pairs(boxes)
+                if tile_ids[i] != tile_ids[j] and calculate_iou(boxes[i], boxes[j]) > IOU_THRESHOLD]
+    assert sum(map(len, (boxes['coordinates'] for boxes in filtered))) >= \
+        sum(map(len, (boxes['coordinates'] for boxes in filter_iou(copy.deepcopy(boxes_list)))))
@@ -0,0 +1,83 @@
+import os
+import numpy as np
+import pytest
+from PIL import Image
+from src.main.python.utils.utils import get_file_hash
+from src.main.python.manifest.manifest import Manifest, list_images, scan_manifest
+
+
+@pytest.fixture
+def dataset(tmp_path):
+    folder = tmp_path / "dataset"
+    folder.mkdir()
+    rng = np.random.default_rng(0)
+    for index, size in enumerate([(64, 48), (80, 60), (32, 32)]):
+        Image.fromarray(rng.integers(0, 256, (size[1], size[0], 3), dtype=np.uint8)).save(folder / f"img_{index}.jpg")
+    Image.fromarray(rng.integers(0, 256, (40, 50, 3), dtype=np.uint8)).save(folder / "img_3.png")
+    # Обрезанный JPEG открывается, но без маркера конца; мусорный файл не открывается вовсе
+    data = (folder / "img_0.jpg").read_bytes()
+    (folder / "truncated.jpg").write_bytes(data[:len(data) // 2])
+    (folder / "broken.jpg").write_bytes(b"not an image")
+    (folder / "notes.txt").write_text("skip me")
+    return folder
+
+
+@pytest.fixture
+def manifest(tmp_path):
+    with Manifest(str(tmp_path / "manifest.sqlite")) as manifest:
+        yield manifest
+
+
+def test_scan_round_trip(dataset, manifest):
+    assert manifest.scan(str(dataset), workers=1) == (6, 0)
+    assert manifest.list_images(str(dataset)) == [
+        os.path.join(str(dataset), filename) for filename in ["img_0.jpg", "img_1.jpg", "img_2.jpg", "img_3.png", "truncated.jpg"]
+    ]
+    assert "truncated.jpg" not in map(os.path.basename, manifest.list_images(str(dataset), skip_truncated=True))
+
+    record = manifest.get(str(dataset / "img_1.jpg"))
+    assert (record["width"], record["height"], record["format"], record["truncated"]) == (80, 60, "JPEG", 0)
+    assert record["hash"] == get_file_hash(str(dataset / "img_1.jpg"))
+    assert manifest.get(str(dataset / "img_3.png"))["format"] == "PNG"
+    assert manifest.get(str(dataset / "truncated.jpg"))["truncated"] == 1
+    assert manifest.get(str(dataset / "broken.jpg"))["error"] is not None
+    assert manifest.get(str(dataset / "notes.txt")) is None
+
+
+def test_rescan_is_incremental(dataset, manifest):
+    manifest.scan(str(dataset), workers=1)
+    assert manifest.scan(str(dataset), workers=1) == (0, 0)
+
+    Image.new("RGB", (16, 16)).save(dataset / "img_1.jpg")
+    os.remove(dataset / "img_2.jpg")
+    assert manifest.scan(str(dataset), workers=1) == (1, 1)
+    assert manifest.get(str(dataset / "img_1.jpg"))["width"] == 16
+    assert manifest.get(str(dataset / "img_2.jpg")) is None
+    assert manifest.get_hash(str(dataset / "img_1.jpg")) == get_file_hash(str(dataset / "img_1.jpg"))
+
+
+def test_parallel_scan_matches_serial(dataset, tmp_path):
+    with Manifest(str(tmp_path / "serial.sqlite")) as serial, Manifest(str(tmp_path / "parallel.sqlite")) as parallel:
+        serial.scan(str(dataset), workers=1)
+        parallel.scan(str(dataset), workers=2)
+        for filename in sorted(os.listdir(dataset)):
+            path = str(dataset / filename)
+            assert parallel.get(path) == serial.get(path)
+
+
+def test_list_images_without_manifest(dataset, manifest):
+    # Без манифеста - os.listdir, в список попадает и неоткрывающийся файл
+    paths = list_images(str(dataset))
+    assert os.path.join(str(dataset), "broken.jpg") in paths
+    manifest.scan(str(dataset), workers=1)
+    assert list_images(str(dataset), manifest=manifest) == manifest.list_images(str(dataset))
+
+
+def test_list_images_does_not_rescan(dataset, tmp_path):
+    # Манифест сканируется один раз при открытии: новые файлы видны только после явного scan
+    with scan_manifest(str(dataset), path=str(tmp_path / "manifest.sqlite"), workers=1) as manifest:
+        before = list_images(str(dataset), manifest=manifest)
+        Image.new("RGB", (8, 8)).save(dataset / "img_new.jpg")
+        assert list_images(str(dataset), manifest=manifest) == before
+        assert manifest.scan(str(dataset), workers=1) == (1, 0)
+        assert os.path.join(str(dataset), "img_new.jpg") in list_images(str(dataset), manifest=manifest)
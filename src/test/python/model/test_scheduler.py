@@ -0,0 +1,47 @@
+import multiprocessing as mp
+from queue import Empty
+from collections import OrderedDict
+import numpy as np
+from src.main.python.model import scheduler
+
+
+class ListQueue:
+    def __init__(self, tasks):
+        self.tasks = list(tasks)
+
+    def get_nowait(self):
+        if not self.tasks:
+            raise Empty
+        return self.tasks.pop(0)
+
+
+def test_take_task_prefers_own_queue_then_victim():
+    queues = [ListQueue([]), ListQueue(["b1", "b2"]), ListQueue(["c1", "c2"])]
+    remaining = mp.Value("i", 4)
+    # Без прошлой жертвы - следующая очередь по кругу
+    assert scheduler._take_task(queues, 0, remaining) == ("b1", 1)
+    # Вор держится очереди, из которой крал, даже если по кругу она не первая
+    assert scheduler._take_task(queues, 0, remaining, victim_index=2) == ("c1", 2)
+    queues[0].tasks.append("a1")
+    assert scheduler._take_task(queues, 0, remaining, victim_index=2) == ("a1", 0)
+    assert remaining.value == 1
+
+
+def test_take_task_empty():
+    remaining = mp.Value("i", 0)
+    assert scheduler._take_task([ListQueue([]), ListQueue([])], 1, remaining, victim_index=0) == (None, None)
+
+
+def test_image_cache_decodes_each_frame_once(monkeypatch):
+    decoded = []
+    monkeypatch.setattr(scheduler, "load_image_array",
+                        lambda image_path: decoded.append(image_path) or np.zeros((4, 4, 3), dtype=np.uint8))
+    image_arrays = OrderedDict()
+    # Вор чередует свой кадр и украденный - оба остаются в памяти
+    for image_path in ["a", "b", "a", "b", "a"]:
+        scheduler._get_image_array(image_arrays, image_path, cache_size=2)
+    assert decoded == ["a", "b"]
+    # Третий кадр вытесняет самый давний
+    scheduler._get_image_array(image_arrays, "c", cache_size=2)
+    assert list(image_arrays) == ["a", "c"]
+    assert scheduler._get_image_array(image_arrays, "b", cache_size=2)[1]
@@ -0,0 +1,41 @@
+import copy
+import numpy as np
+import pytest
+from src.main.python.outlier_filter.outlier_filter import filter_outliers, get_outlier_mask
+from src.main.python.benchmarking.reference import reference_outliers
+
+
+def random_boxes_list(seed, tiles=30):
+    # Группы разного размера, включая пустые и из одного бокса; площади с тяжелым хвостом дают выбросы
+    rng = np.random.default_rng(seed)
+    boxes_list = []
+    for tile in range(tiles):
+        n = int(rng.choice([0, 1, 2, 5, 20, 60]))
+        xy = rng.integers(0, 600, (n, 2))
+        wh = np.maximum(1, rng.lognormal(3, 0.6, (n, 2)).astype(int))
+        boxes_list.append({
+            'source_image_path': f"slices/img/img_slice_000_{tile:03d}_{tile * 512}_0.png",
+            'coordinates': np.hstack([xy, xy + wh]).astype(float).tolist(),
+        })
+    return boxes_list
+
+
+@pytest.mark.parametrize("seed", range(5))
+@pytest.mark.parametrize("threshold_k", [0.5, 1.5, 3.0])
+def test_filter_outliers_matches_reference(seed, threshold_k):
+    boxes_list = random_boxes_list(seed)
+    expected = reference_outliers(copy.deepcopy(boxes_list), threshold_k)
+    assert filter_outliers(copy.deepcopy(boxes_list), threshold_k) == expected
+
+
+def test_outlier_mask_matches_np_percentile():
+    # Квартили по сегментам должны совпадать с np.percentile до бита, иначе меняются граничные боксы
+    rng = np.random.default_rng(0)
+    areas = rng.lognormal(5, 1, 1000)
+    group_ids = rng.integers(0, 20, 1000)
+    keep = get_outlier_mask(areas, group_ids, 1.5)
+    for group in range(20):
+        group_areas = areas[group_ids == group]
+        q1, q3 = np.percentile(group_areas, 25), np.percentile(group_areas, 75)
+        expected = (group_areas > q1 - 1.5 * (q3 - q1)) & (group_areas < q3 + 1.5 * (q3 - q1))
+        np.testing.assert_array_equal(keep[group_ids == group], expected)
@@ -0,0 +1,44 @@
+import numpy as np
+from src.main.resources.config import PRESCREEN_MIN_EDGE_DENSITY, PRESCREEN_MIN_STD
+from src.main.python.prescreen.prescreen import get_tile_features, is_candidate_tile, prescreen_tiles
+
+
+def steppe_tile(seed, noise=1.0, size=640):
+    rng = np.random.default_rng(seed)
+    return np.clip(150 + rng.normal(0, noise, (size, size, 3)), 0, 255).astype(np.uint8)
+
+
+def test_flat_tile_is_skipped():
+    tile = steppe_tile(0)
+    std, edge_density = get_tile_features(tile)
+    assert std < PRESCREEN_MIN_STD and edge_density < PRESCREEN_MIN_EDGE_DENSITY
+    assert not is_candidate_tile(tile)
+
+
+def test_low_contrast_tile_with_edges_is_kept():
+    # Несколько темных пятен-животных на ровном фоне: std почти не растет, но перепады есть
+    tile = steppe_tile(1)
+    for x, y in [(100, 100), (300, 420), (500, 200)]:
+        tile[y:y + 8, x:x + 8] = 60
+    std, edge_density = get_tile_features(tile)
+    assert std < PRESCREEN_MIN_STD and edge_density >= PRESCREEN_MIN_EDGE_DENSITY
+    assert is_candidate_tile(tile)
+
+
+def test_contrast_tile_without_edges_is_kept():
+    # Плавный градиент освещенности: std высокое, резких перепадов нет
+    tile = np.repeat(np.linspace(100, 200, 640, dtype=np.float32)[:, None, None], 640, axis=1).repeat(3, axis=2).astype(np.uint8)
+    std, edge_density = get_tile_features(tile)
+    assert std >= PRESCREEN_MIN_STD and edge_density < PRESCREEN_MIN_EDGE_DENSITY
+    assert is_candidate_tile(tile)
+
+
+def test_prescreen_tiles_counts_skipped():
+    flat, spotted = steppe_tile(2), steppe_tile(3)
+    spotted[100:108, 100:108] = 60
+    spotted[300:308, 400:408] = 60
+    spotted[500:508, 200:208] = 60
+    stats = {}
+    kept = list(prescreen_tiles([(0, 0, 0, 0, flat), (0, 1, 512, 0, spotted)], stats))
+    assert [tile[1] for tile in kept] == [1]
+    assert stats == {"tiles": 2, "skipped": 1}
@@ -0,0 +1,91 @@
+import os
+import numpy as np
+from PIL import Image
+from src.main.python.image_slicer.image_slicer import get_slice_filename
+from src.main.python.shards.shards import ShardWriter, ShardReader, pack_folder, unpack_shards, read_yolo_labels
+
+
+def random_tiles(seed, count=10, size=32):
+    rng = np.random.default_rng(seed)
+    tiles = {}
+    for index in range(count):
+        row, col = divmod(index, 5)
+        base_name = "a" if index % 2 == 0 else "b"
+        name = f"{base_name}/{get_slice_filename(base_name, row, col, col * 25, row * 25)}"
+        tile = rng.integers(0, 256, (size, size, 3), dtype=np.uint8)
+        # YOLO-разметка: номер класса и нормированные координаты
+        labels = np.hstack([rng.integers(0, 3, (index % 3, 1)), rng.random((index % 3, 4))])
+        tiles[name] = (tile, labels)
+    return tiles
+
+
+def test_round_trip(tmp_path):
+    tiles = random_tiles(0)
+    # Маленький шард, чтобы фрагменты разошлись по нескольким файлам
+    with ShardWriter(str(tmp_path), shard_size_mb=0.01) as writer:
+        for name, (tile, labels) in tiles.items():
+            writer.add(name, tile, labels if len(labels) else None)
+    assert len(list(tmp_path.glob("*.bin"))) > 1
+
+    reader = ShardReader(str(tmp_path))
+    assert len(reader) == len(tiles)
+    assert reader.names() == list(tiles)
+    for name, (tile, labels) in tiles.items():
+        assert name in reader
+        read_tile, read_labels = reader.get(name)
+        np.testing.assert_array_equal(read_tile, tile)
+        np.testing.assert_allclose(read_labels, labels.astype(np.float32).reshape(-1, 5))
+
+
+def test_append_after_reopen(tmp_path):
+    tiles = random_tiles(1)
+    names = list(tiles)
+    with ShardWriter(str(tmp_path)) as writer:
+        for name in names[:4]:
+            writer.add(name, tiles[name][0])
+    with ShardWriter(str(tmp_path)) as writer:
+        for name in names[4:]:
+            writer.add(name, tiles[name][0])
+
+    reader = ShardReader(str(tmp_path))
+    assert reader.names() == names
+    for position, name in enumerate(names):
+        np.testing.assert_array_equal(reader[position][0], tiles[name][0])
+
+
+def test_iter_tiles(tmp_path):
+    tiles = random_tiles(2)
+    with ShardWriter(str(tmp_path)) as writer:
+        for name, (tile, labels) in tiles.items():
+            writer.add(name, tile, labels)
+
+    reader = ShardReader(str(tmp_path))
+    source_tiles = list(reader.iter_tiles("a"))
+    assert len(source_tiles) == len([name for name in tiles if name.startswith("a/")])
+    for (row, col, left, top, tile), name in zip(source_tiles, [name for name in tiles if name.startswith("a/")]):
+        assert name.endswith(get_slice_filename("a", row, col, left, top))
+        np.testing.assert_array_equal(tile, tiles[name][0])
+    assert len(list(reader.iter_tiles())) == len(tiles)
+
+
+def test_pack_unpack_folder(tmp_path):
+    tiles = random_tiles(3)
+    folder, shard_folder, unpacked = tmp_path / "slices", tmp_path / "shards", tmp_path / "unpacked"
+    for name, (tile, labels) in tiles.items():
+        image_path = folder / name
+        image_path.parent.mkdir(parents=True, exist_ok=True)
+        Image.fromarray(tile).save(image_path)
+        if len(labels):
+            with open(image_path.with_suffix(".txt"), "w") as f:
+                for label in labels:
+                    f.write(" ".join(str(value) for value in label) + "\n")
+
+    assert pack_folder(str(folder), str(shard_folder)) == len(tiles)
+    assert unpack_shards(str(shard_folder), str(unpacked)) == len(tiles)
+    for name, (tile, labels) in tiles.items():
+        np.testing.assert_array_equal(np.asarray(Image.open(unpacked / name)), tile)
+        unpacked_labels = read_yolo_labels(os.path.splitext(unpacked / name)[0] + ".txt")
+        if len(labels):
+            np.testing.assert_allclose(unpacked_labels, labels)
+        else:
+            assert unpacked_labels is None